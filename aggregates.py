@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+#### Group-by aggregates, precomputed per (dapp, month, outcome) partition & merged on demand
+
+## Listing count & value sum per group (eg. buyer address), within each (dapp, month, outcome) partition.
+## A query selects the partitions matching the dapp, month & outcome filters and merges their entries with a bincount,
+## so its cost depends on the number of distinct (partition, group) pairs rather than on the number of listings.
+## Stored as flat arrays so that it can be persisted & memory-mapped back in (see snapshot.py).
+# dapps, outcomes, groups:  Labels (as UTF-8 bytes) that the codes below refer to
+# partition_dapp/month/outcome:  Each partition's dapp code, month (months since 1970-01) & outcome code
+# offsets:  entry_*[offsets[i]:offsets[i + 1]] are the entries of partition i
+# entry_group/count/value:  Group code, listing count & summed value of each entry
+
+ARRAY_NAMES = ['dapps', 'outcomes', 'groups', 'partition_dapp', 'partition_month', 'partition_outcome', 'offsets',
+               'entry_group', 'entry_count', 'entry_value']
+
+def encode_labels(labels):
+  return np.array([str(label).encode('utf-8') for label in labels], dtype=np.bytes_)
+
+class GroupAggregates(object):
+  def __init__(self, arrays):
+    for name in ARRAY_NAMES:
+      setattr(self, name, arrays[name])
+    self.dapp_lookup = {label.decode('utf-8'): i for i, label in enumerate(self.dapps)}
+    self.outcome_lookup = {label.decode('utf-8'): i for i, label in enumerate(self.outcomes)}
+
+  # Scan the engine's rows in chunks, grouping by (dapp, month, outcome, column) & summing value_column (NaN counts as 0).
+  # Rows with a missing group value are left out.
+  @classmethod
+  def build(cls, engine, column, value_column, chunksize=50000):
+    parts = []
+    for start in range(0, len(engine), chunksize):
+      chunk = engine.take(np.arange(start, min(start + chunksize, len(engine))),
+                          ['name', 'resolution_event_type', 'created_at', column, value_column])
+      chunk = chunk[chunk[column].notnull()]
+      frame = pd.DataFrame({
+        'dapp': chunk['name'].astype(str).values,
+        'month': chunk['created_at'].values.astype('datetime64[M]').astype(np.int64),
+        'outcome': chunk['resolution_event_type'].astype(str).values,
+        'group': chunk[column].astype(str).values,
+        'count': np.ones(len(chunk), dtype=np.int64),
+        'value': np.nan_to_num(chunk[value_column].values.astype(np.float64))
+      })
+      parts.append(frame.groupby(['dapp', 'month', 'outcome', 'group'])[['count', 'value']].sum())
+    if sum(len(part) for part in parts) == 0:
+      arrays = {name: np.empty(0, dtype=np.int64) for name in ARRAY_NAMES}
+      arrays['offsets'] = np.zeros(1, dtype=np.int64)
+      return cls(arrays)
+
+    # Sorted by (dapp, month, outcome, group), so each partition's entries are contiguous
+    totals = pd.concat(parts).groupby(level=[0, 1, 2, 3]).sum()
+    keys = totals.index.to_frame(index=False)
+    dapp_codes, dapps = pd.factorize(keys['dapp'], sort=True)
+    outcome_codes, outcomes = pd.factorize(keys['outcome'], sort=True)
+    group_codes, groups = pd.factorize(keys['group'], sort=True)
+    months = keys['month'].values
+
+    boundaries = (np.diff(dapp_codes) != 0) | (np.diff(months) != 0) | (np.diff(outcome_codes) != 0)
+    starts = np.flatnonzero(np.concatenate([[True], boundaries]))
+    return cls({
+      'dapps': encode_labels(dapps),
+      'outcomes': encode_labels(outcomes),
+      'groups': encode_labels(groups),
+      'partition_dapp': dapp_codes[starts].astype(np.int32),
+      'partition_month': months[starts].astype(np.int64),
+      'partition_outcome': outcome_codes[starts].astype(np.int32),
+      'offsets': np.concatenate([starts, [len(keys)]]).astype(np.int64),
+      'entry_group': group_codes.astype(np.int32),
+      'entry_count': totals['count'].values.astype(np.int64),
+      'entry_value': totals['value'].values.astype(np.float64)
+    })
+
+  @classmethod
+  def from_arrays(cls, arrays):
+    return cls(arrays)
+
+  def to_arrays(self):
+    return {name: getattr(self, name) for name in ARRAY_NAMES}
+
+  # Per-group (count, value) totals over the partitions matching the filters, as two arrays indexed by group code.
+  # time_range is (start, stop) with both on month boundaries, as set by the month slider.
+  def totals(self, dapps, outcomes, time_range):
+    dapp_codes = [self.dapp_lookup[dapp] for dapp in dapps if dapp in self.dapp_lookup]
+    outcome_codes = [self.outcome_lookup[outcome] for outcome in outcomes if outcome in self.outcome_lookup]
+    start, stop = [np.datetime64(bound, 'M').astype(np.int64) for bound in time_range]
+    partitions = (np.isin(self.partition_dapp, dapp_codes) & np.isin(self.partition_outcome, outcome_codes)
+                  & (self.partition_month >= start) & (self.partition_month < stop))
+    entries = np.repeat(partitions, np.diff(self.offsets))
+    groups = self.entry_group[entries]
+    counts = np.bincount(groups, weights=self.entry_count[entries], minlength=len(self.groups))
+    values = np.bincount(groups, weights=self.entry_value[entries], minlength=len(self.groups))
+    return counts.astype(np.int64), values
+
+  # The n groups with the highest total `by` ('count' or 'value'), as a DataFrame of group, count & value
+  def top(self, dapps, outcomes, time_range, n=10, by='value'):
+    counts, values = self.totals(dapps, outcomes, time_range)
+    metric = counts if by == 'count' else values
+    candidates = np.flatnonzero(counts > 0)
+    if len(candidates) > n:
+      candidates = candidates[np.argpartition(-metric[candidates], n - 1)[:n]]
+    # Highest first; ties broken by the other metric
+    order = np.lexsort((-(values if by == 'count' else counts)[candidates], -metric[candidates]))
+    top = candidates[order]
+    return pd.DataFrame({
+      'group': [label.decode('utf-8') for label in self.groups[top]],
+      'count': counts[top],
+      'value': values[top]
+    }, columns=['group', 'count', 'value'])
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+import base64
+import numpy as np
+import pandas as pd
+
+#### Headless JSON query API: computations over selected row positions
+
+# Raised for malformed API requests; app.py turns it into a JSON error response
+class ApiError(Exception):
+  def __init__(self, message, status=400):
+    Exception.__init__(self, message)
+    self.message = message
+    self.status = status
+
+## Wall-clock timings of the phases of a request, in milliseconds
+class Timer(object):
+  def __init__(self):
+    self.started = time.time()
+    self.last = self.started
+    self.phases = {}
+
+  def phase(self, name):
+    now = time.time()
+    self.phases[name + '_ms'] = round((now - self.last) * 1000, 3)
+    self.last = now
+
+  def report(self):
+    return dict(self.phases, total_ms=round((time.time() - self.started) * 1000, 3))
+
+# The given columns that hold numbers (not categories, strings, dates or booleans), so can be aggregated
+def numeric_columns(engine, columns):
+  dtypes = engine.take(np.arange(min(len(engine), 1)), list(columns)).dtypes
+  return [column for column in columns if pd.api.types.is_numeric_dtype(dtypes[column])
+          and not pd.api.types.is_bool_dtype(dtypes[column]) and not pd.api.types.is_categorical_dtype(dtypes[column])]
+
+## Grouped statistics of a dimension.  Groups are any of 'dapp', 'outcome' & 'month' (YYYY-MM of created_at).
+## Rows are read a chunk at a time; per-chunk count/sum/min/max are merged, so memory depends on the chunk size.
+
+GROUP_COLUMNS = {
+  'dapp': 'name',
+  'outcome': 'resolution_event_type',
+  'month': 'created_at'
+}
+
+def chunk_groups(chunk, by):
+  groups = {}
+  for group in by:
+    values = chunk[GROUP_COLUMNS[group]]
+    groups[group] = values.dt.strftime('%Y-%m').values if group == 'month' else values.astype(str).values
+  return groups
+
+def grouped_stats(engine, positions, dimension, by, chunksize=50000):
+  columns = list(dict.fromkeys([GROUP_COLUMNS[group] for group in by] + [dimension]))
+  parts = []
+  for start in range(0, len(positions), chunksize):
+    chunk = engine.take(positions[start:start + chunksize], columns)
+    frame = pd.DataFrame(dict(chunk_groups(chunk, by), value=chunk[dimension].values.astype(np.float64)))
+    if by:
+      parts.append(frame.groupby(by)['value'].agg(['count', 'sum', 'min', 'max']))
+    else:
+      parts.append(frame['value'].agg(['count', 'sum', 'min', 'max']).to_frame().T)
+  if not parts:
+    return []
+
+  merged = pd.concat(parts)
+  merged = merged.groupby(level=list(range(len(by)))) if by else merged.groupby(np.zeros(len(merged)))
+  stats = merged.agg({'count': 'sum', 'sum': 'sum', 'min': 'min', 'max': 'max'})
+  stats['mean'] = stats['sum'] / stats['count'].replace(0, np.nan)
+
+  results = []
+  for key, row in stats.iterrows():
+    key = key if isinstance(key, tuple) else (key,)
+    result = dict(zip(by, key))
+    result['count'] = int(row['count'])
+    result.update({statistic: json_number(row[statistic]) for statistic in ['mean', 'min', 'max']})
+    results.append(result)
+  return results
+
+# NaN (eg. the mean of no values) becomes null
+def json_number(value):
+  value = float(value)
+  return None if np.isnan(value) else value
+
+# Percentiles of a dimension over the selected rows, ignoring NaN.  Returns {str(q): value}.
+def percentiles(engine, positions, dimension, qs):
+  values = np.asarray(engine.column_values(dimension, positions), dtype=np.float64)
+  values = values[~np.isnan(values)]
+  if len(values) == 0:
+    return {str(q): None for q in qs}
+  return {str(q): float(value) for q, value in zip(qs, np.percentile(values, qs))}
+
+## Cursor pagination over selected row positions.  A cursor holds the row position to resume after & the data version,
+## so pages stay consistent however the (sorted) selection is re-derived, and cursors from older data are rejected.
+
+def encode_cursor(position, version):
+  return base64.urlsafe_b64encode(json.dumps([int(position), version]).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor, version):
+  try:
+    position, cursor_version = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+  except (ValueError, TypeError):
+    raise ApiError('Malformed cursor')
+  # The position must be a plain integer (JSON true/false decode as bools, which are ints too)
+  if not isinstance(position, int) or isinstance(position, bool):
+    raise ApiError('Malformed cursor')
+  if cursor_version != version:
+    raise ApiError('Cursor is from an older version of the data', status=410)
+  return position
+
+# One page of rows (as JSON-ready records with the listing id) & the cursor of the next page (None after the last)
+def row_page(engine, positions, columns, limit, cursor, version):
+  start = 0 if cursor is None else np.searchsorted(positions, decode_cursor(cursor, version), side='right')
+  page = positions[start:start + limit]
+  records = json.loads(engine.take(page, columns).reset_index().to_json(orient='records', date_format='iso'))
+  more = start + limit < len(positions)
+  return records, encode_cursor(page[-1], version) if more and len(page) else None
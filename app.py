@@ -1,30 +1,92 @@
 # -*- coding: utf-8 -*-
+import time
+boot_started = time.time()
 import os
 import sys
+import uuid
+import shutil
+import flask
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
-import plotly as py
-import plotly.graph_objs as go
 import pandas as pd
 import json
+import gzip
+import hashlib
 import datetime as dt
 import numpy as np
-import requests
-import dask.dataframe as dd
+from urllib.parse import urlencode
 #from memory_profiler import profile
-from google.cloud import storage
 from dateutil import relativedelta
 from dotenv import load_dotenv
 from dash.dependencies import Input, Output, State
+from coalesce import CallbackCoalescer, SupersededError, SharedResultCache
+from response_cache import ResponseCache
+from column_store import ColumnStore, LazyColumnStore
+from dtype_audit import dtype_report, optimize_frame, table_proposals
+from derived import LOG_SUFFIX, add_derived_columns, display_column, log10
+from aggregates import GroupAggregates
+from query_engine import QueryEngine, PandasBackend, ValueIndex, columnar_backend, make_query_spec
+from sampling import series_stratified_sample
+from selection import points_in_polygon, selection_polygon
+from api import ApiError, GROUP_COLUMNS, Timer, grouped_stats, numeric_columns, percentiles, row_page
+from export import EXPORT_FORMATS, export_available, export_response
+from figures import TraceTemplates, fill_trace, layout_spec, styling_codes, trace_spec, validate_figure
+from image_proxy import DirectoryFetcher, HttpFetcher, ThumbnailCache, thumbnail_response, thumbnails_available
+from session_store import create_session_store, make_handle, session_value
+from snapshot import Snapshot, snapshot_digest, source_digest
+from data_source import create_data_source
+from flask_compress import Compress
+
+# Heavy, rarely needed modules (Dask, Google Cloud Storage) are imported where they're used.
+# Run with `python -X importtime app.py` for a per-module breakdown of what's left.
+boot_timings = [('imports', time.time() - boot_started)]
+
+# Time since the previous boot phase ended, logged once boot completes
+def record_boot_phase(phase):
+  boot_timings.append((phase, time.time() - boot_started - sum(seconds for _, seconds in boot_timings)))
 
 #### Load configuration settings
 
-METADATA_NETWORK_INTERFACE_URL = 'http://metadata.google.internal/computeMetadatnetwork-interfaces/0/ip'
 CHUNKSIZE=50000
 CLOUD_STORAGE_BUCKET = os.environ.get('CLOUD_STORAGE_BUCKET', '')
 FILE = 'listings_abridged.csv'
 PATH = 'gs://' + CLOUD_STORAGE_BUCKET + '/' + FILE
+SESSION_COOKIE = 'dapp_session'
+CALLBACK_WORKERS = int(os.environ.get('CALLBACK_WORKERS', 2))
+CALLBACK_SETTLE_SECONDS = float(os.environ.get('CALLBACK_SETTLE_SECONDS', 0.05))
+FILTER_CACHE_SIZE = 32
+FILTER_CACHE_SECONDS = 30
+RESPONSE_CACHE_BYTES = int(os.environ.get('RESPONSE_CACHE_BYTES', 64 * 1024 * 1024))
+OUT_OF_CORE = os.environ.get('OUT_OF_CORE', 'false').lower() == 'true'
+QUERY_BACKEND = os.environ.get('QUERY_BACKEND', 'pandas')
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', 'snapshots')
+LOG_NONPOSITIVE_POLICY = os.environ.get('LOG_NONPOSITIVE_POLICY', 'nan')
+DOWNLOAD_DIR = os.environ.get('DOWNLOAD_DIR', 'downloads')
+# Listings CSV location, overriding PATH: gs://bucket/name, s3://bucket/key, http(s)://... or a local path
+DATA_URL = os.environ.get('DATA_URL', '')
+# Endpoint of an S3-compatible store (eg. a local MinIO stand-in) for s3:// URLs
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL') or None
+DOWNLOAD_WORKERS = int(os.environ.get('DOWNLOAD_WORKERS', 4))
+DOWNLOAD_PART_BYTES = int(os.environ.get('DOWNLOAD_PART_BYTES', 8 * 1024 * 1024))
+SESSION_STORE_URL = os.environ.get('SESSION_STORE_URL', 'memory://')
+SESSION_TTL_SECONDS = int(os.environ.get('SESSION_TTL_SECONDS', 3600))
+# Points drawn by the sampled charts (the sample toggle's value), shared between the selected dapps & outcomes by their filtered counts
+SCATTER_POINT_BUDGET = int(os.environ.get('SCATTER_POINT_BUDGET', 20000))
+SAMPLE_SEED = int(os.environ.get('SAMPLE_SEED', 0))
+SAMPLE_SERIES_MIN_POINTS = int(os.environ.get('SAMPLE_SERIES_MIN_POINTS', 500))
+# Dtype audit of the loaded listings: 'off', 'report' (log the proposed downcasts) or 'apply' (also apply them).
+# Downcasts are only applied where the data is loaded through pandas; column store backends are only reported on.
+DTYPE_AUDIT = os.environ.get('DTYPE_AUDIT', 'off').lower()
+PRECOMPUTE_DEFAULT_STATE = os.environ.get('PRECOMPUTE_DEFAULT_STATE', 'true').lower() == 'true'
+SCATTER_ENCODING = os.environ.get('SCATTER_ENCODING', 'per-style')
+IMAGE_CACHE_DIR = os.environ.get('IMAGE_CACHE_DIR', 'image_cache')
+IMAGE_CACHE_BYTES = int(os.environ.get('IMAGE_CACHE_BYTES', 256 * 1024 * 1024))
+IMAGE_SOURCE_DIR = os.environ.get('IMAGE_SOURCE_DIR', '')
+# Largest source image the proxy will download
+IMAGE_SOURCE_MAX_BYTES = int(os.environ.get('IMAGE_SOURCE_MAX_BYTES', 10 * 1024 * 1024))
+THUMBNAIL_SIZE = int(os.environ.get('THUMBNAIL_SIZE', 200))
+IMAGE_MAX_AGE_SECONDS = 7 * 24 * 3600
 
 
 data_types = {
@@ -52,6 +114,8 @@ data_types = {
   'image_url': np.object_,
   'resolution_from_address': np.object_,
   'resolution_to_address': np.object_,
+  'from_address': np.object_,
+  'to_address': np.object_,
   'event_type': np.object_
 }
 
@@ -60,6 +124,98 @@ data_types = {
 app = dash.Dash()
 server = app.server
 
+#### Session tracking & callback coalescing
+
+# Tag each browser with an opaque token so that bursts of callbacks (eg. slider drags) can be coalesced per session
+@server.after_request
+def assign_session_cookie(response):
+  if SESSION_COOKIE not in flask.request.cookies:
+    response.set_cookie(SESSION_COOKIE, uuid.uuid4().hex, httponly=True)
+  return response
+
+def current_session_token():
+  return flask.request.cookies.get(SESSION_COOKIE, flask.request.remote_addr)
+
+# Workers run inside a copy of the request context, so callbacks can still read the session token
+coalescer = CallbackCoalescer(max_workers=CALLBACK_WORKERS, settle_seconds=CALLBACK_SETTLE_SECONDS, context=flask.copy_current_request_context)
+
+# Session state lives server-side; hidden Divs in the layout only carry short handles to it (see session_store.py)
+session_store = create_session_store(SESSION_STORE_URL, ttl=SESSION_TTL_SECONDS)
+
+# Store a value for the current session & return its handle.  The write is a side effect that must happen for every
+# session, so the response carrying the handle is kept out of the shared response cache.
+def put_session_value(name, value):
+  value = session_value(value)
+  session_store.set(current_session_token(), name, value)
+  skip_response_cache()
+  return make_handle(name, value)
+
+# Resolve a handle to the current session's value.  If the session no longer holds that value (eg. it expired),
+# return the default and keep the resulting response out of the response cache.
+def get_session_value(handle, name, default=None):
+  if handle is None:
+    return default
+  value = session_store.get(current_session_token(), name)
+  if value is None or make_handle(name, value) != handle:
+    skip_response_cache()
+    return default
+  return value
+
+# A stale request gets an empty response; the renderer keeps whatever the newer request returns
+@server.errorhandler(SupersededError)
+def handle_superseded(error):
+  return ('', 204)
+
+#### Pre-serialized callback responses
+
+# Gzip everything else (layout, component suites, uncached callbacks).  Registered before the hooks below,
+# so that their already-compressed responses pass through untouched.
+Compress(server)
+
+# Compressed callback responses, keyed by a content hash of the normalized request.
+# The default dashboard state is pinned at startup by warm_default_responses(); other responses are kept in an LRU.
+# Callbacks that write session state must run for every session, so their responses are never cached
+# (put_session_value also keeps any response it contributes to out of the cache).
+response_cache = ResponseCache(max_bytes=RESPONSE_CACHE_BYTES,
+                               uncacheable=['selected-listing-cache.children', 'scatter-selection-cache.children'])
+
+def is_callback_request():
+  return flask.request.method == 'POST' and flask.request.path.endswith('_dash-update-component')
+
+# Answer repeated callback requests straight from the cache.  Callbacks are POSTs, which browsers never revalidate
+# conditionally, so there is no 304 path here: the win is skipping the callback & its compression on the server.
+# (Conditional GETs, eg. for listing images, are answered with 304s by their own routes.)
+@server.before_request
+def serve_cached_callback():
+  if not is_callback_request():
+    return None
+  body = flask.request.get_json(silent=True)
+  if not body or 'output' not in body or not response_cache.is_cacheable(body):
+    return None
+  key = response_cache.key_for(body)
+  entry = response_cache.get(key)
+  if entry is not None:
+    return entry.to_response(flask.request)
+  flask.g.response_cache_key = key
+
+# Flag the current response as depending on more than its inputs.  Kept in the WSGI environ (rather than flask.g),
+# since the request object is shared with the worker threads callbacks run on.
+def skip_response_cache():
+  flask.request.environ['dapp.skip_response_cache'] = True
+
+# Compress & store freshly computed callback responses
+@server.after_request
+def store_callback_response(response):
+  key = flask.g.get('response_cache_key', None)
+  if key is None or response.status_code != 200 or 'Content-Encoding' in response.headers:
+    return response
+  if flask.request.environ.get('dapp.skip_response_cache', False):
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+  flask.g.response_cache_key = None
+  entry = response_cache.put(key, response.get_data(), response.mimetype)
+  return entry.to_response(flask.request)
+
 #### Load external CSS
 
 external_css = [
@@ -80,38 +236,19 @@ debug = True
 
 #### Initialize Runtime Environment
 
-try:
-  # Attempt to retrieve Google App engine instance metadata
-  r = requests.get(
-      METADATA_NETWORK_INTERFACE_URL,
-      headers={'Metadata-Flavor': 'Google'},
-      timeout=2)
+# RUNTIME_ENV ('prod' or 'local') overrides detection; otherwise App Engine is recognized by the GAE_INSTANCE variable it sets
+runtime_prod = os.environ.get('RUNTIME_ENV', 'prod' if os.environ.get('GAE_INSTANCE') else 'local').lower() == 'prod'
+
+if runtime_prod:
   debug = False
-  runtime_prod = True
   # Initialize Google Analytics
   app.scripts.append_script({'external_url': 'https://www.googletagmanager.com/gtag/js?id=UA-122516304-1'})
   app.scripts.append_script({'external_url': 'https://codepen.io/rosswait/pen/zLBPPg.js'})
 
-except requests.RequestException:
-    # Overwrite with local filepath if failure
+else:
+    # Use the local filepath outside of production
     PATH = 'listings_abridged.csv'
     debug = True
-    runtime_prod = False
-
-#### Load remote data into pandas
-
-# For some reason, getting GZIP in the Google Cloud Metadata results in incomplete loading.  Instead access raw & decompress here!
-df = dd.read_csv(PATH, dtype=data_types, parse_dates=['created_at', 'created_at_trunc'], compression='gzip',blocksize=None).compute()
-df = df.set_index('id')
-
-#### Data cleanup & derivation
-
-# Remove irregular listings
-df = df[(df['listing_start_price_normalized'] >= 0)
-            & (df['listing_start_price_normalized'] > df['listing_end_price_normalized'])]
-
-# Get list of names
-names = sorted(list(set(df['name'])))
 
 start_time = dt.datetime(year=2017,month=6, day=1)
 end_time = dt.datetime(year=2018,month=6, day=1)
@@ -207,6 +344,35 @@ dimensions = {
   'listings_cum': {
     'label': 'Cumulative Token Listings',
     'inspector_rank':9
+  },
+  'listing_drop_per_hour': {
+    'label': 'Start-End Range per Hour (Absolute)',
+    'default_axis_type': 'log',
+    'format': ".4f",
+    'axis_picker_rank': 9
+  },
+  'resolution_range_position_pct': {
+    'label': 'Sold Point in Start-End Range (% of Range)',
+    'format': '%',
+    'ineligible_points': ['listed', 'unresolved', 'delisted'],
+    'axis_picker_rank': 10
+  }
+}
+
+## Computed dimensions, materialized once at load (see derived.py)
+# inputs:    Source columns, passed to the function as float64 arrays
+# function:  Vectorized computation of the new column
+
+derived_dimensions = {
+  # How quickly the listed price falls over the scheduled duration
+  'listing_drop_per_hour': {
+    'inputs': ['listing_price_delta_normalized', 'duration_hours'],
+    'function': lambda delta, hours: delta / hours
+  },
+  # Where in the listed start-end range the sale happened (0% at the start price, 100% at the end price)
+  'resolution_range_position_pct': {
+    'inputs': ['resolution_price_delta_normalized', 'listing_price_delta_normalized'],
+    'function': lambda sold_delta, listed_delta: sold_delta / listed_delta
   }
 }
 
@@ -298,6 +464,258 @@ marker_stylings = {
     ]
 }
 
+## Attributes of the selected listing that the scatter can be frozen to (see the auction details pane)
+freeze_options = [
+  {'label': 'Token Item', 'value': 'token_item_id'},
+  {'label': 'Buyer', 'value': 'to_address'},
+  {'label': 'Seller', 'value': 'from_address'}
+]
+
+## Wide, rarely used columns.  These are only needed to render the external link for a single listing,
+## so they're kept out of the main frame in a side store on disk & fetched per listing.
+side_columns = ['token_id', 'image_url']
+
+## Freeze attributes are read from the column of the same name, or from its resolution_* counterpart if the CSV only has that.
+## Freeze options whose column is in neither form are dropped once the data is loaded.
+freeze_fallback_columns = {
+  'to_address': 'resolution_to_address',
+  'from_address': 'resolution_from_address'
+}
+
+## Selections on the scatter with at most this many listings are listed individually in the selection summary;
+## larger ones are summarized per app
+selection_detail_limit = 20
+
+## Item history panel: columns shown for each listing of the selected listing's token item
+item_history_columns = ['created_at', 'resolution_event_type', 'listing_start_price_normalized', 'listing_end_price_normalized',
+                        'resolution_sale_price_normalized', 'hours_since_last_listing']
+
+## Top traders panel: the freeze attributes double as the groups listings can be ranked by, totalling this column as volume
+trade_volume_column = 'resolution_sale_price_normalized'
+top_trader_count = 15
+
+#### Load remote data
+
+# Derive the set of CSV columns the dashboard uses from the configuration above
+def generate_loaded_columns(dimensions, derived_dimensions, marker_stylings, freeze_options):
+  columns = ['id', 'created_at'] + [key for key in dimensions.keys() if key not in derived_dimensions]
+  columns += [column for spec in derived_dimensions.values() for column in spec['inputs']]
+  columns += [entry['df_filter_key'] for styling in marker_stylings.values() for entry in styling]
+  columns += [option['value'] for option in freeze_options]
+  columns += [freeze_fallback_columns[option['value']] for option in freeze_options if option['value'] in freeze_fallback_columns]
+  return list(dict.fromkeys(columns))
+
+loaded_columns = generate_loaded_columns(dimensions, derived_dimensions, marker_stylings, freeze_options)
+
+# Columns the CSV doesn't have (eg. whichever form of a freeze column is absent) are skipped rather than failing the load
+def is_loaded_column(column):
+  return column in loaded_columns
+
+# Keep one column per freeze attribute, under the attribute's name
+def resolve_freeze_columns(df):
+  for column, fallback in freeze_fallback_columns.items():
+    if fallback in df.columns:
+      df = df.drop(columns=[fallback]) if column in df.columns else df.rename(columns={fallback: column})
+  return df
+
+# Log-scale dimensions get a precomputed log10 copy, so server-side work can happen in display space
+log_dimension_keys = [key for key, value in dimensions.items()
+                      if value.get('axis_picker_rank', None) is not None and value.get('default_axis_type', None) == 'log']
+
+# Remove irregular listings
+def remove_irregular_listings(df):
+  return df[(df['listing_start_price_normalized'] >= 0)
+            & (df['listing_start_price_normalized'] > df['listing_end_price_normalized'])]
+
+# Cleanup & derivation applied to the loaded frame (or to each chunk of it, out of core)
+def prepare_listings(df):
+  df = remove_irregular_listings(resolve_freeze_columns(df))
+  return add_derived_columns(df, derived_dimensions, log_dimension_keys, LOG_NONPOSITIVE_POLICY)
+
+data_source = create_data_source(DATA_URL or PATH, s3_endpoint_url=S3_ENDPOINT_URL, workers=DOWNLOAD_WORKERS,
+                                 part_bytes=DOWNLOAD_PART_BYTES)
+
+# Local copy of the CSV.  Remote objects are downloaded in parallel ranged parts, verified, & cached under DOWNLOAD_DIR by digest.
+def local_csv_path():
+  return data_source.local_path(DOWNLOAD_DIR)
+
+# Content hash of the input CSV.  For remote objects, it's derived from their metadata rather than downloading them.
+def data_digest():
+  return data_source.digest()
+
+# Working directory under DOWNLOAD_DIR for structures built from this version of the data when there are no snapshots
+# (the side columns, & the out-of-core table), as <name>-<data digest>.  Those built from earlier versions are removed,
+# so a swapped CSV is never answered from a stale store.
+def download_store_path(name):
+  path = os.path.join(DOWNLOAD_DIR, '{}-{}'.format(name, data_digest()))
+  if os.path.isdir(DOWNLOAD_DIR):
+    for entry in os.listdir(DOWNLOAD_DIR):
+      if entry.startswith(name + '-') and os.path.join(DOWNLOAD_DIR, entry) != path:
+        shutil.rmtree(os.path.join(DOWNLOAD_DIR, entry), ignore_errors=True)
+  return path
+
+# Audit the loaded frame's dtypes per DTYPE_AUDIT, logging the proposed downcasts & the memory saved.  Month-offset
+# encodings of dates are only reported, as the dates are read (& displayed) as datetimes throughout.
+def audit_dtypes(df):
+  if DTYPE_AUDIT not in ['report', 'apply']:
+    return df
+  df, proposals = optimize_frame(df, apply=DTYPE_AUDIT == 'apply')
+  sys.stderr.write(dtype_report(proposals) + '\n')
+  return df
+
+# The same audit of a column store backend (the memory-mapped store, or its in-memory arrays), report only.  Columns are
+# audited one at a time, so the out-of-core store is never loaded whole.
+def audit_column_dtypes(table):
+  if DTYPE_AUDIT not in ['report', 'apply']:
+    return
+  sys.stderr.write(dtype_report(table_proposals(table)) + '\n')
+
+# Bump when the layout of anything persisted in the snapshot changes
+SNAPSHOT_SCHEMA = 1
+
+# Short-lived cache of filter results (as row positions), shared between callbacks fired by the same interaction
+filter_cache = SharedResultCache(maxsize=FILTER_CACHE_SIZE, ttl=FILTER_CACHE_SECONDS)
+
+if SNAPSHOT_DIR:
+  # The cleaned columns, indexes & default samples are persisted under a hash of the input data and of the settings that shape them.
+  # Restarts with unchanged input memory-map everything back in; only a changed CSV (or config) triggers a rebuild.
+  snapshot = Snapshot(SNAPSHOT_DIR, snapshot_digest(data_digest(), {
+    'schema': SNAPSHOT_SCHEMA,
+    'columns': loaded_columns,
+    'derived': {key: spec['inputs'] for key, spec in derived_dimensions.items()},
+    'log': log_dimension_keys,
+    'log_policy': LOG_NONPOSITIVE_POLICY
+  }))
+
+  # Columns are streamed from the CSV into memory-mapped files in chunks, once per snapshot
+  table_dir = snapshot.path('table')
+  if not ColumnStore.exists(table_dir):
+    ColumnStore.ingest_csv(local_csv_path(), table_dir, index='id', usecols=is_loaded_column, dtype=data_types,
+                           parse_dates=['created_at', 'created_at_trunc'], compression='gzip', clean=prepare_listings,
+                           chunksize=CHUNKSIZE)
+  store = ColumnStore(table_dir)
+
+  if OUT_OF_CORE:
+    # Columns stay on local disk; only listing ids are held in RAM
+    backend = store
+    audit_column_dtypes(backend)
+  elif QUERY_BACKEND == 'columnar':
+    backend = store.in_memory()
+    audit_column_dtypes(backend)
+  else:
+    backend = PandasBackend(audit_dtypes(store.to_frame()))
+  del store
+
+  # All filtering, sampling & lookups go through the query engine, whichever backend holds the data
+  listings = QueryEngine(backend, filter_cache)
+
+  # The sample ranks are persisted with the snapshot, so samples of any budget & filter are drawn without resampling
+  listings.pin_sample_ranks(SAMPLE_SEED, snapshot.array('sample-ranks-{}'.format(SAMPLE_SEED),
+                                                        lambda: listings.sample_ranks(SAMPLE_SEED)))
+
+  # Side columns are streamed into their own on-disk store the first time a listing's link is rendered
+  side_store = LazyColumnStore(snapshot.path('side'), lambda directory: ColumnStore.ingest_csv(
+    local_csv_path(), directory, index='id', usecols=['id'] + side_columns, dtype=data_types, compression='gzip', chunksize=CHUNKSIZE))
+
+  # Responses cached by content hash are only valid for this version of the data
+  response_cache.version = snapshot.digest
+
+  # Snapshots of earlier versions of the data are no longer needed
+  snapshot.prune()
+
+elif OUT_OF_CORE:
+  snapshot = None
+
+  # Without snapshots, the on-disk columns are kept under DOWNLOAD_DIR for this version of the data, so the CSV is still
+  # only ever streamed in chunks & never held in RAM
+  table_dir = download_store_path('table')
+  if not ColumnStore.exists(table_dir):
+    ColumnStore.ingest_csv(local_csv_path(), table_dir, index='id', usecols=is_loaded_column, dtype=data_types,
+                           parse_dates=['created_at', 'created_at_trunc'], compression='gzip', clean=prepare_listings,
+                           chunksize=CHUNKSIZE)
+  backend = ColumnStore(table_dir)
+  audit_column_dtypes(backend)
+  listings = QueryEngine(backend, filter_cache)
+
+  side_store = LazyColumnStore(download_store_path('side'), lambda directory: ColumnStore.ingest_csv(
+    local_csv_path(), directory, index='id', usecols=['id'] + side_columns, dtype=data_types, compression='gzip', chunksize=CHUNKSIZE))
+
+  response_cache.version = '{}:{}'.format(data_digest(), len(listings))
+
+else:
+  snapshot = None
+
+  # Dask is only needed to read the CSV directly
+  import dask.dataframe as dd
+
+  df = dd.read_csv(local_csv_path(), usecols=is_loaded_column, dtype=data_types, parse_dates=['created_at', 'created_at_trunc'], compression='gzip',
+                   blocksize=None).compute()
+  df = df.set_index('id')
+
+  #### Data cleanup & derivation
+
+  df = audit_dtypes(prepare_listings(df))
+
+  if QUERY_BACKEND == 'columnar':
+    # Keep only the NumPy column arrays; the DataFrame itself is released
+    backend = columnar_backend(df, chunksize=CHUNKSIZE)
+    del df
+  else:
+    backend = PandasBackend(df)
+
+  listings = QueryEngine(backend, filter_cache)
+
+  side_store = LazyColumnStore(download_store_path('side'), lambda directory: ColumnStore.ingest_csv(
+    local_csv_path(), directory, index='id', usecols=['id'] + side_columns, dtype=data_types, compression='gzip', chunksize=CHUNKSIZE))
+
+  response_cache.version = '{}:{}'.format(FILE, len(listings))
+
+# Row-position indexes, persisted with the snapshot when there is one
+def load_value_index(name, column, order=None):
+  build = lambda: ValueIndex.build(listings, column, order).to_arrays()
+  return ValueIndex.from_arrays(build() if snapshot is None else snapshot.arrays(name, build))
+
+# Rows by dapp, and each token item's listings in time order (its history)
+listings.add_index('name', load_value_index('name-index', 'name'))
+item_index = load_value_index('item-index', 'token_item_id', order='created_at')
+listings.add_index('token_item_id', item_index)
+
+# Per (dapp, month, outcome) totals for each top traders grouping, persisted with the snapshot when there is one
+def load_group_aggregates(column):
+  build = lambda: GroupAggregates.build(listings, column, trade_volume_column, chunksize=CHUNKSIZE).to_arrays()
+  return GroupAggregates(build() if snapshot is None else snapshot.arrays('aggregates-' + column, build))
+
+freeze_options = [option for option in freeze_options if option['value'] in listings.columns]
+trader_aggregates = {option['value']: load_group_aggregates(option['value']) for option in freeze_options}
+
+record_boot_phase('data')
+
+# Get list of names
+names = sorted(listings.category_labels('name'))
+
+#### Listing image thumbnails
+
+# Listing images are fetched from their (third-party) hosts by the server, shrunk & cached on disk.
+# Setting IMAGE_SOURCE_DIR serves them from a local directory instead, for development & tests.
+thumbnail_cache = ThumbnailCache(IMAGE_CACHE_DIR,
+                                 DirectoryFetcher(IMAGE_SOURCE_DIR) if IMAGE_SOURCE_DIR else HttpFetcher(max_bytes=IMAGE_SOURCE_MAX_BYTES),
+                                 size=THUMBNAIL_SIZE, max_bytes=IMAGE_CACHE_BYTES)
+if not thumbnails_available():
+  sys.stderr.write('Pillow is not installed: listing images will be served at full size, without thumbnailing\n')
+
+def listing_image_url(index_id):
+  return '/listing-image/{}'.format(int(index_id))
+
+# Images are addressed by listing id, so the proxy only ever fetches URLs from the data set
+@server.route('/listing-image/<int:index_id>')
+def serve_listing_image(index_id):
+  if listings.get_indexer([index_id])[0] < 0:
+    flask.abort(404)
+  image_url = side_store.lookup(index_id, ['image_url']).values[0]
+  if not isinstance(image_url, str) or image_url == '':
+    flask.abort(404)
+  return thumbnail_response(thumbnail_cache, image_url, flask.request, IMAGE_MAX_AGE_SECONDS)
+
 #### Declare shared functions
 
 # Uses the "All Outcomes" series in the marker stylings dictionary to generate an array of label/value pairs for the checkbox config.
@@ -319,38 +737,148 @@ def generate_url(dapp_name, token_id):
   token_id = str(int(token_id))
   return base_url+'/'+dapp_name+'/'+token_id
 
-def filter_dataframe(df, sample_index, dapp_names, month_slider, outcome_checklist, token_item_id=None, to_address=None, from_address=None):
-  # Only filter for the values if explicitly passed
-  if token_item_id is not None:
-    df = df.loc[df['token_item_id'] == token_item_id,:]
-  if to_address is not None:
-    df = df.loc[df['to_address'] == to_address,:]
-  if from_address is not None:
-    df = df.loc[df['from_address'] == from_address,:]
-
-  # If there's a set of index values in the browser cache, use it to filter the data.  Used for sampling.
-  index = json.loads(sample_index)
-  if index != {}:
-    df = df.loc[index]
-
-  filtered_df = df[
-          df['name'].isin(dapp_names)
-          & df['resolution_event_type'].isin(outcome_checklist)
-          & (df['created_at'] >= add_months(start_time, month_slider[0]))
-          & (df['created_at'] < add_months(start_time, month_slider[1] + 1))
-  ]
-  return filtered_df
-
-# Return an array of index values representing no more than a fixed number of records per dapp ('name')
-def sample_dataframe(df, points_per_series):
-  index = []
+# Sample handles held in the browser cache look like 'sample:<point budget>:<seed>'.  The sample is regenerated
+# deterministically from the handle on demand, so only the handle ever crosses the wire.
+def make_sample_handle(budget, seed):
+  return 'sample:{}:{}'.format(budget, seed)
+
+# Convert a sample handle into a query engine sample key (None if unsampled)
+def parse_sample_handle(sample_index):
+  if not sample_index or not sample_index.startswith('sample:'):
+    return None
+  budget, seed = [int(x) for x in sample_index.split(':')[1:]]
+  return ('budget', budget, SAMPLE_SERIES_MIN_POINTS, seed)
+
+# Returns the sorted row positions matching the filter.  Results are briefly cached by the query engine, so that the
+# scatter & boxplot callbacks fired by the same interaction share a single pass over the data.
+def filter_positions(sample_index, dapp_names, month_slider, outcome_checklist, token_item_id=None, to_address=None, from_address=None):
+  # Only filter for the frozen values if explicitly passed
+  spec = make_query_spec(dapp_names, outcome_checklist,
+                         (add_months(start_time, month_slider[0]), add_months(start_time, month_slider[1] + 1)),
+                         freezes={'token_item_id': token_item_id, 'to_address': to_address, 'from_address': from_address},
+                         sample=parse_sample_handle(sample_index))
+  return listings.select(spec)
+
+def filter_dataframe(sample_index, dapp_names, month_slider, outcome_checklist, token_item_id=None, to_address=None, from_address=None,
+                     columns=None):
+  positions = filter_positions(sample_index, dapp_names, month_slider, outcome_checklist,
+                               token_item_id=token_item_id, to_address=to_address, from_address=from_address)
+  return listings.take(positions, columns)
+
+# Values of a dimension at the given rows, in display space for the axis scale (log10 for log axes)
+def display_values(axis, scale, positions):
+  column = display_column(listings.columns, axis, scale)
+  values = listings.column_values(column, positions)
+  return log10(values, LOG_NONPOSITIVE_POLICY) if scale == 'log' and column == axis else values
+
+# (low, high) of a dimension's finite display values over every listing, computed once per axis & scale.  The scatter
+# sampling grid spans these, so the grid doesn't move as the filters change.
+display_bounds_cache = {}
+
+def display_bounds(axis, scale):
+  if (axis, scale) not in display_bounds_cache:
+    values = np.asarray(display_values(axis, scale, np.arange(len(listings))), dtype=np.float64)
+    values = values[np.isfinite(values)]
+    display_bounds_cache[(axis, scale)] = (values.min(), values.max()) if len(values) else (0.0, 0.0)
+  return display_bounds_cache[(axis, scale)]
+
+# Thin filtered row positions down to roughly `budget` points: the budget is shared between the dapp & outcome series
+# in proportion to their sizes (at least `minimum` each), then each series is thinned to its share, stratified on the
+# x/y dimensions in display space (see sampling.py).  Within each grid cell the points are kept in the order of the
+# (persisted) sample ranks, so changing the filters keeps the points already drawn wherever it can.  Cached, since the
+# result only depends on the filtered rows, the axes & the budget.
+def scatter_sample_positions(positions, x_axis, x_axis_scale, y_axis, y_axis_scale, budget, minimum, seed):
+  key = ('scatter-sample', hashlib.sha1(positions.tobytes()).hexdigest(), x_axis, x_axis_scale, y_axis, y_axis_scale, budget,
+         minimum, seed)
+
+  def compute():
+    if len(positions) <= budget:
+      return positions
+    codes = listings.series_codes(positions)
+    x = display_values(x_axis, x_axis_scale, positions)
+    y = display_values(y_axis, y_axis_scale, positions)
+    bounds = (display_bounds(x_axis, x_axis_scale), display_bounds(y_axis, y_axis_scale))
+    return positions[series_stratified_sample(codes, x, y, listings.series_quotas(codes, budget, minimum),
+                                              ranks=listings.sample_ranks(seed)[positions], bounds=bounds)]
+
+  return filter_cache.get(key, compute)
+
+# Row positions the scatter draws: every filtered listing, thinned with the density-preserving sampler when sampling is
+# enabled.  Shared by the scatter & the default selected listing, so the default is always a rendered point.
+def scatter_positions(sample_index, names, month_slider, outcome_checklist, x_axis, x_axis_scale, y_axis, y_axis_scale, freezes=None):
+  positions = filter_positions(None, names, month_slider, outcome_checklist, **(freezes or {}))
+  sample = parse_sample_handle(sample_index)
+  if sample is not None:
+    _, budget, minimum, seed = sample
+    positions = scatter_sample_positions(positions, x_axis, x_axis_scale, y_axis, y_axis_scale, budget, minimum, seed)
+  return positions
+
+# Values of the selected listing's attributes for each enabled freeze option (None where the option is off)
+def frozen_attributes(auction_detail_freeze, index_id):
+  return {option['value']: listings.lookup(index_id, [option['value']]).values[0] if option['value'] in auction_detail_freeze else None
+          for option in freeze_options}
+
+# The scatter selection held behind a handle, if there is one & it was drawn on the given axes
+def active_selection(selection_handle, x_axis, x_axis_scale, y_axis, y_axis_scale):
+  if not selection_handle:
+    return None
+  selection = get_session_value(selection_handle, 'scatter-selection')
+  if selection is None or selection['axes'] != [x_axis, x_axis_scale, y_axis, y_axis_scale]:
+    return None
+  return selection
+
+# Row positions inside a scatter selection.  The polygon is resolved against every filtered listing, not just the
+# (sampled) points the browser rendered, in display space so that selections on log axes keep their drawn shape.
+def selection_positions(selection, names, month_slider, outcome_checklist):
+  x_axis, x_axis_scale, y_axis, y_axis_scale = selection['axes']
+  positions = filter_positions(None, names, month_slider, outcome_checklist, **selection['freezes'])
+  key = ('selection', hashlib.sha1(positions.tobytes()).hexdigest(), json.dumps(selection, sort_keys=True, default=str))
+
+  def compute():
+    polygon_x, polygon_y = [log10(vertices, LOG_NONPOSITIVE_POLICY) if scale == 'log' else vertices
+                            for vertices, scale in zip(selection['polygon'], [x_axis_scale, y_axis_scale])]
+    inside = points_in_polygon(display_values(x_axis, x_axis_scale, positions), display_values(y_axis, y_axis_scale, positions),
+                               polygon_x, polygon_y)
+    return positions[inside]
+
+  return filter_cache.get(key, compute)
+
+# Listing shown in the inspector when nothing has been selected yet
+def default_listing_id():
+  return listings.ids([0])[0]
+
+# Predicates selecting the points drawn with any of the given marker styling entries
+def marker_predicates(entries):
+  if any(entry['df_filter_value'] is None for entry in entries):
+    return []
+  return [('isin', entries[0]['df_filter_key'], [entry['df_filter_value'] for entry in entries])]
+
+# Scatter traces are drawn per dapp & marker styling entry ('per-style'), or with a single trace per dapp that styles
+# each point individually ('per-dapp', see figures.py).  Returns the groups of styling entries drawn as one trace.
+def scatter_trace_entries(marker_symbols):
+  if SCATTER_ENCODING == 'per-dapp':
+    return [marker_symbols]
+  return [[entry] for entry in marker_symbols]
+
+# Id of the first point of the first non-empty scatter trace, mirroring the points & trace order of update_scatter
+def first_scatter_listing_id(sample_index, names, marker_symbols, month_slider, outcome_checklist, x_axis, x_axis_scale, y_axis,
+                             y_axis_scale):
+  positions = scatter_positions(sample_index, names, month_slider, outcome_checklist, x_axis, x_axis_scale, y_axis, y_axis_scale)
   for name in names:
-      filtered_df = df[df['name'] == name]
-      if filtered_df.shape[0] > points_per_series:
-          index.extend(list(filtered_df.sample(points_per_series).index))
-      else:
-          index.extend(filtered_df.index)
-  return sorted(index)
+    for entries in scatter_trace_entries(marker_symbols):
+      predicates = [('isin', 'name', [name])] + marker_predicates(entries)
+      trace_positions = listings.where(predicates, rows=positions)
+      if len(trace_positions) > 0:
+        return listings.ids(trace_positions[:1])[0]
+  return default_listing_id()
+
+# Figures are built as plain dicts (see figures.py); plotly's property validation only runs in debug mode
+def checked_figure(figure):
+  return validate_figure(figure) if debug else figure
+
+# Every listing of a token item, oldest first, read straight from the item index
+def item_history(token_item_id, columns):
+  return listings.take(item_index.get([token_item_id]), columns)
 
 # Takes in the 'dimensions' dictionary & the name of a desired sort index (either 'axis_picker_rank' or 'inspector_rank')
 # And returns a sorted array of key names (dataframe dimensions)
@@ -365,9 +893,129 @@ sorted_inspector_keys = generate_sorted_keys(dimensions, 'inspector_rank')
 sorted_axis_keys = generate_sorted_keys(dimensions, 'axis_picker_rank')
 marker_toggles = generate_marker_toggles(marker_stylings)
 palette_name_dict = dict(zip(names, palette))
+trace_templates = TraceTemplates(palette_name_dict, marker_stylings)
 name_selection_list = [{'label':name, 'value':name} for name in names]
 axis_labels = [dict(value=key, label=dimensions[key]['label']) for key in sorted_axis_keys]
-
+all_outcomes = [entry['df_filter_value'] for entry in marker_stylings['all-outcomes']]
+# Exported columns: everything loaded & derived, except the log10 display copies
+export_columns = [column for column in listings.columns if column != 'id' and not column.endswith(LOG_SUFFIX)]
+
+#### Data export
+
+# Filter parameters of an export (or API) request, in the form the callbacks receive them.  Filters left out cover
+# everything: all apps, the full month range & all outcomes.  The parameters are:
+#   dapp:                        App name (repeatable)
+#   month_start, month_end:      Month slider positions (0 is the first month)
+#   outcome:                     Auction outcome (repeatable)
+#   token_item_id, to_address, from_address:  Freezes
+# Malformed parameters raise an ApiError (a JSON 400).
+def request_filters(args):
+  try:
+    month_slider = [int(args.get('month_start', 0)), int(args.get('month_end', time_slider_interval))]
+    freezes = {option['value']: args.get(option['value']) for option in freeze_options}
+    if freezes.get('token_item_id') is not None:
+      freezes['token_item_id'] = int(freezes['token_item_id'])
+  except ValueError:
+    raise ApiError('month_start, month_end & token_item_id must be integers')
+  return args.getlist('dapp') or names, month_slider, args.getlist('outcome') or all_outcomes, freezes
+
+# Query string reproducing a set of filters, for request_filters
+def filter_query_string(dapp_names, month_slider, outcome_checklist, freezes):
+  parameters = [('dapp', name) for name in dapp_names] + [('outcome', outcome) for outcome in outcome_checklist]
+  parameters += [('month_start', month_slider[0]), ('month_end', month_slider[1])]
+  parameters += [(column, value) for column, value in sorted(freezes.items()) if value is not None]
+  return urlencode(parameters)
+
+# Streams every listing matching the filters (unsampled) as CSV or Parquet, a chunk of rows at a time.
+# Only the matching row positions are held in memory, never a filtered copy of the data.
+@server.route('/export/listings.<export_format>')
+def export_listings(export_format):
+  if export_format not in EXPORT_FORMATS:
+    flask.abort(404)
+  dapp_names, month_slider, outcome_checklist, freezes = request_filters(flask.request.args)
+  positions = filter_positions(None, dapp_names, month_slider, outcome_checklist, **freezes)
+  return export_response(export_format, listings, positions, export_columns, chunksize=CHUNKSIZE)
+
+
+#### JSON query API
+
+# Read-only endpoints over the same query engine as the dashboard.  Every endpoint takes the filters of request_filters
+# & reports how long filtering ('filter_ms') & the computation ('compute_ms') took.
+#   /api/v1/count                                        Number of matching listings
+#   /api/v1/aggregate?dimension=<key>&by=dapp&by=month   Count, mean, min & max of a dimension per group (any of dapp, outcome, month)
+#   /api/v1/percentiles?dimension=<key>&q=50&q=90        Percentiles of a dimension
+#   /api/v1/rows?columns=<key>&limit=100&cursor=<cursor> A page of matching listings, in row order; follow 'next_cursor'
+API_PAGE_LIMIT = 1000
+
+@server.errorhandler(ApiError)
+def handle_api_error(error):
+  return flask.jsonify({'error': error.message}), error.status
+
+# Only numeric dimensions can be aggregated (not eg. 'name' or 'created_at_trunc')
+api_dimensions = numeric_columns(listings, [key for key in dimensions if key in listings.columns])
+
+def api_dimension(args):
+  dimension = args.get('dimension')
+  if dimension not in api_dimensions:
+    raise ApiError('dimension must be one of: ' + ', '.join(api_dimensions))
+  return dimension
+
+# Positions of the listings matching the request's filters, timed as the 'filter' phase
+def api_positions(timer):
+  dapp_names, month_slider, outcome_checklist, freezes = request_filters(flask.request.args)
+  positions = filter_positions(None, dapp_names, month_slider, outcome_checklist, **freezes)
+  timer.phase('filter')
+  return positions
+
+def api_response(timer, **payload):
+  timer.phase('compute')
+  return flask.jsonify(dict(payload, timing=timer.report()))
+
+@server.route('/api/v1/count')
+def api_count():
+  timer = Timer()
+  positions = api_positions(timer)
+  return api_response(timer, count=len(positions))
+
+@server.route('/api/v1/aggregate')
+def api_aggregate():
+  timer = Timer()
+  dimension = api_dimension(flask.request.args)
+  by = flask.request.args.getlist('by')
+  if any(group not in GROUP_COLUMNS for group in by):
+    raise ApiError('by must be any of: ' + ', '.join(sorted(GROUP_COLUMNS)))
+  positions = api_positions(timer)
+  return api_response(timer, dimension=dimension, by=by,
+                      groups=grouped_stats(listings, positions, dimension, list(dict.fromkeys(by)), chunksize=CHUNKSIZE))
+
+@server.route('/api/v1/percentiles')
+def api_percentiles():
+  timer = Timer()
+  dimension = api_dimension(flask.request.args)
+  try:
+    qs = [float(q) for q in flask.request.args.getlist('q')] or [5, 25, 50, 75, 95]
+  except ValueError:
+    raise ApiError('q must be a number between 0 & 100')
+  if any(q < 0 or q > 100 for q in qs):
+    raise ApiError('q must be a number between 0 & 100')
+  positions = api_positions(timer)
+  return api_response(timer, dimension=dimension, count=len(positions), percentiles=percentiles(listings, positions, dimension, qs))
+
+@server.route('/api/v1/rows')
+def api_rows():
+  timer = Timer()
+  columns = flask.request.args.getlist('columns') or export_columns
+  if any(column not in export_columns for column in columns):
+    raise ApiError('columns must be any of: ' + ', '.join(export_columns))
+  try:
+    limit = min(int(flask.request.args.get('limit', 100)), API_PAGE_LIMIT)
+  except ValueError:
+    raise ApiError('limit must be an integer')
+  if limit < 1:
+    raise ApiError('limit must be positive')
+  positions = api_positions(timer)
+  rows, next_cursor = row_page(listings, positions, columns, limit, flask.request.args.get('cursor'), response_cache.version)
+  return api_response(timer, count=len(positions), rows=rows, next_cursor=next_cursor)
 
 #### Initialize HTML for each Tab pane
 # Auction details tab
@@ -409,10 +1057,7 @@ auction_details_html = html.Div(
               [
                 dcc.Checklist(
                   id='auction-detail-freeze',
-                  options=[{'label': 'Token Item', 'value': 'token_item_id'},
-                           {'label': 'Buyer', 'value': 'to_address'},
-                           {'label': 'Seller', 'value': 'from_address'},
-                  ],
+                  options=freeze_options,
                   values=[],
                   labelStyle={'display': 'inline-block'}
                 )
@@ -452,6 +1097,54 @@ boxplot_html = html.Div(
                'padding-left': '50'}
         )
       ]
+    ),
+    # Summary of the listings box/lasso selected on the scatter
+    dcc.Graph(
+      id='selection-summary-display'
+    )
+  ]
+)
+
+
+# Item history tab
+item_history_html = html.Div(
+  [
+    dcc.Graph(
+      id='item-history-chart'
+    ),
+    dcc.Graph(
+      id='item-history-table'
+    )
+  ]
+)
+
+# Top traders tab
+top_traders_html = html.Div(
+  [
+    dcc.Graph(
+      id='top-traders-display'
+    ),
+    html.Div(
+      [
+        dcc.RadioItems(
+          id='top-traders-group',
+          options=freeze_options,
+          value='to_address',
+          labelStyle={'display': 'inline-block'}
+        ),
+        dcc.RadioItems(
+          id='top-traders-metric',
+          options=[
+            {'label': 'By Volume', 'value': 'value'
+            },
+            {'label': 'By Count', 'value': 'count'
+            }
+          ],
+          value='value',
+          labelStyle={'display': 'inline-block'}
+        )
+      ],
+      style={'padding-left': '50'}
     )
   ]
 )
@@ -742,7 +1435,7 @@ app.layout = html.Div(
             html.Div(
               [
                 html.P(
-                  'Sample Limit (per Series):',
+                  'Sample Limit:',
                   style={'margin-right': 8,
                          'font-family': 'Helvetica',
                          'font-weight': 'bold'
@@ -750,8 +1443,8 @@ app.layout = html.Div(
                 ),
                 dcc.Checklist(
                   id='sample-size-toggle',
-                  options=[{'label': '100,000', 'value': 100000}],
-                  values=[100000],
+                  options=[{'label': '{:,} points (density-preserving)'.format(SCATTER_POINT_BUDGET), 'value': SCATTER_POINT_BUDGET}],
+                  values=[SCATTER_POINT_BUDGET],
                   labelStyle={'display': 'inline-block'}
                 )
               ], className='advanced-filter'
@@ -772,6 +1465,19 @@ app.layout = html.Div(
           [
             dcc.Graph(
               id='auction-scatter'
+            ),
+            # Download links for the listings behind the scatter, kept in sync with the filters
+            html.Div(
+              [
+                html.Span('Download these listings: ', style={'font-weight': 'bold', 'color': 'rgb(72, 72, 72)'}),
+                html.A('CSV', id='export-csv-link', href='/export/listings.csv'),
+                # Hidden (but kept, as its href is a callback output) where pyarrow isn't installed
+                html.Span(
+                  [html.Span(' | '), html.A('Parquet', id='export-parquet-link', href='/export/listings.parquet')],
+                  style={} if export_available('parquet') else {'display': 'none'}
+                )
+              ],
+              style={'font-family': 'Helvetica', 'font-size': '12', 'text-align': 'right'}
             )
           ],
           className='seven columns',
@@ -793,6 +1499,16 @@ app.layout = html.Div(
                   label='App Comparison Boxplot',
                   children=[boxplot_html],
                   style={'font-weight': 'bold'}
+                ),
+                dcc.Tab(
+                  label='Item History',
+                  children=[item_history_html],
+                  style={'font-weight': 'bold'}
+                ),
+                dcc.Tab(
+                  label='Top Traders',
+                  children=[top_traders_html],
+                  style={'font-weight': 'bold'}
                 )
               ],
               style={'font-family': 'Helvetica'
@@ -865,7 +1581,8 @@ app.layout = html.Div(
                 ,'margin': 'auto', 'padding': '8px', 'border-radius': '18px', 'border': 'grey solid'}
   ),
   html.Div(id='sample-cache', style={'display': 'none'}),
-  html.Div(id='selected-listing-cache', style={'display': 'none'})
+  html.Div(id='selected-listing-cache', style={'display': 'none'}),
+  html.Div(id='scatter-selection-cache', style={'display': 'none'})
 ],className='row'
 )
 
@@ -890,65 +1607,52 @@ app.layout = html.Div(
     ]
 )
 
+@coalescer.coalesced('update_scatter', current_session_token)
 def update_scatter(sample_index, names, marker_symbols, x_axis, y_axis, month_slider, outcome_checklist, x_axis_scale, y_axis_scale,
-                   auction_detail_freeze, index_id):
-    # Filter scatterplot to frozen attributes, if selected
-    if 'token_item_id' in auction_detail_freeze:
-      token_item_id = df.loc[index_id, ['token_item_id']].values[0]
-    else:
-       token_item_id = None
+                   auction_detail_freeze, selected_listing_handle):
+    index_id = get_session_value(selected_listing_handle, 'selected-listing', default_listing_id())
 
-    if 'to_address' in auction_detail_freeze:
-      to_address = df.loc[index_id, ['to_address']].values[0]
-    else:
-       to_address = None
+    # Filter scatterplot to frozen attributes, if selected
+    freezes = frozen_attributes(auction_detail_freeze, index_id)
 
-    if 'from_address' in auction_detail_freeze:
-      from_address = df.loc[index_id, ['from_address']].values[0]
-    else:
-      from_address = None
+    # Primary DF filter.  When sampling is enabled, the scatter is thinned from the full (unsampled) filtered set
+    # with the density-preserving sampler instead of the flat per-series sample.
+    positions = scatter_positions(sample_index, names, month_slider, outcome_checklist, x_axis, x_axis_scale, y_axis, y_axis_scale,
+                                  freezes)
 
-    # Primary DF filter
-    filtered_df = filter_dataframe(df=df, sample_index=sample_index, dapp_names=names, month_slider=month_slider, outcome_checklist=outcome_checklist,
-                                   token_item_id=token_item_id, to_address=to_address, from_address=from_address)
+    # Projected to the columns the traces need
+    columns = list(dict.fromkeys(['name', x_axis, y_axis] + [entry['df_filter_key'] for entry in marker_symbols]))
+    filtered_df = listings.take(positions, columns)
+    coalescer.checkpoint()
     traces = []
 
     # Plot individual traces for each dapp name and auction outcome dimension (if applicable)
     for i, name in enumerate(names):
+        coalescer.checkpoint()
         df_by_name = filtered_df[filtered_df['name'] == name]
+        if SCATTER_ENCODING == 'per-dapp':
+          codes = styling_codes(df_by_name[marker_symbols[0]['df_filter_key']].values, marker_symbols)
+          df_by_name, codes = df_by_name[codes >= 0], codes[codes >= 0]
+          traces.append(trace_templates.dapp_trace(name, marker_symbols, codes,
+                  x = df_by_name[x_axis].values,
+                  y = df_by_name[y_axis].values,
+                  customdata = df_by_name.index.values
+                ))
+          continue
+        templates = trace_templates.scatter_traces(name, marker_symbols)
         for j, entry in enumerate(marker_symbols):
           if entry['df_filter_value'] is None:
             df_by_shape = df_by_name
           else:
             df_by_shape = df_by_name[df_by_name[entry['df_filter_key']] == entry['df_filter_value']]
-          trace = go.Scattergl(
-                  x = df_by_shape[x_axis],
-                  y = df_by_shape[y_axis],
-                  mode = 'markers',
-                  name = name,
-                  legendgroup = name,
-                  showlegend = False if j != 0 else True,
-                  customdata = df_by_shape.index,
-                  selected = dict(
-                    marker = dict(
-                      size = 10,
-                      color = 'black'
-                    )
-                  ),
-                  marker = dict(
-                      symbol = entry.get('symbol','circle'),
-                      opacity = 0.85,
-                      size = entry.get('size', 6),
-                      color = palette_name_dict[name],
-                      line = dict(
-                          width = 1,
-                          color = entry.get('line_color', 'rgb(153, 153, 153)')
-                      )
-                  )
+          trace = fill_trace(templates[j],
+                  x = df_by_shape[x_axis].values,
+                  y = df_by_shape[y_axis].values,
+                  customdata = df_by_shape.index.values
                 )
           traces.append(trace)
 
-    layout = go.Layout(
+    layout = layout_spec(
             title = 'Scatter Plot of Individual Listings',
             hovermode='closest',
             height=598.5,
@@ -981,10 +1685,10 @@ def update_scatter(sample_index, names, marker_symbols, x_axis, y_axis, month_sl
             )
         )
 
-    return  {
+    return  checked_figure({
         'data': traces,
         'layout': layout
-      }
+      })
 
 ## Boxplot
 
@@ -999,30 +1703,34 @@ def update_scatter(sample_index, names, marker_symbols, x_axis, y_axis, month_sl
       dash.dependencies.Input('y-axis-picker', 'value'),
       dash.dependencies.Input('box-axis-selector', 'value'),
       dash.dependencies.Input('x-axis-scale', 'value'),
-      dash.dependencies.Input('y-axis-scale', 'value')
+      dash.dependencies.Input('y-axis-scale', 'value'),
+      dash.dependencies.Input('scatter-selection-cache', 'children')
     ])
 
-def update_boxplot(sample_index, names, month_slider, outcome_checklist, x_axis, y_axis, box_axis_selector, x_axis_scale, y_axis_scale):
-  filtered_df = filter_dataframe(df, sample_index, names, month_slider, outcome_checklist)
+@coalescer.coalesced('update_boxplot', current_session_token)
+def update_boxplot(sample_index, names, month_slider, outcome_checklist, x_axis, y_axis, box_axis_selector, x_axis_scale, y_axis_scale,
+                   selection_handle):
+  axis = x_axis if box_axis_selector == 'x_axis' else y_axis
+  axis_scale = x_axis_scale if box_axis_selector == 'x_axis' else y_axis_scale
+  selection = active_selection(selection_handle, x_axis, x_axis_scale, y_axis, y_axis_scale)
+  if selection is None:
+    filtered_df = filter_dataframe(sample_index, names, month_slider, outcome_checklist, columns=['name', axis])
+  else:
+    # Selected listings, still sampled to the point budget (if enabled) to bound the number of points sent
+    positions = selection_positions(selection, names, month_slider, outcome_checklist)
+    positions = listings.budget_sample(positions, parse_sample_handle(sample_index))
+    filtered_df = listings.take(positions, ['name', axis])
   traces = []
 
   for name in names:
-    axis = x_axis if box_axis_selector == 'x_axis' else y_axis
-    axis_scale = x_axis_scale if box_axis_selector == 'x_axis' else y_axis_scale
-    trace = go.Box(
-      y=filtered_df[filtered_df['name'] == name][axis],
-      boxpoints='outliers',
-      marker=dict(#color=palette_name_dict[name],
-                  line=dict(outliercolor='rgb(153, 153, 153)')
-                  ),
-      line=dict(color='rgb(153, 153, 153)'),
-      fillcolor=palette_name_dict[name],
-      name=name
+    coalescer.checkpoint()
+    trace = fill_trace(trace_templates.box[name],
+      y=filtered_df[filtered_df['name'] == name][axis].values
       )
     traces.append(trace)
 
-  layout = go.Layout(
-    title = f'Boxplot ({dimensions[axis]["label"]})',
+  layout = layout_spec(
+    title = f'Boxplot ({dimensions[axis]["label"]}{", selected listings" if selection is not None else ""})',
     hoverlabel = dict(
       bgcolor = 'rgba(153, 153, 153, 0.35)'
       ),
@@ -1038,24 +1746,314 @@ def update_boxplot(sample_index, names, month_slider, outcome_checklist, x_axis,
       )
     )
 
-  return {'data':traces,
+  return checked_figure({'data':traces,
           'layout':layout
-  }
+  })
+
+## Item history
+## Price over time & the listing/sale sequence of the selected listing's token item, across the whole data set.
+## Rows come from the item index built at load, so the cost is proportional to the item's history, not the data set.
+
+@app.callback(
+    dash.dependencies.Output('item-history-chart', 'figure'),
+    [dash.dependencies.Input('selected-listing-cache', 'children')]
+)
+def update_item_history_chart(selected_listing_handle):
+  index_id = get_session_value(selected_listing_handle, 'selected-listing', default_listing_id())
+  name, token_item_id = listings.lookup(index_id, ['name', 'token_item_id']).values
+  history_df = item_history(token_item_id, item_history_columns)
+  sold_df = history_df[history_df['resolution_event_type'] == 'sold']
+
+  traces = [
+    trace_spec('scatter',
+      x = history_df['created_at'],
+      y = history_df['listing_start_price_normalized'],
+      mode = 'lines+markers',
+      name = dimensions['listing_start_price_normalized']['label'],
+      line = dict(color=palette_name_dict[name], shape='hv'),
+      marker = dict(size = 6)
+    ),
+    trace_spec('scatter',
+      x = sold_df['created_at'],
+      y = sold_df['resolution_sale_price_normalized'],
+      mode = 'markers',
+      name = dimensions['resolution_sale_price_normalized']['label'],
+      marker = dict(symbol = 'star', size = 12, color = 'black')
+    )
+  ]
+
+  layout = layout_spec(
+    title = f'{name} item history ({len(history_df)} listings, {len(sold_df)} sales)',
+    hovermode = 'closest',
+    height = 300,
+    xaxis = dict(
+      title = 'Listed'
+      ),
+    yaxis = dict(
+      type = 'log',
+      tickformat = dimensions['listing_start_price_normalized'].get('format', '~g'),
+      hoverformat = dimensions['listing_start_price_normalized'].get('format', '.2f')
+      ),
+    legend = dict(
+      orientation = 'h'
+      ),
+    margin = dict(
+      t = 30,
+      b = 30,
+      r = 10
+      )
+    )
+
+  return checked_figure({'data': traces, 'layout': layout})
+
+@app.callback(
+    dash.dependencies.Output('item-history-table', 'figure'),
+    [dash.dependencies.Input('selected-listing-cache', 'children')]
+)
+def update_item_history_table(selected_listing_handle):
+  index_id = get_session_value(selected_listing_handle, 'selected-listing', default_listing_id())
+  token_item_id = listings.lookup(index_id, ['token_item_id']).values[0]
+  history_df = item_history(token_item_id, item_history_columns)
+  value_columns = item_history_columns[2:]
+
+  trace = trace_spec('table',
+    header = dict(
+      values = ['<b>Listed</b>', '<b>Outcome</b>'] + [f'<b>{dimensions[key]["label"]}</b>' for key in value_columns],
+      line = dict(color='#7D7F80'),
+      fill = dict(color='rgba(153, 153, 153, 0.35)'),
+      align = ['left'] * len(item_history_columns),
+      font = dict(family = 'Helvetica',
+                  size = 12)
+      ),
+    cells = dict(
+      values = [history_df['created_at'].dt.strftime('%Y-%m-%d %H:%M').values, history_df['resolution_event_type'].astype(str).values]
+               + [history_df[key].values for key in value_columns],
+      line = dict(color='#7D7F80'),
+      # The selected listing's row is highlighted
+      fill = dict(color=[['rgb(247, 248, 249)' if index != index_id else 'rgba(153, 153, 153, 0.35)' for index in history_df.index]]
+                        * len(item_history_columns)),
+      align = ['left', 'left'] + ['center'] * len(value_columns),
+      height = 25,
+      format = [None, None] + [dimensions[key].get('format', None) for key in value_columns],
+      font = dict(family = 'Helvetica',
+                  size = 11))
+  )
+
+  layout = layout_spec(
+    margin=dict(
+      b=0,
+      t=10,
+      l=10,
+      r=10
+      ),
+    height=300
+  )
+
+  return checked_figure({'data': [trace], 'layout': layout})
+
+## Export links
+## Point the download links at the export route, with the scatter's current filters (including any freezes)
+
+def generate_export_href(export_format, names, month_slider, outcome_checklist, auction_detail_freeze, selected_listing_handle):
+  index_id = get_session_value(selected_listing_handle, 'selected-listing', default_listing_id())
+  freezes = frozen_attributes(auction_detail_freeze, index_id)
+  return '/export/listings.{}?{}'.format(export_format, filter_query_string(names, month_slider, outcome_checklist, freezes))
+
+export_link_inputs = [
+  dash.dependencies.Input('name-picker', 'value'),
+  dash.dependencies.Input('month-slider', 'value'),
+  dash.dependencies.Input('outcome-checklist', 'values'),
+  dash.dependencies.Input('auction-detail-freeze', 'values'),
+  dash.dependencies.Input('selected-listing-cache', 'children')
+]
+
+@app.callback(dash.dependencies.Output('export-csv-link', 'href'), export_link_inputs)
+def update_export_csv_link(names, month_slider, outcome_checklist, auction_detail_freeze, selected_listing_handle):
+  return generate_export_href('csv', names, month_slider, outcome_checklist, auction_detail_freeze, selected_listing_handle)
+
+@app.callback(dash.dependencies.Output('export-parquet-link', 'href'), export_link_inputs)
+def update_export_parquet_link(names, month_slider, outcome_checklist, auction_detail_freeze, selected_listing_handle):
+  return generate_export_href('parquet', names, month_slider, outcome_checklist, auction_detail_freeze, selected_listing_handle)
+
+## Top traders
+## Ranks buyers, sellers or items over the full (unsampled) dataset for the current dapp, month & outcome filters.
+## Totals come from the precomputed per-partition aggregates (see aggregates.py), so no listing rows are read.
+
+@app.callback(
+    dash.dependencies.Output('top-traders-display', 'figure'),
+    [
+      dash.dependencies.Input('name-picker', 'value'),
+      dash.dependencies.Input('month-slider', 'value'),
+      dash.dependencies.Input('outcome-checklist', 'values'),
+      dash.dependencies.Input('top-traders-group', 'value'),
+      dash.dependencies.Input('top-traders-metric', 'value')
+    ])
+def update_top_traders(names, month_slider, outcome_checklist, group, metric):
+  time_range = (add_months(start_time, month_slider[0]), add_months(start_time, month_slider[1] + 1))
+  top = trader_aggregates[group].top(names, outcome_checklist, time_range, n=top_trader_count, by=metric)
+  group_label = [option['label'] for option in freeze_options if option['value'] == group][0]
+
+  trace = trace_spec('table',
+    header = dict(
+      values = ['<b>#</b>', f'<b>{group_label}</b>', '<b>Listings</b>', f'<b>{dimensions[trade_volume_column]["label"]} Volume</b>'],
+      line = dict(color='#7D7F80'),
+      fill = dict(color='rgba(153, 153, 153, 0.35)'),
+      align = ['left'] * 4,
+      font = dict(family = 'Helvetica',
+                  size = 14)
+      ),
+    columnwidth = [1, 6, 2, 3],
+    cells = dict(
+      values = [list(range(1, len(top) + 1)), top['group'].values, top['count'].values, top['value'].values],
+      line = dict(color='#7D7F80'),
+      fill = dict(color='rgb(247, 248, 249)'),
+      align = ['left', 'left', 'center', 'center'],
+      height = 25,
+      format = [None, None, ',', dimensions[trade_volume_column].get('format', None)],
+      font = dict(family = 'Helvetica',
+                  size = 12))
+  )
+
+  layout = layout_spec(
+    margin=dict(
+      b=0,
+      t=10,
+      l=10,
+      r=10
+      ),
+    height=450
+  )
 
-## This function updates a hidden Div to contain the index ID of the most-recently-clicked marker in the scatterplot
+  return checked_figure({'data': [trace], 'layout': layout})
+
+## Scatter selection
+## A box or lasso selection on the scatter is stored in the session (along with the axes it was drawn on & any freezes),
+## and a hidden Div holds a handle to it.  The boxplot & the selection summary resolve it against the unsampled data.
+
+@app.callback(
+    dash.dependencies.Output('scatter-selection-cache', 'children'),
+    [dash.dependencies.Input('auction-scatter', 'selectedData')],
+    [
+      dash.dependencies.State('x-axis-picker', 'value'),
+      dash.dependencies.State('x-axis-scale', 'value'),
+      dash.dependencies.State('y-axis-picker', 'value'),
+      dash.dependencies.State('y-axis-scale', 'value'),
+      dash.dependencies.State('auction-detail-freeze', 'values'),
+      dash.dependencies.State('selected-listing-cache', 'children')
+    ]
+)
+def update_scatter_selection(selected_data, x_axis, x_axis_scale, y_axis, y_axis_scale, auction_detail_freeze, selected_listing_handle):
+  polygon = selection_polygon(selected_data)
+  if polygon is None:
+    return ''
+  index_id = get_session_value(selected_listing_handle, 'selected-listing', default_listing_id())
+  return put_session_value('scatter-selection', {
+    'axes': [x_axis, x_axis_scale, y_axis, y_axis_scale],
+    'polygon': polygon,
+    'freezes': frozen_attributes(auction_detail_freeze or [], index_id)
+  })
+
+# Small selections are listed listing by listing; larger ones are aggregated per app (count, sales & medians),
+# so the response size doesn't grow with the selection
+
+@app.callback(
+    dash.dependencies.Output('selection-summary-display', 'figure'),
+    [
+      dash.dependencies.Input('scatter-selection-cache', 'children'),
+      dash.dependencies.Input('name-picker', 'value'),
+      dash.dependencies.Input('month-slider', 'value'),
+      dash.dependencies.Input('outcome-checklist', 'values'),
+      dash.dependencies.Input('x-axis-picker', 'value'),
+      dash.dependencies.Input('y-axis-picker', 'value'),
+      dash.dependencies.Input('x-axis-scale', 'value'),
+      dash.dependencies.Input('y-axis-scale', 'value')
+    ])
+def update_selection_summary(selection_handle, names, month_slider, outcome_checklist, x_axis, y_axis, x_axis_scale, y_axis_scale):
+  selection = active_selection(selection_handle, x_axis, x_axis_scale, y_axis, y_axis_scale)
+  x_label, y_label = dimensions[x_axis]['label'], dimensions[y_axis]['label']
+  x_format, y_format = dimensions[x_axis].get('format', None), dimensions[y_axis].get('format', None)
+
+  if selection is None:
+    header = ['<b>Selection</b>']
+    values = [['Use the box or lasso select tools on the scatter plot to summarize a group of listings']]
+    formats = [None]
+  else:
+    positions = selection_positions(selection, names, month_slider, outcome_checklist)
+    filtered_df = listings.take(positions, ['name', 'resolution_event_type', x_axis, y_axis])
+    if len(filtered_df) <= selection_detail_limit:
+      header = ['<b>App</b>', '<b>Listing</b>', f'<b>{x_label}</b>', f'<b>{y_label}</b>']
+      values = [filtered_df['name'].astype(str).values, filtered_df.index.values, filtered_df[x_axis].values, filtered_df[y_axis].values]
+      formats = [None, None, x_format, y_format]
+    else:
+      by_name = filtered_df.groupby(filtered_df['name'].astype(str))
+      sold = (filtered_df['resolution_event_type'] == 'sold').groupby(filtered_df['name'].astype(str)).sum()
+      header = ['<b>App</b>', '<b>Listings</b>', '<b>Sold</b>', f'<b>Median {x_label}</b>', f'<b>Median {y_label}</b>']
+      values = [list(by_name.size().index) + ['All'],
+                list(by_name.size().values) + [len(filtered_df)],
+                list(sold.values.astype(int)) + [int(sold.sum())],
+                list(by_name[x_axis].median().values) + [filtered_df[x_axis].median()],
+                list(by_name[y_axis].median().values) + [filtered_df[y_axis].median()]]
+      formats = [None, ',', ',', x_format, y_format]
+
+  trace = trace_spec('table',
+    header = dict(
+      values = header,
+      line = dict(color='#7D7F80'),
+      fill = dict(color='rgba(153, 153, 153, 0.35)'),
+      align = ['left'] * len(header),
+      font = dict(family = 'Helvetica',
+                  size = 14)
+      ),
+    cells = dict(
+      values = values,
+      line = dict(color='#7D7F80'),
+      fill = dict(color='rgb(247, 248, 249)'),
+      align = ['left'] + ['center'] * (len(header) - 1),
+      height = 25,
+      format = formats,
+      font = dict(family = 'Helvetica',
+                  size = 12))
+  )
+
+  layout = layout_spec(
+    margin=dict(
+      b=0,
+      t=10,
+      l=10,
+      r=10
+      ),
+    height=250
+  )
+
+  return checked_figure({'data': [trace], 'layout': layout})
+
+## This function stores the index ID of the most-recently-clicked marker in the scatterplot in the session,
+## and updates a hidden Div to contain a handle to it.
+## Before anything is clicked, the first point of the first non-empty scatter trace is selected.  That point is derived
+## from the (cached) filter state rather than from the rendered figure, so the figure never has to be posted back.
 
 @app.callback(
     dash.dependencies.Output('selected-listing-cache', 'children'),
     [dash.dependencies.Input('auction-scatter', 'clickData'),
-     dash.dependencies.Input('auction-scatter', 'figure')
+     dash.dependencies.Input('sample-cache', 'children'),
+     dash.dependencies.Input('name-picker', 'value'),
+     dash.dependencies.Input('marker-symbol-picker', 'value'),
+     dash.dependencies.Input('month-slider', 'value'),
+     dash.dependencies.Input('outcome-checklist', 'values'),
+     dash.dependencies.Input('x-axis-picker', 'value'),
+     dash.dependencies.Input('x-axis-scale', 'value'),
+     dash.dependencies.Input('y-axis-picker', 'value'),
+     dash.dependencies.Input('y-axis-scale', 'value')
      ]
 )
-def update_selected_listing_cache(click_data, figure):
+def update_selected_listing_cache(click_data, sample_index, names, marker_symbols, month_slider, outcome_checklist, x_axis, x_axis_scale,
+                                  y_axis, y_axis_scale):
   if click_data is None:
-    index_id = figure['data'][0]['customdata'][0]
+    index_id = first_scatter_listing_id(sample_index, names, marker_symbols, month_slider, outcome_checklist, x_axis, x_axis_scale,
+                                        y_axis, y_axis_scale)
   else:
     index_id = click_data['points'][0]['customdata']
-  return index_id
+  return put_session_value('selected-listing', int(index_id))
 
 # This function draws the auction details table, which contains information about the most recently clicked scatter marker
 
@@ -1063,13 +2061,14 @@ def update_selected_listing_cache(click_data, figure):
     dash.dependencies.Output('auction-specifics-display', 'figure'),
     [dash.dependencies.Input('selected-listing-cache', 'children')]
 )
-def update_auction_detail_table(index_id):
+def update_auction_detail_table(selected_listing_handle):
+  index_id = get_session_value(selected_listing_handle, 'selected-listing', default_listing_id())
   # Select id of first datapoint in scatter to initialize as a default on pageload
-  filtered_df = df.loc[index_id, sorted_inspector_keys]
+  filtered_df = listings.lookup(index_id, sorted_inspector_keys)
   dapp_color = palette_name_dict[filtered_df['name']]
 
   traces = []
-  trace = go.Table(
+  trace = trace_spec('table',
     header = dict(
       values = ["<b>Auction Details</b>", "<b>Value</b>"],
       line = dict(color='#7D7F80'),
@@ -1096,7 +2095,7 @@ def update_auction_detail_table(index_id):
                   size = 12))
   )
 
-  layout = go.Layout(
+  layout = layout_spec(
     margin=dict(
       b=0,
       t=10,
@@ -1108,7 +2107,7 @@ def update_auction_detail_table(index_id):
 
   traces.append(trace)
 
-  return {'data': traces, 'layout': layout}
+  return checked_figure({'data': traces, 'layout': layout})
 
 # This function generates the 'external listing pane' from the current listing selection cache.
 # It renders a link to Rarebits.IO, as well as an externally hosted image URL, within an HTML Div.
@@ -1117,10 +2116,10 @@ def update_auction_detail_table(index_id):
     dash.dependencies.Output('external-link', 'children'),
     [dash.dependencies.Input('selected-listing-cache', 'children')]
 )
-def generate_external_link(index_id):
-  name = df.loc[index_id, ['name']].values[0]
-  token_id = df.loc[index_id, ['token_id']].values[0]
-  image_url = df.loc[index_id, ['image_url']].values[0]
+def generate_external_link(selected_listing_handle):
+  index_id = get_session_value(selected_listing_handle, 'selected-listing', default_listing_id())
+  name = listings.lookup(index_id, ['name']).values[0]
+  token_id = side_store.lookup(index_id, ['token_id']).values[0]
   output = html.A(
     [
       html.Div(
@@ -1135,7 +2134,7 @@ def generate_external_link(index_id):
             ], style = {'width': '140', 'margin-top': '4'}
           ),
           html.Img(
-            src=image_url,
+            src=listing_image_url(index_id),
             style={
                 'display': 'inline',
                 'height': 'inherit',
@@ -1207,18 +2206,17 @@ def set_checkbox_options(x_axis):
 def set_checkbox_options(y_axis):
     return dimensions[y_axis].get('default_axis_type', 'linear')
 
-# If the "Sample Series" setting is selected, send a JSON list of sampled index values to a hidden Div in the browser
-# If unselected, send an empty JSON list
+# If the "Sample Series" setting is selected, send a handle to the sample to a hidden Div in the browser
+# If unselected, send an empty handle
 
 @app.callback(
   dash.dependencies.Output('sample-cache', 'children'),
   [dash.dependencies.Input('sample-size-toggle', 'values')])
 def sample_dataset(sample_size_toggle):
   if sample_size_toggle != []:
-    sampled_dataframe = sample_dataframe(df, sample_size_toggle[0])
-    return json.dumps(sampled_dataframe)
+    return make_sample_handle(sample_size_toggle[0], SAMPLE_SEED)
   else:
-    return '{}'
+    return ''
 
 # If any of the "freeze" options are selected from the auction details pane, automatically disable series sampling
 # If those options are disabled, re-enable sampling
@@ -1228,9 +2226,66 @@ def sample_dataset(sample_size_toggle):
   [dash.dependencies.Input('auction-detail-freeze', 'values')])
 def remove_sample_restriction(auction_detail_freeze):
   if auction_detail_freeze == []:
-    return [100000]
+    return [SCATTER_POINT_BUDGET]
   else:
     return []
 
+#### Warm the default page state
+
+# Replays the page-load callback chain against the layout defaults, in dependency order, the same way the renderer does.
+# Each response is stored pre-compressed so that first paint for every visitor is a cache read.
+def warm_default_responses():
+  url = [rule.rule for rule in server.url_map.iter_rules() if rule.rule.endswith('_dash-update-component')][0]
+  client = server.test_client()
+  values = {}
+
+  def value_of(component_id, component_property):
+    if (component_id, component_property) not in values:
+      values[(component_id, component_property)] = getattr(app.layout[component_id], component_property, None)
+    return values[(component_id, component_property)]
+
+  pending = {tuple(target.rsplit('.', 1)): callback for target, callback in app.callback_map.items()}
+  while pending:
+    ready = [target for target, callback in pending.items()
+             if not any((c['id'], c['property']) in pending for c in callback['inputs'])]
+    if ready == []:
+      break
+    for target in ready:
+      callback = pending.pop(target)
+      body = {
+        'output': {'id': target[0], 'property': target[1]},
+        'inputs': [dict(c, value=value_of(c['id'], c['property'])) for c in callback['inputs']],
+        'state': [dict(c, value=value_of(c['id'], c['property'])) for c in callback.get('state', [])]
+      }
+      result = client.post(url, data=json.dumps(body), content_type='application/json', headers={'Accept-Encoding': 'gzip'})
+      if result.status_code != 200:
+        continue
+      data = result.data
+      if result.headers.get('Content-Encoding') == 'gzip':
+        data = gzip.decompress(data)
+      key = response_cache.key_for(body)
+      cacheable = response_cache.is_cacheable(body) and 'no-store' not in result.headers.get('Cache-Control', '')
+      if cacheable and response_cache.pin(key) is None:
+        response_cache.put(key, data, pin=True)
+      values[target] = json.loads(data.decode('utf-8'))['response']['props'][target[1]]
+
+# With a snapshot, the warmed responses are saved alongside it.  They depend on the code & display settings too, so they're keyed by a hash of both.
+if PRECOMPUTE_DEFAULT_STATE:
+  if snapshot is None:
+    warm_default_responses()
+  else:
+    responses_dir = snapshot.path('responses-' + snapshot_digest(source_digest(os.path.dirname(os.path.abspath(__file__))), {
+      'budget': SCATTER_POINT_BUDGET,
+      'seed': SAMPLE_SEED,
+      'series_min_points': SAMPLE_SERIES_MIN_POINTS,
+      'encoding': SCATTER_ENCODING
+    }))
+    if not response_cache.load_pinned(responses_dir):
+      warm_default_responses()
+      response_cache.save_pinned(responses_dir)
+  record_boot_phase('warm')
+
+sys.stderr.write('Boot: {}\n'.format(', '.join('{} {:.2f}s'.format(phase, seconds) for phase, seconds in boot_timings)))
+
 if __name__ == '__main__':
     app.run_server(debug=debug)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import time
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import LRUCache, TTLCache
+
+#### Request coalescing for bursty callbacks
+
+# Raised when a newer request for the same (session, callback) pair has arrived.
+# Flask turns this into an empty 204 response, which the Dash renderer discards.
+class SupersededError(Exception):
+  pass
+
+## Runs heavy callbacks on a bounded worker pool, keeping only the newest request per session alive
+# max_workers:     Size of the shared figure-building pool
+# settle_seconds:  How long a request waits on its own thread before claiming a worker.
+#                  Requests superseded within this window never reach the pool.
+# max_sessions:    Number of (session, callback) generation counters to remember
+# context:         Optional wrapper applied to each job on the request thread (eg. flask.copy_current_request_context)
+
+class CallbackCoalescer(object):
+  def __init__(self, max_workers=2, settle_seconds=0.05, max_sessions=10000, context=None):
+    self.context = context
+    self.executor = ThreadPoolExecutor(max_workers=max_workers)
+    self.settle_seconds = settle_seconds
+    self.generations = LRUCache(maxsize=max_sessions)
+    self.lock = threading.Lock()
+    self.local = threading.local()
+
+  # Register a new request for a key and return its generation number
+  def begin(self, key):
+    with self.lock:
+      generation = self.generations.get(key, 0) + 1
+      self.generations[key] = generation
+    return generation
+
+  def is_current(self, key, generation):
+    with self.lock:
+      return self.generations.get(key) == generation
+
+  # Called from inside a running callback (between traces, after filtering, etc).
+  # Aborts the computation if a newer request for the same key has been registered.
+  def checkpoint(self):
+    job = getattr(self.local, 'job', None)
+    if job is not None and not self.is_current(*job):
+      raise SupersededError('Superseded by a newer request for {}'.format(job[0]))
+
+  def run(self, key, fn, *args, **kwargs):
+    generation = self.begin(key)
+    if self.settle_seconds:
+      time.sleep(self.settle_seconds)
+    if not self.is_current(key, generation):
+      raise SupersededError('Superseded by a newer request for {}'.format(key))
+
+    def job():
+      self.local.job = (key, generation)
+      try:
+        self.checkpoint()
+        return fn(*args, **kwargs)
+      finally:
+        self.local.job = None
+
+    if self.context is not None:
+      job = self.context(job)
+    return self.executor.submit(job).result()
+
+  # Decorator form; session_key is a zero-argument function evaluated on the request thread
+  def coalesced(self, name, session_key):
+    def decorator(fn):
+      @functools.wraps(fn)
+      def wrapper(*args, **kwargs):
+        return self.run((session_key(), name), fn, *args, **kwargs)
+      return wrapper
+    return decorator
+
+#### Shared results for identical concurrent computations
+
+## Short-lived keyed cache where concurrent callers asking for the same key share a single computation
+# maxsize:  Number of results to keep
+# ttl:      Seconds a result stays valid
+
+class SharedResultCache(object):
+  def __init__(self, maxsize=32, ttl=30):
+    self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+    self.lock = threading.Lock()
+    self.inflight = {}
+
+  def get(self, key, compute):
+    with self.lock:
+      if key in self.cache:
+        return self.cache[key]
+      event = self.inflight.get(key)
+      owner = event is None
+      if owner:
+        event = self.inflight[key] = threading.Event()
+
+    if not owner:
+      # Another thread is computing this key; wait for it, then fall back to computing ourselves if it failed
+      event.wait()
+      with self.lock:
+        if key in self.cache:
+          return self.cache[key]
+      return compute()
+
+    try:
+      result = compute()
+      with self.lock:
+        self.cache[key] = result
+      return result
+    finally:
+      with self.lock:
+        del self.inflight[key]
+      event.set()
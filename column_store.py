@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import threading
+import numpy as np
+import pandas as pd
+
+#### Columnar listings tables, in memory or out of core
+
+# Layout of a store directory:
+#   meta.json              Row count, column kinds & dtypes, index column, and per-chunk min/max statistics
+#   <column>.bin           Raw little-endian column values, memory-mapped on open
+#   <column>.categories.npy  Fixed-width UTF-8 category labels for string columns (codes live in <column>.bin)
+#
+# Column kinds:
+#   numeric:   Stored in their loaded dtype
+#   datetime:  Stored as datetime64[ns]
+#   category:  Stored as int32 codes (-1 for missing) against an on-disk table of labels.  All string columns use this.
+
+META_FILE = 'meta.json'
+MISSING_CODE = -1
+# String columns with more labels than this are returned as plain objects rather than pandas Categoricals
+CATEGORICAL_LABEL_LIMIT = 1024
+
+def column_file(directory, column):
+  return os.path.join(directory, column + '.bin')
+
+def categories_file(directory, column):
+  return os.path.join(directory, column + '.categories.npy')
+
+# Storage kind & dtype of a loaded pandas column
+def column_spec(series):
+  if pd.api.types.is_datetime64_any_dtype(series):
+    return {'kind': 'datetime', 'dtype': 'datetime64[ns]'}
+  if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_categorical_dtype(series) and not pd.api.types.is_bool_dtype(series):
+    return {'kind': 'numeric', 'dtype': series.dtype.str}
+  return {'kind': 'category', 'dtype': '<i4'}
+
+# JSON-serializable [min, max] of a chunk of numeric or datetime values (datetimes as int64 nanoseconds), ignoring NaN/NaT
+def chunk_stats(values):
+  if values.dtype.kind == 'M':
+    valid = values[~np.isnat(values)]
+    return [int(valid.min().astype(np.int64)), int(valid.max().astype(np.int64))] if len(valid) else [None, None]
+  valid = values[~np.isnan(values)] if values.dtype.kind == 'f' else values
+  return [valid.min().item(), valid.max().item()] if len(valid) else [None, None]
+
+## Columnar table of NumPy arrays: numeric & datetime columns as-is, string columns as int32 codes against a table of
+## UTF-8 labels.  Rows are split into chunks with per-column min/max statistics, which let range predicates skip whole chunks.
+## The arrays can be held in RAM (from_frame) or memory-mapped from disk (ColumnStore).
+
+class ColumnarTable(object):
+  def __init__(self, columns, arrays, labels, index, index_name, chunks):
+    self.columns = columns
+    self.arrays = arrays
+    self.labels = labels
+    self.chunks = chunks
+    self.rows = len(index)
+    self.index_name = index_name
+
+    # Listing ids stay resident, along with a sorted copy for id -> position lookups
+    self.index = np.asarray(index)
+    self.index_order = np.argsort(self.index, kind='mergesort')
+    self.sorted_index = self.index[self.index_order]
+
+  # Build an in-memory table from a DataFrame indexed by listing id
+  @classmethod
+  def from_frame(cls, df, chunksize=50000):
+    columns = {}
+    arrays = {}
+    labels = {}
+    for column in df.columns:
+      series = df[column]
+      spec = columns[column] = column_spec(series)
+      if spec['kind'] == 'category':
+        codes, uniques = pd.factorize(series)
+        arrays[column] = codes.astype(np.int32)
+        labels[column] = np.array([str(value).encode('utf-8') for value in uniques], dtype=np.bytes_)
+      else:
+        arrays[column] = series.values.astype(spec['dtype'])
+
+    chunks = []
+    for start in range(0, len(df), chunksize):
+      stop = min(start + chunksize, len(df))
+      stats = {column: chunk_stats(arrays[column][start:stop]) for column, spec in columns.items() if spec['kind'] != 'category'}
+      chunks.append({'start': start, 'stop': stop, 'stats': stats})
+    return cls(columns, arrays, labels, df.index.values, df.index.name, chunks)
+
+  # Copy of the table with every array read into RAM
+  def in_memory(self):
+    return ColumnarTable(self.columns, {column: np.array(array) for column, array in self.arrays.items()},
+                         {column: np.array(labels) for column, labels in self.labels.items()},
+                         self.index, self.index_name, self.chunks)
+
+  # The whole table as a DataFrame indexed by listing id
+  def to_frame(self):
+    return self.take(np.arange(self.rows), [column for column in self.columns if column != self.index_name])
+
+  def __len__(self):
+    return self.rows
+
+  def kind(self, column):
+    return self.columns[column]['kind']
+
+  # Listing ids at the given positions
+  def ids(self, positions):
+    return self.index[positions]
+
+  # Decoded labels of a category column, in code order
+  def category_labels(self, column):
+    return [label.decode('utf-8') for label in self.labels[column]]
+
+  # Codes matching the given labels of a category column (labels not present are ignored)
+  def codes_for(self, column, values):
+    labels = self.labels[column]
+    encoded = [str(value).encode('utf-8') for value in values]
+    return np.flatnonzero(np.isin(labels, encoded))
+
+  ## Predicate evaluation
+  # Predicates are tuples of:
+  #   ('isin', column, values)     Column value is one of the listed values
+  #   ('range', column, low, high) low <= column value < high
+  #   ('eq', column, value)        Column value equals value
+
+  # Boolean mask of a single predicate over a slice (or explicit positions) of rows
+  def _mask(self, predicate, rows):
+    op, column = predicate[0], predicate[1]
+    values = self.arrays[column][rows]
+    if self.kind(column) == 'category':
+      if op == 'range':
+        raise ValueError('Range predicates are not supported on category column {}'.format(column))
+      accepted = predicate[2] if op == 'isin' else [predicate[2]]
+      return np.isin(values, self.codes_for(column, accepted))
+    if op == 'isin':
+      return np.isin(values, list(predicate[2]))
+    if op == 'eq':
+      return values == predicate[2]
+    if op == 'range':
+      return (values >= self._scalar(column, predicate[2])) & (values < self._scalar(column, predicate[3]))
+    raise ValueError('Unknown predicate {}'.format(op))
+
+  def _scalar(self, column, value):
+    if self.kind(column) == 'datetime':
+      return np.datetime64(value, 'ns')
+    return value
+
+  # Uses the per-chunk min/max statistics to decide whether a chunk can contain rows satisfying the range predicates
+  def _chunk_may_match(self, chunk, predicates):
+    for predicate in predicates:
+      if predicate[0] != 'range' or predicate[1] not in chunk['stats']:
+        continue
+      low, high = chunk['stats'][predicate[1]]
+      if low is None:
+        return False
+      if self.kind(predicate[1]) == 'datetime':
+        low, high = np.datetime64(low, 'ns'), np.datetime64(high, 'ns')
+      if high < self._scalar(predicate[1], predicate[2]) or low >= self._scalar(predicate[1], predicate[3]):
+        return False
+    return True
+
+  # Sorted positions of rows satisfying every predicate.  Streams over one chunk of rows at a time, skipping chunks
+  # excluded by their statistics.  If rows (sorted positions) is given, only those rows are considered.
+  def select(self, predicates, rows=None, chunksize=50000):
+    matches = []
+    if rows is None:
+      for chunk in self.chunks:
+        if not self._chunk_may_match(chunk, predicates):
+          continue
+        span = slice(chunk['start'], chunk['stop'])
+        mask = np.ones(chunk['stop'] - chunk['start'], dtype=bool)
+        for predicate in predicates:
+          mask &= self._mask(predicate, span)
+        matches.append(np.flatnonzero(mask) + chunk['start'])
+    else:
+      for start in range(0, len(rows), chunksize):
+        block = rows[start:start + chunksize]
+        mask = np.ones(len(block), dtype=bool)
+        for predicate in predicates:
+          mask &= self._mask(predicate, block)
+        matches.append(block[mask])
+    return np.concatenate(matches) if matches else np.empty(0, dtype=np.int64)
+
+  ## Row access
+
+  # Positions of the given listing ids (-1 where an id is not present), mirroring pandas' Index.get_indexer
+  def get_indexer(self, ids):
+    ids = np.asarray(ids, dtype=self.index.dtype)
+    found = np.searchsorted(self.sorted_index, ids)
+    found = np.minimum(found, len(self.sorted_index) - 1)
+    positions = self.index_order[found]
+    return np.where(self.sorted_index[found] == ids, positions, -1)
+
+  # Column values at the given positions, decoded to their pandas representation
+  def column_values(self, column, positions):
+    values = self.arrays[column][positions]
+    if self.kind(column) != 'category':
+      return np.asarray(values)
+    labels = self.labels[column]
+    if len(labels) <= CATEGORICAL_LABEL_LIMIT:
+      return pd.Categorical.from_codes(values, categories=self.category_labels(column))
+    decoded = np.array([label.decode('utf-8') for label in labels[np.maximum(values, 0)]], dtype=object)
+    decoded[values == MISSING_CODE] = np.nan
+    return decoded
+
+  # Materialize the given rows & columns (all columns if None) as a DataFrame indexed by listing id
+  def take(self, positions, columns=None):
+    if columns is None:
+      columns = list(self.columns)
+    positions = np.asarray(positions, dtype=np.int64)
+    frame = pd.DataFrame({column: self.column_values(column, positions) for column in columns},
+                         index=pd.Index(self.index[positions], name=self.index_name),
+                         columns=columns)
+    return frame
+
+  # Values of a single listing, as a Series keyed by column
+  def lookup(self, index_id, columns):
+    positions = self.get_indexer([index_id])
+    return self.take(positions[positions >= 0], columns).iloc[0]
+
+## Columnar table memory-mapped from a store directory.  Only the index column (listing ids) is held in RAM;
+## everything else is paged in from disk as predicates & projections touch it.
+
+class ColumnStore(ColumnarTable):
+  def __init__(self, directory):
+    self.directory = directory
+    with open(os.path.join(directory, META_FILE)) as f:
+      self.meta = json.load(f)
+    self.rows = self.meta['rows']
+    arrays = {column: self._map(column, spec) for column, spec in self.meta['columns'].items()}
+    labels = {column: np.load(categories_file(directory, column), mmap_mode='r')
+              for column, spec in self.meta['columns'].items() if spec['kind'] == 'category'}
+    ColumnarTable.__init__(self, self.meta['columns'], arrays, labels, np.array(arrays[self.meta['index']]),
+                           self.meta['index'], self.meta['chunks'])
+
+  def _map(self, column, spec):
+    if self.rows == 0:
+      return np.empty(0, dtype=spec['dtype'])
+    return np.memmap(column_file(self.directory, column), dtype=spec['dtype'], mode='r', shape=(self.rows,))
+
+  @staticmethod
+  def exists(directory):
+    return os.path.exists(os.path.join(directory, META_FILE))
+
+  ## Ingestion
+
+  # Stream a CSV into a new store, one chunk at a time.  clean is an optional function applied to each chunk
+  # (eg. removing irregular listings) before it is written.
+  @classmethod
+  def ingest_csv(cls, path, directory, index, usecols=None, dtype=None, parse_dates=None, compression='infer', clean=None, chunksize=50000):
+    os.makedirs(directory, exist_ok=True)
+    columns = {}
+    lookups = {}
+    chunks = []
+    handles = {}
+    rows = 0
+
+    try:
+      for frame in pd.read_csv(path, usecols=usecols, dtype=dtype, parse_dates=parse_dates, compression=compression, chunksize=chunksize):
+        if clean is not None:
+          frame = clean(frame)
+        if len(frame) == 0:
+          continue
+        stats = {}
+        for column in frame.columns:
+          series = frame[column]
+          if column not in columns:
+            columns[column] = column_spec(series)
+            handles[column] = open(column_file(directory, column), 'wb')
+          spec = columns[column]
+
+          if spec['kind'] == 'category':
+            values = cls._encode_categories(series, lookups.setdefault(column, {}))
+          else:
+            values = series.values.astype(spec['dtype'])
+            stats[column] = chunk_stats(values)
+
+          handles[column].write(np.ascontiguousarray(values).tobytes())
+
+        chunks.append({'start': rows, 'stop': rows + len(frame), 'stats': stats})
+        rows += len(frame)
+    finally:
+      for handle in handles.values():
+        handle.close()
+
+    for column, lookup in lookups.items():
+      labels = sorted(lookup, key=lookup.get)
+      np.save(categories_file(directory, column), np.array([label.encode('utf-8') for label in labels], dtype=np.bytes_))
+
+    meta = {'rows': rows, 'index': index, 'columns': columns, 'chunks': chunks}
+    with open(os.path.join(directory, META_FILE), 'w') as f:
+      json.dump(meta, f)
+    return cls(directory)
+
+  # Map a chunk's string values onto the store-wide code table, growing it as new labels appear
+  @staticmethod
+  def _encode_categories(series, lookup):
+    chunk_codes, uniques = pd.factorize(series)
+    global_codes = np.array([lookup.setdefault(str(value), len(lookup)) for value in uniques] + [MISSING_CODE], dtype=np.int32)
+    return global_codes[chunk_codes]
+
+## A ColumnStore that is only built (via build(directory)) & opened the first time it's read from
+
+class LazyColumnStore(object):
+  def __init__(self, directory, build):
+    self.directory = directory
+    self.build = build
+    self.store = None
+    self.lock = threading.Lock()
+
+  def open(self):
+    with self.lock:
+      if self.store is None:
+        if not ColumnStore.exists(self.directory):
+          self.build(self.directory)
+        self.store = ColumnStore(self.directory)
+      return self.store
+
+  def lookup(self, index_id, columns):
+    return self.open().lookup(index_id, columns)
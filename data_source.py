@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import abc
+import json
+import base64
+import shutil
+import hashlib
+import binascii
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from snapshot import file_digest
+
+#### Data sources: where the listings CSV comes from, and a local disk cache of it
+
+## Every source has a digest, derived from metadata where possible so that it's cheap to check on boot, and a local copy.
+# digest():                   Changes whenever the content does
+# local_path(cache_directory): Path of a local copy of the content, fetched into the cache directory if needed
+
+class DataSource(abc.ABC):
+  def __init__(self, filename):
+    self.filename = filename
+
+  @abc.abstractmethod
+  def digest(self):
+    pass
+
+  @abc.abstractmethod
+  def local_path(self, cache_directory):
+    pass
+
+## A file on local disk, used in place
+
+class LocalFileSource(DataSource):
+  def __init__(self, path):
+    DataSource.__init__(self, os.path.basename(path))
+    self.path = path
+
+  def digest(self):
+    return file_digest(self.path)
+
+  def local_path(self, cache_directory):
+    return self.path
+
+class ChecksumError(Exception):
+  pass
+
+## A remote object read with byte ranges.  Subclasses provide:
+# stat():                 (size or None if unknown, md5 as a hex string or None, version) from the object's metadata
+# read_range(start, stop): Bytes [start, stop) of the object; a stop of None reads to the end
+##
+## The local copy lives at <cache directory>/<digest>/<filename>, so a boot with unchanged data never downloads again.
+## Downloads are split into parts fetched in parallel & written in place, then verified against the MD5 (when the store
+## reports one) before being moved into the cache.  Objects of unknown size are fetched in a single request.
+## Once a new copy is in place, copies of earlier versions of the same file are removed from the cache directory.
+# workers:     Parallel range requests
+# part_bytes:  Size of each range request
+
+DIGEST_DIRECTORY = re.compile('^[0-9a-f]{40}$')
+
+class RangedSource(DataSource):
+  def __init__(self, filename, workers=4, part_bytes=8 * 1024 * 1024):
+    DataSource.__init__(self, filename)
+    self.workers = workers
+    self.part_bytes = part_bytes
+    self.metadata = None
+
+  @abc.abstractmethod
+  def stat(self):
+    pass
+
+  @abc.abstractmethod
+  def read_range(self, start, stop):
+    pass
+
+  def supports_ranges(self):
+    return True
+
+  def cached_stat(self):
+    if self.metadata is None:
+      self.metadata = self.stat()
+    return self.metadata
+
+  def digest(self):
+    return hashlib.sha1(json.dumps([self.__class__.__name__, self.filename, self.cached_stat()]).encode('utf-8')).hexdigest()
+
+  def local_path(self, cache_directory):
+    directory = os.path.join(cache_directory, self.digest())
+    path = os.path.join(directory, self.filename)
+    if os.path.exists(path):
+      return path
+    os.makedirs(directory, exist_ok=True)
+    self.download(path + '.part')
+    os.replace(path + '.part', path)
+    self.prune(cache_directory, self.digest())
+    return path
+
+  # Remove cached copies of this file other than the current one
+  def prune(self, cache_directory, current):
+    for name in os.listdir(cache_directory):
+      stale = os.path.join(cache_directory, name)
+      if name != current and DIGEST_DIRECTORY.match(name) and os.path.exists(os.path.join(stale, self.filename)):
+        shutil.rmtree(stale, ignore_errors=True)
+
+  def download(self, path):
+    size, md5, _ = self.cached_stat()
+    if size is None or not self.supports_ranges():
+      parts = [(0, size)]
+    else:
+      parts = [(start, min(start + self.part_bytes, size)) for start in range(0, size, self.part_bytes)]
+    with open(path, 'wb') as f:
+      f.truncate(size or 0)
+
+    def fetch_part(part):
+      data = self.read_range(*part)
+      if part[1] is not None and len(data) != part[1] - part[0]:
+        raise ChecksumError('Expected {} bytes at offset {}, got {}'.format(part[1] - part[0], part[0], len(data)))
+      with open(path, 'r+b') as f:
+        f.seek(part[0])
+        f.write(data)
+
+    with ThreadPoolExecutor(max_workers=self.workers) as executor:
+      list(executor.map(fetch_part, parts))
+
+    if md5 is not None and file_digest(path, algorithm='md5') != md5:
+      os.remove(path)
+      raise ChecksumError('MD5 mismatch for {}'.format(self.filename))
+
+# Base64 MD5 (as reported by GCS & Content-MD5 headers) as hex
+def base64_md5_to_hex(value):
+  return binascii.hexlify(base64.b64decode(value)).decode('ascii') if value else None
+
+## Any HTTP(S) server.  Range requests are used when the server advertises 'Accept-Ranges: bytes' & the object's length;
+## otherwise it's fetched whole.  The MD5 is taken from a Content-MD5 header if there is one.  The version is the ETag
+## (or Last-Modified).  'requests' is imported on use.
+
+class HttpRangeSource(RangedSource):
+  def __init__(self, url, timeout=30, **kwargs):
+    RangedSource.__init__(self, os.path.basename(url.split('?')[0]), **kwargs)
+    self.url = url
+    self.timeout = timeout
+    self.ranges = False
+
+  def stat(self):
+    import requests
+    response = requests.head(self.url, allow_redirects=True, timeout=self.timeout)
+    response.raise_for_status()
+    headers = response.headers
+    size = int(headers['Content-Length']) if 'Content-Length' in headers else None
+    self.ranges = headers.get('Accept-Ranges', '') == 'bytes' and size is not None
+    return size, base64_md5_to_hex(headers.get('Content-MD5')), headers.get('ETag') or headers.get('Last-Modified')
+
+  def supports_ranges(self):
+    self.cached_stat()
+    return self.ranges
+
+  def read_range(self, start, stop):
+    import requests
+    headers = {'Range': 'bytes={}-{}'.format(start, stop - 1)} if self.supports_ranges() and stop is not None else {}
+    response = requests.get(self.url, headers=headers, timeout=self.timeout)
+    response.raise_for_status()
+    return response.content
+
+## Google Cloud Storage object, via the google-cloud-storage client (imported on use & created once per source).
+## The version is the object generation.
+
+class GcsSource(RangedSource):
+  def __init__(self, bucket, name, **kwargs):
+    RangedSource.__init__(self, os.path.basename(name), **kwargs)
+    self.bucket = bucket
+    self.name = name
+    self.storage_bucket = None
+    self.lock = threading.Lock()
+
+  def client_bucket(self):
+    with self.lock:
+      if self.storage_bucket is None:
+        from google.cloud import storage
+        self.storage_bucket = storage.Client().bucket(self.bucket)
+      return self.storage_bucket
+
+  def stat(self):
+    blob = self.client_bucket().get_blob(self.name)
+    return blob.size, base64_md5_to_hex(blob.md5_hash), blob.generation
+
+  def read_range(self, start, stop):
+    return self.client_bucket().blob(self.name).download_as_string(start=start, end=None if stop is None else stop - 1)
+
+## S3 or any S3-compatible store (eg. MinIO, or a local stand-in server via endpoint_url), via boto3 (imported on use;
+## the client is created once per source).  Multipart uploads have no plain MD5 ETag, so they're only checked for size.
+
+class S3Source(RangedSource):
+  def __init__(self, bucket, key, endpoint_url=None, **kwargs):
+    RangedSource.__init__(self, os.path.basename(key), **kwargs)
+    self.bucket = bucket
+    self.key = key
+    self.endpoint_url = endpoint_url
+    self.s3_client = None
+    self.lock = threading.Lock()
+
+  def client(self):
+    with self.lock:
+      if self.s3_client is None:
+        import boto3
+        self.s3_client = boto3.client('s3', endpoint_url=self.endpoint_url)
+      return self.s3_client
+
+  def stat(self):
+    head = self.client().head_object(Bucket=self.bucket, Key=self.key)
+    etag = head['ETag'].strip('"')
+    return head['ContentLength'], None if '-' in etag else etag, head.get('VersionId') or etag
+
+  def read_range(self, start, stop):
+    byte_range = 'bytes={}-{}'.format(start, '' if stop is None else stop - 1)
+    return self.client().get_object(Bucket=self.bucket, Key=self.key, Range=byte_range)['Body'].read()
+
+# Pick a source from a URL: gs://bucket/name, s3://bucket/key, http(s)://..., or a local path (optionally file://)
+def create_data_source(url, s3_endpoint_url=None, workers=4, part_bytes=8 * 1024 * 1024):
+  options = {'workers': workers, 'part_bytes': part_bytes}
+  if url.startswith('gs://') or url.startswith('s3://'):
+    bucket, _, name = url[5:].partition('/')
+    if url.startswith('gs://'):
+      return GcsSource(bucket, name, **options)
+    return S3Source(bucket, name, endpoint_url=s3_endpoint_url, **options)
+  if url.startswith('http://') or url.startswith('https://'):
+    return HttpRangeSource(url, **options)
+  if url.startswith('file://'):
+    url = url[len('file://'):]
+  return LocalFileSource(url)
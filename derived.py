@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+#### Derived columns, materialized once at load
+
+# Suffix of the precomputed log10 ("display space") copy of a column
+LOG_SUFFIX = '__log10'
+
+## Policies for values that have no logarithm
+# nan:   Non-positive values become NaN, matching how Plotly drops them from log axes
+# clip:  Non-positive values are clipped to LOG_CLIP_FLOOR before taking the log
+LOG_POLICIES = ('nan', 'clip')
+LOG_CLIP_FLOOR = 1e-6
+
+def log_column(key):
+  return key + LOG_SUFFIX
+
+def log10(values, policy='nan'):
+  if policy not in LOG_POLICIES:
+    raise ValueError('Unknown log policy {} (expected one of {})'.format(policy, ', '.join(LOG_POLICIES)))
+  values = np.asarray(values, dtype=np.float64)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    if policy == 'clip':
+      return np.log10(np.maximum(values, LOG_CLIP_FLOOR)).astype(np.float32)
+    result = np.log10(np.where(values > 0, values, np.nan))
+  return result.astype(np.float32)
+
+# Evaluate each computed dimension's function over its input columns.  Infinite results (eg. division by zero) become NaN.
+def add_computed_columns(df, derived_dimensions):
+  for key, spec in derived_dimensions.items():
+    with np.errstate(divide='ignore', invalid='ignore'):
+      values = np.asarray(spec['function'](*[df[column].values.astype(np.float64) for column in spec['inputs']]))
+    values[np.isinf(values)] = np.nan
+    df[key] = values.astype(np.float32)
+  return df
+
+# Add a log10 copy of each of the given columns, under log_column(key)
+def add_log_columns(df, keys, policy='nan'):
+  for key in keys:
+    df[log_column(key)] = log10(df[key].values, policy)
+  return df
+
+# Add every derived column to a frame (or chunk of one).  Computed dimensions come first, so that they can have log copies too.
+def add_derived_columns(df, derived_dimensions, log_keys, policy='nan'):
+  df = df.copy()
+  df = add_computed_columns(df, derived_dimensions)
+  return add_log_columns(df, log_keys, policy)
+
+# Name of the column holding a dimension's values in display space for the given axis scale.
+# Falls back to the raw column when no log copy was materialized.
+def display_column(columns, key, scale):
+  if scale == 'log' and log_column(key) in columns:
+    return log_column(key)
+  return key
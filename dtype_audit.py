@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+#### Dtype audit: the tightest lossless dtype of every column of a loaded frame
+
+## Downcasts proposed for a column, by kind:
+#   integer:       Integer (or integral, NaN-free float) values as the smallest integer dtype holding their range
+#   float:         float64 values as float32, where every value survives the round trip
+#   category:      Repetitive strings (eg. addresses) as a categorical
+#   month-offset:  Month-start datetimes as int16 months since `epoch` (see decode_month_offsets).  Readers of the column
+#                  must decode it, so these are only applied to the columns a caller names.
+## Every proposal is checked by converting back to the original dtype & comparing values (NaN equal to NaN).
+# bytes_before/bytes_after:  Memory use of the column's values, deep (counting string objects)
+# applied:                   Whether optimize_frame applied it
+
+Proposal = namedtuple('Proposal', ['column', 'kind', 'source', 'target', 'bytes_before', 'bytes_after', 'epoch', 'applied'])
+
+INTEGER_DTYPES = {
+  'unsigned': [np.uint8, np.uint16, np.uint32, np.uint64],
+  'signed': [np.int8, np.int16, np.int32, np.int64]
+}
+
+def smallest_integer_dtype(low, high):
+  for dtype in INTEGER_DTYPES['unsigned' if low >= 0 else 'signed']:
+    if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+      return np.dtype(dtype)
+  return None
+
+def same_values(original, restored):
+  original = np.asarray(original)
+  restored = np.asarray(restored)
+  if original.dtype.kind == 'f':
+    return bool(np.all((original == restored) | (np.isnan(original) & np.isnan(restored))))
+  if original.dtype.kind == 'O':
+    return bool(np.all((original == restored) | (pd.isnull(original) & pd.isnull(restored))))
+  return bool(np.array_equal(original, restored))
+
+# Months since the epoch (a month-start Timestamp) of month-start datetimes, & back
+def month_offsets(values, epoch):
+  index = pd.DatetimeIndex(values)
+  return ((index.year - epoch.year) * 12 + (index.month - epoch.month)).values
+
+def decode_month_offsets(offsets, epoch):
+  uniques, inverse = np.unique(offsets, return_inverse=True)
+  months = np.array([epoch + pd.DateOffset(months=int(offset)) for offset in uniques], dtype='datetime64[ns]')
+  return months[inverse]
+
+# (kind, converted Series, epoch) of the tightest lossless downcast of a Series, or None if it's as tight as it gets
+def propose_column(series, max_category_ratio=0.5):
+  values = series.values
+  if len(series) == 0 or pd.api.types.is_categorical_dtype(series) or pd.api.types.is_bool_dtype(series):
+    return None
+
+  if pd.api.types.is_datetime64_any_dtype(series):
+    index = pd.DatetimeIndex(values)
+    if index.hasnans or not ((index.day == 1) & (index == index.normalize())).all():
+      return None
+    epoch = index.min()
+    offsets = month_offsets(values, epoch)
+    if offsets.max() > np.iinfo(np.int16).max:
+      return None
+    converted = pd.Series(offsets.astype(np.int16), index=series.index, name=series.name)
+    return 'month-offset', converted, epoch
+
+  if pd.api.types.is_numeric_dtype(series):
+    integral = values.dtype.kind in 'iu' or (np.isfinite(values).all() and (values == np.round(values)).all())
+    if integral:
+      dtype = smallest_integer_dtype(values.min(), values.max())
+      if dtype is not None and dtype.itemsize < values.dtype.itemsize:
+        return 'integer', series.astype(dtype), None
+    if values.dtype == np.float64:
+      return 'float', series.astype(np.float32), None
+    return None
+
+  if values.dtype.kind == 'O' and series.nunique(dropna=False) <= max_category_ratio * len(series):
+    return 'category', series.astype('category'), None
+  return None
+
+def round_trips(series, kind, converted, epoch):
+  if kind == 'month-offset':
+    return same_values(series.values, decode_month_offsets(converted.values, epoch))
+  if kind == 'category':
+    return same_values(series.values, np.asarray(converted.astype(object).values))
+  return same_values(series.values, converted.values.astype(series.dtype))
+
+## Proposals for every column of a frame, & the frame with them applied
+# apply:                False to only audit (the frame is returned unchanged)
+# month_offset_columns:  Columns whose month-offset proposals are applied (their readers must decode them)
+
+def optimize_frame(df, apply=True, month_offset_columns=(), max_category_ratio=0.5):
+  proposals = []
+  converted_columns = {}
+  for column in df.columns:
+    series = df[column]
+    proposal = propose_column(series, max_category_ratio)
+    if proposal is None:
+      continue
+    kind, converted, epoch = proposal
+    if not round_trips(series, kind, converted, epoch):
+      continue
+    applied = apply and (kind != 'month-offset' or column in month_offset_columns)
+    if applied:
+      converted_columns[column] = converted
+    proposals.append(Proposal(column, kind, str(series.dtype), str(converted.dtype), series.memory_usage(index=False, deep=True),
+                              converted.memory_usage(index=False, deep=True), epoch, applied))
+
+  if converted_columns:
+    df = df.assign(**converted_columns)
+  return df, proposals
+
+# Unapplied proposals for a column store (see column_store.ColumnarTable), materializing one column at a time
+def table_proposals(table, max_category_ratio=0.5):
+  positions = np.arange(len(table))
+  proposals = []
+  for column in [column for column in table.columns if column != table.index_name]:
+    proposals += optimize_frame(table.take(positions, [column]), apply=False, max_category_ratio=max_category_ratio)[1]
+  return proposals
+
+def format_bytes(count):
+  return '{:.1f} MB'.format(count / float(1024 * 1024))
+
+# One line per proposal, then the total saved by the applied ones (& by all of them)
+def dtype_report(proposals):
+  lines = ['{:<40} {:<13} {:>16} -> {:<9} {:>9} -> {:<9}{}'.format(
+             proposal.column, proposal.kind, proposal.source, proposal.target, format_bytes(proposal.bytes_before),
+             format_bytes(proposal.bytes_after), '' if proposal.applied else '  (not applied)')
+           for proposal in proposals]
+  saved = lambda proposals: sum(proposal.bytes_before - proposal.bytes_after for proposal in proposals)
+  lines.append('Dtype audit: saved {} of a proposed {}'.format(format_bytes(saved([p for p in proposals if p.applied])),
+                                                             format_bytes(saved(proposals))))
+  return '\n'.join(lines)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import io
+import flask
+
+#### Streaming exports of selected listings
+
+# Chunks of encoded rows are produced one at a time, reading chunksize rows from the engine per chunk,
+# so memory use depends on the chunk size rather than on the number of rows exported.
+
+EXPORT_FORMATS = {
+  'csv': 'text/csv',
+  'parquet': 'application/octet-stream'
+}
+
+def csv_chunks(engine, positions, columns, chunksize=50000):
+  for start in range(0, max(len(positions), 1), chunksize):
+    yield engine.take(positions[start:start + chunksize], columns).to_csv(header=start == 0).encode('utf-8')
+
+## Parquet, one row group per chunk.  Uses the 'pyarrow' package, which is only imported when this format is requested;
+## without it the format isn't offered (see export_available).  The writer writes into a buffer that is drained after every
+## row group.
+
+class DrainableBuffer(io.RawIOBase):
+  def __init__(self):
+    self.chunks = []
+    self.position = 0
+
+  def writable(self):
+    return True
+
+  def write(self, data):
+    self.chunks.append(bytes(data))
+    self.position += len(data)
+    return len(data)
+
+  def tell(self):
+    return self.position
+
+  def drain(self):
+    data = b''.join(self.chunks)
+    self.chunks = []
+    return data
+
+# Parquet schema of a frame, from its column dtypes alone (never inferred from values, which can be all missing in a chunk).
+# Categoricals & objects (addresses, token ids) are strings.
+def parquet_schema(frame):
+  import pyarrow as pa
+  fields = []
+  for column in frame.columns:
+    dtype = frame[column].dtype
+    if hasattr(frame[column], 'cat') or dtype.kind == 'O':
+      field_type = pa.string()
+    elif dtype.kind == 'M':
+      field_type = pa.timestamp('ns')
+    else:
+      field_type = pa.from_numpy_dtype(dtype)
+    fields.append(pa.field(str(column), field_type))
+  return pa.schema(fields)
+
+def parquet_chunks(engine, positions, columns, chunksize=50000):
+  import pyarrow as pa
+  import pyarrow.parquet as pq
+  buffer = DrainableBuffer()
+  writer = None
+  for start in range(0, max(len(positions), 1), chunksize):
+    frame = engine.take(positions[start:start + chunksize], columns).reset_index()
+    # Every row group is written with the schema of the column dtypes, so row groups agree
+    if writer is None:
+      writer = pq.ParquetWriter(buffer, parquet_schema(frame))
+    for column in frame.columns:
+      if hasattr(frame[column], 'cat'):
+        frame[column] = frame[column].astype(object)
+    writer.write_table(pa.Table.from_pandas(frame, schema=writer.schema, preserve_index=False))
+    yield buffer.drain()
+  writer.close()
+  yield buffer.drain()
+
+# Whether a format can be exported here: Parquet needs pyarrow
+def export_available(export_format):
+  if export_format == 'parquet':
+    try:
+      import pyarrow.parquet
+    except ImportError:
+      return False
+  return export_format in EXPORT_FORMATS
+
+def export_chunks(export_format, engine, positions, columns, chunksize=50000):
+  if export_format == 'parquet':
+    return parquet_chunks(engine, positions, columns, chunksize)
+  return csv_chunks(engine, positions, columns, chunksize)
+
+# Streaming download response of the given rows.  Nothing is read until the client starts consuming the body.
+# Formats that can't be produced here are refused before the response starts, rather than failing mid-download.
+def export_response(export_format, engine, positions, columns, chunksize=50000):
+  if not export_available(export_format):
+    flask.abort(501)
+  return flask.Response(export_chunks(export_format, engine, positions, columns, chunksize),
+                        mimetype=EXPORT_FORMATS[export_format],
+                        headers={'Content-Disposition': 'attachment; filename=listings.{}'.format(export_format)})
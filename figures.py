@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+import numpy as np
+
+#### Plain-dict figure specs
+
+## plotly.graph_objs validate (& copy) every property on construction, including the data arrays, which is a noticeable
+## share of a callback's CPU time on large traces.  Figures are instead assembled as plain dicts: everything but the data
+## is precomputed per dapp & marker style as a template, and each callback only fills in the arrays.
+## Dash serializes dicts & NumPy arrays the same way it serializes graph_objs.  Validation can be switched back on
+## (eg. in debug mode) with validate_figure.
+
+def scatter_trace_template(name, color, entry, showlegend):
+  return {
+    'type': 'scattergl',
+    'mode': 'markers',
+    'name': name,
+    'legendgroup': name,
+    'showlegend': showlegend,
+    'selected': {'marker': {'size': 10, 'color': 'black'}},
+    'marker': {
+      'symbol': entry.get('symbol', 'circle'),
+      'opacity': 0.85,
+      'size': entry.get('size', 6),
+      'color': color,
+      'line': {'width': 1, 'color': entry.get('line_color', 'rgb(153, 153, 153)')}
+    }
+  }
+
+def box_trace_template(name, color):
+  return {
+    'type': 'box',
+    'boxpoints': 'outliers',
+    'marker': {'line': {'outliercolor': 'rgb(153, 153, 153)'}},
+    'line': {'color': 'rgb(153, 153, 153)'},
+    'fillcolor': color,
+    'name': name
+  }
+
+## Single trace per dapp encoding: instead of one trace per marker styling entry, each point carries the code (index) of
+## its styling entry, and marker properties that differ between entries become per-point arrays.  Symbols are sent as
+## plotly's numeric symbol codes & line colors as codes into a discrete colorscale, so the arrays are small integers.
+
+# Plotly's numbering of marker symbols.  Adding 100 gives the '-open' variant, 200 '-dot' & 300 '-open-dot'.
+SYMBOL_CODES = {
+  'circle': 0, 'square': 1, 'diamond': 2, 'cross': 3, 'x': 4,
+  'triangle-up': 5, 'triangle-down': 6, 'triangle-left': 7, 'triangle-right': 8,
+  'triangle-ne': 9, 'triangle-se': 10, 'triangle-sw': 11, 'triangle-nw': 12,
+  'pentagon': 13, 'hexagon': 14, 'hexagon2': 15, 'octagon': 16, 'star': 17, 'hexagram': 18
+}
+SYMBOL_VARIANTS = [('-open-dot', 300), ('-dot', 200), ('-open', 100)]
+
+def symbol_code(symbol):
+  for suffix, offset in SYMBOL_VARIANTS:
+    if symbol.endswith(suffix):
+      return SYMBOL_CODES[symbol[:-len(suffix)]] + offset
+  return SYMBOL_CODES[symbol]
+
+# Styling entry code of each point, given its values of the styling's df_filter_key column.
+# The first matching entry wins (an entry with a df_filter_value of None matches everything); -1 where none match.
+def styling_codes(values, styling):
+  codes = np.full(len(values), -1, dtype=np.int8)
+  for j, entry in reversed(list(enumerate(styling))):
+    if entry['df_filter_value'] is None:
+      codes[:] = j
+    else:
+      codes[np.asarray(values == entry['df_filter_value'], dtype=bool)] = j
+  return codes
+
+# Per-entry lookup tables of a styling: symbol codes, sizes & line colors
+def styling_lookups(styling):
+  return (np.array([symbol_code(entry.get('symbol', 'circle')) for entry in styling], dtype=np.int16),
+          np.array([entry.get('size', 6) for entry in styling], dtype=np.int16),
+          [entry.get('line_color', 'rgb(153, 153, 153)') for entry in styling])
+
+## Scatter & box trace templates for every dapp, and every marker styling (one scatter template per styling entry).
+## Templates are shared between callbacks & must not be modified; fill_trace copies them.
+# palette_name_dict:  Dapp name -> marker color
+# marker_stylings:    Marker styling sets, as in app.py
+
+class TraceTemplates(object):
+  def __init__(self, palette_name_dict, marker_stylings):
+    self.palette_name_dict = palette_name_dict
+    self.scatter = {}
+    self.lookups = {}
+    self.box = {name: box_trace_template(name, color) for name, color in palette_name_dict.items()}
+    for styling in marker_stylings.values():
+      for name in palette_name_dict:
+        self.scatter_traces(name, styling)
+
+  # One template per entry of a marker styling (the styling arrives from the browser as the picker's value)
+  def scatter_traces(self, name, styling):
+    key = (name, json.dumps(styling, sort_keys=True))
+    if key not in self.scatter:
+      self.scatter[key] = [scatter_trace_template(name, self.palette_name_dict[name], entry, j == 0) for j, entry in enumerate(styling)]
+    return self.scatter[key]
+
+  # A single trace for all of a dapp's points, styled per point by their styling entry codes (see styling_codes)
+  def dapp_trace(self, name, styling, codes, **arrays):
+    key = json.dumps(styling, sort_keys=True)
+    if key not in self.lookups:
+      self.lookups[key] = styling_lookups(styling)
+    symbols, sizes, line_colors = self.lookups[key]
+    template = self.scatter_traces(name, styling)[0]
+
+    # Constant properties stay scalars, as in the template
+    marker = dict(template['marker'])
+    if len(set(symbols)) > 1:
+      marker['symbol'] = symbols[codes]
+    if len(set(sizes)) > 1:
+      marker['size'] = sizes[codes]
+    if len(set(line_colors)) > 1:
+      steps = len(line_colors) - 1
+      marker['line'] = {'width': 1, 'color': codes, 'cmin': 0, 'cmax': steps,
+                        'colorscale': [[j / float(steps), color] for j, color in enumerate(line_colors)]}
+    return fill_trace(dict(template, marker=marker), **arrays)
+
+# Drop properties set to None, recursively through nested dicts, as graph_objs do.  (plotly.js would take a null literally.)
+def without_none(properties):
+  return {key: without_none(value) if isinstance(value, dict) else value for key, value in properties.items() if value is not None}
+
+# Drop-in replacements for go.Layout(...) & go.<Trace>(...) that build plain dicts
+def layout_spec(**properties):
+  return without_none(properties)
+
+def trace_spec(trace_type, **properties):
+  return dict(without_none(properties), type=trace_type)
+
+# A trace from a template & its data arrays
+def fill_trace(template, **arrays):
+  trace = dict(template)
+  trace.update(arrays)
+  return trace
+
+# Run a figure through plotly's validation, raising ValueError if any property is invalid.  Returns the figure unchanged.
+def validate_figure(figure):
+  import plotly.graph_objs as go
+  go.Figure(data=figure['data'], layout=figure.get('layout', {}))
+  return figure
+
+#### Benchmark: graph_objs vs templates, for a scatter shaped like the dashboard's
+
+def benchmark(points_per_trace=5000, dapps=15, entries=4, repeat=5):
+  import plotly.graph_objs as go
+  random_state = np.random.RandomState(0)
+  palette = {'dapp-{}'.format(i): 'rgba({}, 100, 100, 1)'.format(i * 10) for i in range(dapps)}
+  styling = [{'symbol': 'circle', 'size': 6, 'line_color': 'rgb(153, 153, 153)'} for _ in range(entries)]
+  data = [(random_state.lognormal(size=points_per_trace), random_state.random_sample(points_per_trace),
+           np.arange(points_per_trace)) for _ in range(dapps * entries)]
+  templates = TraceTemplates(palette, {'benchmark': styling})
+
+  def with_graph_objs():
+    traces = []
+    for i, name in enumerate(sorted(palette)):
+      for j, entry in enumerate(styling):
+        x, y, ids = data[i * entries + j]
+        traces.append(go.Scattergl(x=x, y=y, mode='markers', name=name, legendgroup=name, showlegend=j == 0, customdata=ids,
+                                   selected=dict(marker=dict(size=10, color='black')),
+                                   marker=dict(symbol=entry['symbol'], opacity=0.85, size=entry['size'], color=palette[name],
+                                               line=dict(width=1, color=entry['line_color']))))
+    return {'data': traces, 'layout': go.Layout(hovermode='closest')}
+
+  def with_templates():
+    traces = []
+    for i, name in enumerate(sorted(palette)):
+      for j, template in enumerate(templates.scatter_traces(name, styling)):
+        x, y, ids = data[i * entries + j]
+        traces.append(fill_trace(template, x=x, y=y, customdata=ids))
+    return {'data': traces, 'layout': {'hovermode': 'closest'}}
+
+  timings = {}
+  for label, build in [('graph_objs', with_graph_objs), ('templates', with_templates)]:
+    best = None
+    for _ in range(repeat):
+      started = time.time()
+      build()
+      elapsed = time.time() - started
+      best = elapsed if best is None else min(best, elapsed)
+    timings[label] = best
+  return timings
+
+if __name__ == '__main__':
+  for points in [1000, 10000, 100000]:
+    timings = benchmark(points_per_trace=points)
+    print('{:,} points/trace: '.format(points) + ', '.join('{} {:.4f}s'.format(label, seconds) for label, seconds in sorted(timings.items())))
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import flask
+
+#### Listing image thumbnails, fetched on demand & cached on local disk
+
+## Fetchers return the raw bytes of an image URL, raising FetchError if it can't be retrieved
+
+class FetchError(Exception):
+  pass
+
+# Raised for fetched content that isn't a recognized image format
+class UnsupportedImageError(FetchError):
+  pass
+
+# Fetches over HTTP(S).  'requests' is only imported when this fetcher is used.
+# Sources larger than max_bytes are refused: by their Content-Length if they declare one, otherwise by stopping the
+# download as soon as it passes the limit, so a huge (or endless) source never ties up a request thread for long.
+class HttpFetcher(object):
+  def __init__(self, timeout=5, max_bytes=10 * 1024 * 1024):
+    self.timeout = timeout
+    self.max_bytes = max_bytes
+
+  def fetch(self, url):
+    import requests
+    try:
+      with requests.get(url, timeout=self.timeout, stream=True) as response:
+        response.raise_for_status()
+        if int(response.headers.get('Content-Length') or 0) > self.max_bytes:
+          raise FetchError('{} is larger than {} bytes'.format(url, self.max_bytes))
+        data = bytearray()
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+          data += chunk
+          if len(data) > self.max_bytes:
+            raise FetchError('{} is larger than {} bytes'.format(url, self.max_bytes))
+        return bytes(data)
+    except requests.RequestException as error:
+      raise FetchError(str(error))
+
+# Stand-in for local development & tests: serves each URL from the file in `directory` named after the URL's last path segment
+class DirectoryFetcher(object):
+  def __init__(self, directory):
+    self.directory = directory
+
+  def fetch(self, url):
+    path = os.path.join(self.directory, os.path.basename(url.split('?')[0]))
+    if not os.path.isfile(path):
+      raise FetchError('No local copy of {}'.format(url))
+    with open(path, 'rb') as f:
+      return f.read()
+
+## Thumbnailing uses the 'Pillow' package.  Without it, or for formats it can't decode (eg. SVG, which is small &
+## scales anyway), images are passed through unchanged.  Only recognized image formats are ever served.
+
+def thumbnails_available():
+  try:
+    import PIL.Image
+    return True
+  except ImportError:
+    return False
+
+# Image mimetype of some bytes, or None if they aren't a recognized image
+def sniff_mimetype(data):
+  if data.startswith(b'\x89PNG'):
+    return 'image/png'
+  if data.startswith(b'\xff\xd8'):
+    return 'image/jpeg'
+  if data.startswith(b'GIF8'):
+    return 'image/gif'
+  if data[:5] == b'<?xml' or b'<svg' in data[:1024]:
+    return 'image/svg+xml'
+  return None
+
+# (bytes, mimetype) of a PNG no larger than size x size, or of the original image if it can't be thumbnailed
+def make_thumbnail(data, size):
+  try:
+    from PIL import Image
+    image = Image.open(io.BytesIO(data))
+    image.thumbnail((size, size))
+    output = io.BytesIO()
+    image.convert('RGBA').save(output, format='PNG', optimize=True)
+    return output.getvalue(), 'image/png'
+  except Exception:
+    return data, sniff_mimetype(data)
+
+MIMETYPE_EXTENSIONS = {
+  'image/png': '.png',
+  'image/jpeg': '.jpg',
+  'image/gif': '.gif',
+  'image/svg+xml': '.svg'
+}
+
+## Thumbnails on disk, keyed by a hash of the source URL (which doubles as the ETag).
+## Files are evicted least recently used first once they exceed max_bytes; access times survive restarts via file mtimes.
+# directory:  Cache directory, created if needed
+# fetcher:    HttpFetcher, DirectoryFetcher, or anything with fetch(url)
+# size:       Longest side of a thumbnail, in pixels
+
+class ThumbnailCache(object):
+  def __init__(self, directory, fetcher, size=200, max_bytes=256 * 1024 * 1024):
+    self.directory = directory
+    self.fetcher = fetcher
+    self.size = size
+    self.max_bytes = max_bytes
+    self.lock = threading.Lock()
+    os.makedirs(directory, exist_ok=True)
+
+    # filename -> bytes, least recently used first
+    self.files = OrderedDict()
+    entries = [os.path.join(directory, name) for name in os.listdir(directory) if not name.endswith('.tmp')]
+    for path in sorted(entries, key=os.path.getmtime):
+      self.files[os.path.basename(path)] = os.path.getsize(path)
+    self.total_bytes = sum(self.files.values())
+
+  @staticmethod
+  def key(url):
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+  def _cached_file(self, key):
+    for extension in set(MIMETYPE_EXTENSIONS.values()):
+      if key + extension in self.files:
+        return key + extension
+    return None
+
+  # (bytes, mimetype, key) of the thumbnail for a URL, fetching & thumbnailing it on a miss
+  def get(self, url):
+    key = self.key(url)
+    with self.lock:
+      filename = self._cached_file(key)
+      if filename is not None:
+        self.files.move_to_end(filename)
+        path = os.path.join(self.directory, filename)
+        os.utime(path, None)
+        with open(path, 'rb') as f:
+          data = f.read()
+        mimetype = [mimetype for mimetype, extension in MIMETYPE_EXTENSIONS.items() if filename.endswith(extension)][0]
+        return data, mimetype, key
+
+    data, mimetype = make_thumbnail(self.fetcher.fetch(url), self.size)
+    if mimetype is None:
+      raise UnsupportedImageError('Not a recognized image: {}'.format(url))
+    self._store(key + MIMETYPE_EXTENSIONS[mimetype], data)
+    return data, mimetype, key
+
+  def _store(self, filename, data):
+    path = os.path.join(self.directory, filename)
+    temporary = '{}.{}.tmp'.format(path, threading.get_ident())
+    with open(temporary, 'wb') as f:
+      f.write(data)
+    os.replace(temporary, path)
+    with self.lock:
+      self.total_bytes += len(data) - self.files.get(filename, 0)
+      self.files[filename] = len(data)
+      self.files.move_to_end(filename)
+      while self.total_bytes > self.max_bytes and len(self.files) > 1:
+        evicted, evicted_bytes = self.files.popitem(last=False)
+        self.total_bytes -= evicted_bytes
+        try:
+          os.remove(os.path.join(self.directory, evicted))
+        except OSError:
+          pass
+
+## HTTP response for the thumbnail of an image URL, answering conditional requests for it with a 304.
+## Images that couldn't be re-encoded are third-party bytes served from the app's own origin, so every image response
+## forbids scripts & other subresources (an SVG can carry script) and content sniffing.
+# max_age:  Seconds browsers may cache the image for
+
+IMAGE_RESPONSE_HEADERS = {
+  'Content-Security-Policy': "default-src 'none'; style-src 'unsafe-inline'",
+  'X-Content-Type-Options': 'nosniff'
+}
+
+def thumbnail_response(cache, url, request, max_age):
+  etag = cache.key(url)
+  if request.if_none_match.contains(etag):
+    response = flask.Response(status=304)
+  else:
+    try:
+      data, mimetype, etag = cache.get(url)
+    except FetchError:
+      flask.abort(502)
+    response = flask.Response(data, mimetype=mimetype)
+  response.set_etag(etag)
+  response.headers['Cache-Control'] = 'public, max-age={}'.format(max_age)
+  for header, value in IMAGE_RESPONSE_HEADERS.items():
+    response.headers[header] = value
+  return response
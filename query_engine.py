@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+import time
+import datetime as dt
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from column_store import ColumnarTable
+from sampling import proportional_quotas, ranked_sample
+
+#### Listings query engine
+
+## Filter specification, compiled to predicates over a backend
+# dapps:       Tuple of dapp names to keep
+# outcomes:    Tuple of resolution_event_type values to keep
+# time_range:  (start, stop) datetimes; start <= created_at < stop
+# freezes:     Tuple of (column, value) equality constraints
+# sample:      Sample key (see QueryEngine.budget_sample), or None to keep every matching row
+
+QuerySpec = namedtuple('QuerySpec', ['dapps', 'outcomes', 'time_range', 'freezes', 'sample'])
+
+# Normalize filter parameters into a hashable QuerySpec.  Freezes are passed as a dict; None values are dropped.
+def make_query_spec(dapps, outcomes, time_range, freezes=None, sample=None):
+  freezes = tuple(sorted((column, value) for column, value in (freezes or {}).items() if value is not None))
+  return QuerySpec(tuple(sorted(dapps)), tuple(sorted(outcomes)), tuple(time_range), freezes, sample)
+
+# Predicates are tuples of:
+#   ('isin', column, values)     Column value is one of the listed values
+#   ('range', column, low, high) low <= column value < high
+#   ('eq', column, value)        Column value equals value
+def compile_predicates(spec):
+  predicates = [
+    ('isin', 'name', spec.dapps),
+    ('isin', 'resolution_event_type', spec.outcomes),
+    ('range', 'created_at', spec.time_range[0], spec.time_range[1])
+  ]
+  predicates += [('isin', column, [value]) for column, value in spec.freezes]
+  return predicates
+
+## pandas backend, over a DataFrame indexed by listing id
+
+class PandasBackend(object):
+  def __init__(self, df):
+    self.df = df
+
+  @property
+  def columns(self):
+    return self.df.columns
+
+  def __len__(self):
+    return len(self.df)
+
+  def category_labels(self, column):
+    return list(set(self.df[column]))
+
+  # Boolean mask of a (possibly categorical) column's values against a list of accepted values
+  def isin_mask(self, column, values, rows=None):
+    column = self.df[column]
+    if hasattr(column, 'cat'):
+      categories = column.cat.categories
+      codes = [categories.get_loc(value) for value in values if value in categories]
+      column_values = column.cat.codes.values
+    else:
+      codes = list(values)
+      column_values = column.values
+    if rows is not None:
+      column_values = column_values[rows]
+    return np.isin(column_values, codes)
+
+  # Sorted positions of the rows satisfying every predicate.  If rows (sorted positions) is given, only those rows are considered.
+  def select(self, predicates, rows=None):
+    mask = np.ones(len(self.df) if rows is None else len(rows), dtype=bool)
+    for predicate in predicates:
+      op, column = predicate[0], predicate[1]
+      if op == 'isin':
+        mask &= self.isin_mask(column, predicate[2], rows)
+        continue
+      values = self.df[column].values if rows is None else self.df[column].values[rows]
+      if op == 'eq':
+        mask &= values == predicate[2]
+      elif op == 'range':
+        low, high = predicate[2], predicate[3]
+        if values.dtype.kind == 'M':
+          low, high = np.datetime64(low), np.datetime64(high)
+        mask &= (values >= low) & (values < high)
+      else:
+        raise ValueError('Unknown predicate {}'.format(op))
+    return np.flatnonzero(mask) if rows is None else rows[mask]
+
+  def take(self, positions, columns=None):
+    if columns is None:
+      return self.df.iloc[positions]
+    return self.df.iloc[positions, [self.df.columns.get_loc(column) for column in columns]]
+
+  def lookup(self, index_id, columns):
+    return self.df.loc[index_id, columns]
+
+  def get_indexer(self, ids):
+    return self.df.index.get_indexer(ids)
+
+  def ids(self, positions):
+    return self.df.index.values[positions]
+
+## Columnar backend: the DataFrame converted to NumPy arrays (see column_store.ColumnarTable).
+## ColumnStore, the memory-mapped version, can be used as a backend directly.
+
+def columnar_backend(df, chunksize=50000):
+  return ColumnarTable.from_frame(df, chunksize=chunksize)
+
+## Row-position index of a column: for each value, the positions of the rows holding it.  Within a value, rows are in
+## position order, or ordered by another column (eg. an item's listings by created_at) if the index was built with one.
+## Stored as flat arrays so that it can be persisted & memory-mapped back in (see snapshot.py).
+# labels:     Indexed values (as UTF-8 bytes, looked up by str(value)), in order
+# positions:  Row positions grouped by value
+# offsets:    positions[offsets[i]:offsets[i + 1]] are the rows holding labels[i]
+
+class ValueIndex(object):
+  def __init__(self, labels, positions, offsets):
+    self.labels = labels
+    self.positions = positions
+    self.offsets = offsets
+    self.lookup = {label.decode('utf-8'): i for i, label in enumerate(labels)}
+
+  # One pass over the column (& the order column): rows are sorted by (value, order) & split where the value changes.
+  # Rows with a missing value are left out.
+  @classmethod
+  def build(cls, engine, column, order=None):
+    rows = np.arange(len(engine))
+    codes, labels = pd.factorize(engine.column_values(column, rows), sort=True)
+    if order is None:
+      positions = np.argsort(codes, kind='mergesort')
+    else:
+      positions = np.lexsort((engine.column_values(order, rows), codes))
+    positions = positions[codes[positions] >= 0]
+    offsets = np.searchsorted(codes[positions], np.arange(len(labels) + 1)).astype(np.int64)
+    return cls(np.array([str(label).encode('utf-8') for label in labels], dtype=np.bytes_), positions.astype(np.int64), offsets)
+
+  @classmethod
+  def from_arrays(cls, arrays):
+    return cls(arrays['labels'], arrays['positions'], arrays['offsets'])
+
+  def to_arrays(self):
+    return {'labels': self.labels, 'positions': self.positions, 'offsets': self.offsets}
+
+  # Positions of the rows holding any of the values.  For a single value, these come in the index's order;
+  # for several, in position order.
+  def get(self, values):
+    found = [self.lookup[str(value)] for value in values if str(value) in self.lookup]
+    groups = [self.positions[self.offsets[i]:self.offsets[i + 1]] for i in found]
+    if len(groups) == 1:
+      return np.asarray(groups[0])
+    return np.sort(np.concatenate(groups)) if groups else np.empty(0, dtype=np.int64)
+
+## Query engine over a backend.  Selections (as sorted row positions, sampled or not) are kept in a shared short-lived cache.
+# backend:  PandasBackend, ColumnarTable or ColumnStore
+# cache:    coalesce.SharedResultCache (or anything with get(key, compute))
+
+class QueryEngine(object):
+  def __init__(self, backend, cache):
+    self.backend = backend
+    self.cache = cache
+    self.indexes = {}
+    self.ranks = {}
+
+  # Answer single-column equality lookups (including freezes) from a ValueIndex instead of scanning
+  def add_index(self, column, index):
+    self.indexes[column] = index
+
+  # Use precomputed sample ranks (eg. loaded from a snapshot) for a seed
+  def pin_sample_ranks(self, seed, ranks):
+    self.ranks[seed] = ranks
+
+  @property
+  def columns(self):
+    return self.backend.columns
+
+  def __len__(self):
+    return len(self.backend)
+
+  def category_labels(self, column):
+    return self.backend.category_labels(column)
+
+  # Sorted row positions matching a QuerySpec.  Sampled selections are drawn from the unsampled one.
+  def select(self, spec):
+    key = ('select', id(self.backend), spec)
+    if spec.sample is not None:
+      return self.cache.get(key, lambda: self.budget_sample(self.select(spec._replace(sample=None)), spec.sample))
+    return self.cache.get(key, lambda: self.backend.select(compile_predicates(spec), rows=self.candidate_rows(spec)))
+
+  # Rows a QuerySpec can match: the indexed rows of any frozen value (None for every row)
+  def candidate_rows(self, spec):
+    rows = None
+    for column, value in spec.freezes:
+      if column in self.indexes:
+        indexed = np.sort(self.indexes[column].get([value]))
+        rows = indexed if rows is None else np.intersect1d(rows, indexed, assume_unique=True)
+    return rows
+
+  # Sorted row positions satisfying raw predicates, optionally restricted to the given rows
+  def where(self, predicates, rows=None):
+    if rows is None and len(predicates) == 1 and predicates[0][0] == 'isin' and predicates[0][1] in self.indexes:
+      return self.indexes[predicates[0][1]].get(predicates[0][2])
+    return self.backend.select(predicates, rows=rows)
+
+  # Sample keys are ('budget', points, minimum, seed): about `points` of the given rows, shared between the (dapp, outcome)
+  # series in proportion to their sizes with at least `minimum` per series (see sampling.proportional_quotas)
+  def budget_sample(self, positions, sample):
+    if sample is None:
+      return positions
+    _, points, minimum, seed = sample
+    codes = self.series_codes(positions)
+    return positions[ranked_sample(codes, self.sample_ranks(seed)[positions], self.series_quotas(codes, points, minimum))]
+
+  # Series (dapp x outcome) of each of the given rows, as small integer codes
+  def series_codes(self, positions):
+    series = self.take(positions, ['name', 'resolution_event_type'])
+    name_codes = pd.factorize(series['name'])[0]
+    outcome_codes, outcomes = pd.factorize(series['resolution_event_type'])
+    # Missing outcomes (code -1) form their own series
+    return name_codes * (len(outcomes) + 1) + outcome_codes + 1
+
+  # Points per series code for a budget (see sampling.proportional_quotas)
+  @staticmethod
+  def series_quotas(codes, points, minimum):
+    return proportional_quotas(np.bincount(codes), points, minimum) if len(codes) else np.empty(0, dtype=np.int64)
+
+  # Rank of every row within a random permutation of its dapp's rows, computed once per seed
+  def sample_ranks(self, seed):
+    if seed not in self.ranks:
+      random_state = np.random.RandomState(seed)
+      ranks = np.zeros(len(self), dtype=np.uint32)
+      for name in sorted(self.category_labels('name')):
+        name_positions = self.where([('isin', 'name', [name])])
+        ranks[name_positions] = random_state.permutation(len(name_positions))
+      self.ranks[seed] = ranks
+    return self.ranks[seed]
+
+  # Materialize rows, projected to the given columns (all columns if None)
+  def take(self, positions, columns=None):
+    return self.backend.take(positions, columns)
+
+  def column_values(self, column, positions):
+    return self.take(positions, [column])[column].values
+
+  # Values of a single listing, as a Series keyed by column
+  def lookup(self, index_id, columns):
+    return self.backend.lookup(index_id, columns)
+
+  def ids(self, positions):
+    return self.backend.ids(positions)
+
+  def get_indexer(self, ids):
+    return self.backend.get_indexer(ids)
+
+#### Backend comparison
+
+# Time each backend over each QuerySpec (best of `repeat`), checking that every backend selects the same rows.
+# Returns {backend name: {spec index: seconds}}.
+def benchmark(backends, specs, repeat=5):
+  timings = {}
+  expected = {}
+  for backend_name, backend in backends.items():
+    timings[backend_name] = {}
+    for i, spec in enumerate(specs):
+      best = None
+      for _ in range(repeat):
+        started = time.time()
+        positions = backend.select(compile_predicates(spec))
+        elapsed = time.time() - started
+        best = elapsed if best is None else min(best, elapsed)
+      if i in expected and not np.array_equal(expected[i], positions):
+        raise AssertionError('Backend {} disagrees on spec {}'.format(backend_name, spec))
+      expected[i] = positions
+      timings[backend_name][i] = best
+  return timings
+
+# Synthetic listings with the same shape as the dashboard's frame
+def synthetic_listings(rows, seed=0):
+  random_state = np.random.RandomState(seed)
+  dapps = ['dapp-{}'.format(i) for i in range(15)]
+  outcomes = ['sold', 'delisted', 'listed', 'unresolved']
+  start = np.datetime64('2017-06-01')
+  df = pd.DataFrame({
+    'name': pd.Categorical(random_state.choice(dapps, rows)),
+    'resolution_event_type': pd.Categorical(random_state.choice(outcomes, rows)),
+    'created_at': start + random_state.randint(0, 365 * 24 * 3600, rows).astype('timedelta64[s]'),
+    'token_item_id': random_state.randint(0, rows // 10 + 1, rows).astype(np.uint32),
+    'listing_start_price_normalized': random_state.lognormal(size=rows).astype(np.float32)
+  }, index=pd.Index(np.arange(rows, dtype=np.uint32), name='id'))
+  return df, dapps, outcomes
+
+if __name__ == '__main__':
+  df, dapps, outcomes = synthetic_listings(1000000)
+  window = (dt.datetime(2017, 9, 1), dt.datetime(2018, 3, 1))
+  specs = [
+    make_query_spec(dapps, outcomes, (dt.datetime(2017, 6, 1), dt.datetime(2018, 7, 1))),
+    make_query_spec(dapps[:3], outcomes[:2], window),
+    make_query_spec(dapps, outcomes, window, freezes={'token_item_id': 42})
+  ]
+  timings = benchmark({'pandas': PandasBackend(df), 'columnar': columnar_backend(df)}, specs)
+  for i, spec in enumerate(specs):
+    print('spec {}: '.format(i) + ', '.join('{} {:.4f}s'.format(name, timings[name][i]) for name in sorted(timings)))
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import gzip
+import hashlib
+import threading
+import flask
+from cachetools import LRUCache
+
+#### Pre-serialized callback responses
+
+COMPRESSION_LEVEL = 6
+
+# Reduce a Dash '_dash-update-component' request body to a stable key.
+# Inputs & state are ordered by (id, property) and values are serialized with sorted keys, so equivalent requests collide.
+# The version string (eg. a hash of the loaded data) is mixed in so keys & ETags change when the data does.
+def normalize_callback_request(body, version=''):
+  def components(entries):
+    return sorted([[c['id'], c['property'], c.get('value')] for c in entries], key=lambda c: (c[0], c[1]))
+  normalized = {
+    'version': version,
+    'output': [body['output']['id'], body['output']['property']],
+    'inputs': components(body.get('inputs', [])),
+    'state': components(body.get('state', []))
+  }
+  return hashlib.sha1(json.dumps(normalized, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+# Dash target id ('component-id.property') of a callback request body
+def callback_target(body):
+  return '{}.{}'.format(body['output']['id'], body['output']['property'])
+
+## A callback response body held gzip-compressed in memory
+# Only the compressed form is stored; the rare client without gzip support gets it decompressed on the fly.
+# The cache key is also sent as the ETag (a content hash of everything the response depends on), which is informational only:
+# callback requests are POSTs, so browsers don't send it back.
+
+class CachedResponse(object):
+  def __init__(self, key, body, mimetype='application/json', compressed=None):
+    self.etag = key
+    self.compressed = gzip.compress(body, compresslevel=COMPRESSION_LEVEL) if compressed is None else compressed
+    self.mimetype = mimetype
+
+  def to_response(self, request):
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+      response = flask.Response(self.compressed, mimetype=self.mimetype)
+      response.headers['Content-Encoding'] = 'gzip'
+    else:
+      response = flask.Response(gzip.decompress(self.compressed), mimetype=self.mimetype)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.set_etag(self.etag)
+    return response
+
+## Keyed store of CachedResponse objects
+# Pinned entries (eg. the default page state) are never evicted; everything else lives in an LRU bounded by compressed bytes.
+# max_bytes:    Budget for the LRU portion of the cache
+# uncacheable:  Callback targets whose output depends on more than their inputs (eg. per-session state)
+
+class ResponseCache(object):
+  def __init__(self, max_bytes=64 * 1024 * 1024, uncacheable=()):
+    self.version = ''
+    self.max_bytes = max_bytes
+    self.uncacheable = set(uncacheable)
+    self.pinned = {}
+    self.entries = LRUCache(maxsize=max_bytes, getsizeof=lambda entry: len(entry.compressed))
+    self.lock = threading.Lock()
+
+  def key_for(self, body):
+    return normalize_callback_request(body, self.version)
+
+  def is_cacheable(self, body):
+    return callback_target(body) not in self.uncacheable
+
+  def get(self, key):
+    with self.lock:
+      entry = self.pinned.get(key)
+      if entry is None:
+        entry = self.entries.get(key)
+      return entry
+
+  def put(self, key, body, mimetype='application/json', pin=False):
+    entry = CachedResponse(key, body, mimetype)
+    with self.lock:
+      if pin:
+        self.pinned[key] = entry
+      elif len(entry.compressed) <= self.max_bytes:
+        self.entries[key] = entry
+    return entry
+
+  # Move an LRU entry into the pinned set
+  def pin(self, key):
+    with self.lock:
+      entry = self.entries.pop(key, None)
+      if entry is not None:
+        self.pinned[key] = entry
+      return entry
+
+  # Write the pinned entries to a directory (<key>.gz files plus an index of mimetypes), so a later boot can skip warming
+  def save_pinned(self, directory):
+    os.makedirs(directory, exist_ok=True)
+    with self.lock:
+      pinned = dict(self.pinned)
+    for key, entry in pinned.items():
+      with open(os.path.join(directory, key + '.gz'), 'wb') as f:
+        f.write(entry.compressed)
+    temporary = os.path.join(directory, 'index.json.tmp')
+    with open(temporary, 'w') as f:
+      json.dump({key: entry.mimetype for key, entry in pinned.items()}, f)
+    os.replace(temporary, os.path.join(directory, 'index.json'))
+
+  # Pin the entries saved by save_pinned.  Returns False (loading nothing) if the directory holds no complete save.
+  def load_pinned(self, directory):
+    index_file = os.path.join(directory, 'index.json')
+    if not os.path.exists(index_file):
+      return False
+    with open(index_file) as f:
+      index = json.load(f)
+    for key, mimetype in index.items():
+      with open(os.path.join(directory, key + '.gz'), 'rb') as f:
+        entry = CachedResponse(key, None, mimetype, compressed=f.read())
+      with self.lock:
+        self.pinned[key] = entry
+    return True
+
+  def __len__(self):
+    return len(self.pinned) + len(self.entries)
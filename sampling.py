@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+#### Density-preserving scatter sampling
+
+# Every point with a NaN/infinite coordinate shares one extra cell, after the bins x bins grid.
+# bounds ((x low, x high), (y low, y high)) fixes the grid's extent; by default it spans the finite points.
+def grid_cells(x, y, bins, bounds=None):
+  x = np.asarray(x, dtype=np.float64)
+  y = np.asarray(y, dtype=np.float64)
+  valid = np.isfinite(x) & np.isfinite(y)
+  cells = np.full(len(x), bins * bins, dtype=np.int64)
+  if valid.any():
+    x_bounds, y_bounds = bounds if bounds is not None else [(values.min(), values.max()) for values in (x[valid], y[valid])]
+    cells[valid] = axis_bins(x[valid], bins, *x_bounds) * bins + axis_bins(y[valid], bins, *y_bounds)
+  return cells
+
+def axis_bins(values, bins, low, high):
+  scale = bins / (high - low) if high > low else 0.0
+  return np.clip(((values - low) * scale).astype(np.int64), 0, bins - 1)
+
+# Grid resolution per axis for a budget: roughly one cell per four points, rounded to a power of two so that small
+# changes in the budget keep the same grid, & larger ones split or merge whole cells
+def default_bins(budget):
+  return 2 ** max(int(np.round(np.log2(max(np.sqrt(budget / 4.0), 1)))), 0)
+
+# Largest per-cell quota such that keeping min(count, quota) points from every cell fits in the budget.
+# Never below 1, so no occupied cell is emptied entirely.
+def cell_quota(counts, budget):
+  counts = np.sort(counts)
+  if counts.sum() <= budget:
+    return counts[-1] if len(counts) else 0
+  remaining_cells = len(counts) - np.arange(len(counts))
+  remaining_budget = budget - (np.cumsum(counts) - counts)
+  exceeds = counts * remaining_cells > remaining_budget
+  first = np.argmax(exceeds)
+  return max(int(remaining_budget[first] // remaining_cells[first]), 1)
+
+## Stratified sample of scatter points, returned as sorted positions into x & y.
+## Points are bucketed into a 2D grid over the (display space) coordinates: sparse cells keep all of their points,
+## dense cells are thinned to a common quota, keeping their lowest-ranked points.  Outliers therefore survive, while the
+## total matches the budget.  The points left over by rounding the quota down go to the lowest-ranked of the next points
+## of the cells still holding more.
+# budget:  Number of points to keep.  Can be exceeded (by at most one point per occupied cell) only when there are more
+#          occupied cells than budget.
+# bins:    Grid resolution per axis.  Defaults to default_bins(budget).
+# seed:    Seed for random ranks, so the same inputs always give the same sample
+# ranks:   Ranks of the points (eg. the query engine's persisted per-dapp sample ranks), used instead of random ones.
+#          With ranks drawn once for all rows, a point kept under one filter stays kept under another while its cell
+#          keeps its quota, so the plot doesn't reshuffle as the filters change.
+# bounds:  Fixed grid extent (see grid_cells), eg. the range of the whole column rather than of the filtered points
+
+def stratified_sample(x, y, budget, bins=None, seed=None, ranks=None, bounds=None):
+  if len(x) <= budget:
+    return np.arange(len(x))
+  if bins is None:
+    bins = default_bins(budget)
+
+  cells = grid_cells(x, y, bins, bounds)
+  quota = cell_quota(np.bincount(cells), budget)
+
+  # Order the points within each cell by rank & keep the first `quota` of them
+  keys = np.random.RandomState(seed).random_sample(len(cells)) if ranks is None else np.asarray(ranks)
+  order = np.lexsort((keys, cells))
+  sorted_cells = cells[order]
+  rank = np.arange(len(order)) - np.searchsorted(sorted_cells, sorted_cells, side='left')
+  keep = rank < quota
+  shortfall = budget - np.count_nonzero(keep)
+  if shortfall > 0:
+    # The next point of each cell with points to spare, lowest ranked first
+    spare = np.flatnonzero(rank == quota)
+    keep[spare[np.argsort(keys[order[spare]], kind='stable')[:shortfall]]] = True
+  return np.sort(order[keep])
+
+# Stratified sample of several series at once, as sorted positions into codes, x & y.  Each series is thinned on its own
+# grid to quotas[code] points, so a small series in a crowded region keeps its share rather than being thinned away
+# along with its neighbours.  ranks & bounds are as for stratified_sample.
+def series_stratified_sample(codes, x, y, quotas, bins=None, seed=None, ranks=None, bounds=None):
+  x = np.asarray(x)
+  y = np.asarray(y)
+  order = np.argsort(codes, kind='stable')
+  ends = np.cumsum(np.bincount(codes, minlength=len(quotas)))
+  kept = [members[stratified_sample(x[members], y[members], quotas[code], bins=bins, seed=seed,
+                                    ranks=None if ranks is None else np.asarray(ranks)[members], bounds=bounds)]
+          for code, members in enumerate(np.split(order, ends[:-1])) if len(members)]
+  return np.sort(np.concatenate(kept)) if kept else np.empty(0, dtype=np.int64)
+
+#### Series budget sampling
+
+## A render budget shared between series (eg. dapp x outcome) in proportion to their sizes.
+## Every row holds a random rank within its dapp (a cached permutation of the dapp's rows).  Here each series keeps its
+## lowest-ranked rows, so the sample of a filtered series is a uniform random subset of it, and changing the budget or
+## the filters only changes how many ranks are kept, never which rows were drawn.  The scatter uses the same ranks to
+## order the points within each grid cell (see stratified_sample), so there a changed filter or budget only adds or
+## drops the highest-ranked of each cell's points, rather than redrawing them.
+
+# Points per series: a share of the budget in proportion to the series' size, but at least `minimum`
+# (or the whole series, if smaller).  Minimums can take the total over the budget by up to `minimum` per series.
+def proportional_quotas(counts, budget, minimum):
+  counts = np.asarray(counts, dtype=np.int64)
+  total = counts.sum()
+  if total <= budget:
+    return counts
+  shares = (counts * (budget / float(total))).astype(np.int64)
+  return np.minimum(np.maximum(shares, minimum), counts)
+
+# Positions (into codes & ranks) of the quotas[code] lowest-ranked rows of every series, sorted
+def ranked_sample(codes, ranks, quotas):
+  order = np.lexsort((ranks, codes))
+  sorted_codes = codes[order]
+  rank = np.arange(len(order)) - np.searchsorted(sorted_codes, sorted_codes, side='left')
+  return np.sort(order[rank < quotas[sorted_codes]])
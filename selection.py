@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+#### Scatter box & lasso selections, resolved server-side
+
+# Polygon of a Plotly 'selectedData' event as ([x, ...], [y, ...]) in data coordinates, or None if there's no selection.
+# Box selections report their 'range' & become rectangles; lasso selections report their vertices as 'lassoPoints'.
+def selection_polygon(selected_data):
+  if not selected_data:
+    return None
+  if selected_data.get('range'):
+    (x0, x1), (y0, y1) = selected_data['range']['x'], selected_data['range']['y']
+    return [x0, x1, x1, x0], [y0, y0, y1, y1]
+  if selected_data.get('lassoPoints'):
+    return list(selected_data['lassoPoints']['x']), list(selected_data['lassoPoints']['y'])
+  return None
+
+## Boolean mask of the points (x[i], y[i]) inside a polygon, by the even-odd rule.
+## Casts a ray in +x from every point at once & counts edge crossings, one vectorized pass per edge.
+## Points are first clipped to the polygon's bounding box, so the per-edge work only covers candidates.
+## Points with a NaN coordinate are never inside.
+
+def points_in_polygon(x, y, polygon_x, polygon_y):
+  x = np.asarray(x, dtype=np.float64)
+  y = np.asarray(y, dtype=np.float64)
+  polygon_x = np.asarray(polygon_x, dtype=np.float64)
+  polygon_y = np.asarray(polygon_y, dtype=np.float64)
+  inside = np.zeros(len(x), dtype=bool)
+  if len(polygon_x) < 3:
+    return inside
+
+  with np.errstate(invalid='ignore'):
+    candidates = np.flatnonzero((x >= polygon_x.min()) & (x <= polygon_x.max()) & (y >= polygon_y.min()) & (y <= polygon_y.max()))
+  cx, cy = x[candidates], y[candidates]
+  crossings = np.zeros(len(candidates), dtype=bool)
+  for x0, y0, x1, y1 in zip(polygon_x, polygon_y, np.roll(polygon_x, -1), np.roll(polygon_y, -1)):
+    if y0 == y1:
+      continue
+    straddles = (y0 > cy) != (y1 > cy)
+    crossings ^= straddles & (cx < x0 + (cy - y0) * (x1 - x0) / (y1 - y0))
+  inside[candidates] = crossings
+  return inside
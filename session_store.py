@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import json
+import hashlib
+import threading
+from cachetools import TTLCache
+
+#### Server-side per-session state
+
+# Short, content-derived handle for a stored value.  Hidden Divs in the layout carry these instead of the values themselves;
+# equal values give equal handles, so responses keyed on a handle stay cacheable across sessions.
+def make_handle(name, value):
+  digest = hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+  return '{}:{}'.format(name, digest[:16])
+
+# Session values are stored as JSON: NumPy scalars (eg. a listing's frozen attributes) become plain numbers & strings.
+# Values should be passed through session_value before being stored or given a handle, so that a value read back from
+# any store has the same handle as the one that was written.
+def json_default(value):
+  return value.item() if hasattr(value, 'item') else str(value)
+
+def session_value(value):
+  return json.loads(json.dumps(value, default=json_default))
+
+## In-process store, for single-worker deployments
+# maxsize:  Number of sessions to keep; least recently used sessions are evicted first
+# ttl:      Seconds a session survives without being written to
+
+class MemorySessionStore(object):
+  def __init__(self, maxsize=4096, ttl=3600):
+    self.sessions = TTLCache(maxsize=maxsize, ttl=ttl)
+    self.lock = threading.Lock()
+
+  def get(self, token, name, default=None):
+    with self.lock:
+      return self.sessions.get(token, {}).get(name, default)
+
+  def set(self, token, name, value):
+    with self.lock:
+      session = self.sessions.get(token, {})
+      session[name] = value
+      # Re-insert to refresh the session's expiry
+      self.sessions[token] = session
+
+## Redis-backed store, shared between workers & instances.
+# Uses the optional 'redis' package, which is only imported when this backend is configured.
+# Each session is a hash of JSON values that expires ttl seconds after its last write.  Nothing read back from Redis is
+# ever unpickled, so write access to the store can't be turned into code execution in the app.
+
+class RedisSessionStore(object):
+  def __init__(self, url, ttl=3600, prefix='dapp-session'):
+    import redis
+    self.client = redis.StrictRedis.from_url(url)
+    self.ttl = ttl
+    self.prefix = prefix
+
+  def key(self, token):
+    return '{}:{}'.format(self.prefix, token)
+
+  def get(self, token, name, default=None):
+    value = self.client.hget(self.key(token), name)
+    return default if value is None else json.loads(value.decode('utf-8'))
+
+  def set(self, token, name, value):
+    pipeline = self.client.pipeline()
+    pipeline.hset(self.key(token), name, json.dumps(value, default=json_default))
+    pipeline.expire(self.key(token), self.ttl)
+    pipeline.execute()
+
+# Pick a backend from a URL: 'redis://' or 'rediss://' URLs use Redis, anything else (eg. 'memory://') stays in-process
+def create_session_store(url, ttl=3600, maxsize=4096):
+  if url.startswith('redis://') or url.startswith('rediss://'):
+    return RedisSessionStore(url, ttl=ttl)
+  return MemorySessionStore(maxsize=maxsize, ttl=ttl)
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import json
+import shutil
+import hashlib
+import numpy as np
+
+#### Content-addressed snapshots of the data & everything derived from it
+
+SNAPSHOT_NAME = re.compile('^[0-9a-f]{40}$')
+
+# Hex digest (SHA-1 by default) of a file's contents, streamed
+def file_digest(path, blocksize=1 << 20, algorithm='sha1'):
+  digest = hashlib.new(algorithm)
+  with open(path, 'rb') as f:
+    for block in iter(lambda: f.read(blocksize), b''):
+      digest.update(block)
+  return digest.hexdigest()
+
+# SHA-1 over every Python source file in a directory, so cached outputs of the code (eg. figures) follow deploys
+def source_digest(directory):
+  digest = hashlib.sha1()
+  for name in sorted(os.listdir(directory)):
+    if name.endswith('.py'):
+      digest.update(name.encode('utf-8'))
+      with open(os.path.join(directory, name), 'rb') as f:
+        digest.update(f.read())
+  return digest.hexdigest()
+
+# Combine the input data's content hash with the configuration that shapes the derived data
+def snapshot_digest(data_digest, config):
+  return hashlib.sha1(json.dumps([data_digest, config], sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+## Directory of derived structures for one version of the input data (root/<digest>).
+## Structures are built on first use and reloaded (memory-mapped, where possible) on every later boot with the same digest.
+
+class Snapshot(object):
+  def __init__(self, root, digest):
+    self.root = root
+    self.digest = digest
+    self.directory = os.path.join(root, digest)
+    os.makedirs(self.directory, exist_ok=True)
+
+  def path(self, name):
+    return os.path.join(self.directory, name)
+
+  # Write through a temporary file, so an interrupted build never leaves a truncated file behind
+  def _save(self, name, array):
+    temporary = self.path(name + '.tmp.npy')
+    np.save(temporary, array)
+    os.replace(temporary, self.path(name))
+
+  # A single array, built by compute() if it isn't in the snapshot yet
+  def array(self, name, compute):
+    filename = name + '.npy'
+    if not os.path.exists(self.path(filename)):
+      self._save(filename, np.asarray(compute()))
+    return np.load(self.path(filename), mmap_mode='r')
+
+  # A dict of arrays, built by compute() if any of them are missing.  The set of keys is recorded in <name>.json.
+  def arrays(self, name, compute):
+    keys_file = self.path(name + '.json')
+    if not os.path.exists(keys_file):
+      arrays = compute()
+      for key, array in arrays.items():
+        self._save('{}.{}.npy'.format(name, key), np.asarray(array))
+      with open(keys_file + '.tmp', 'w') as f:
+        json.dump(sorted(arrays), f)
+      os.replace(keys_file + '.tmp', keys_file)
+    with open(keys_file) as f:
+      keys = json.load(f)
+    return {key: np.load(self.path('{}.{}.npy'.format(name, key)), mmap_mode='r') for key in keys}
+
+  # Remove snapshots of other data versions under the same root
+  def prune(self):
+    for name in os.listdir(self.root):
+      if name != self.digest and SNAPSHOT_NAME.match(name) and os.path.isdir(os.path.join(self.root, name)):
+        shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
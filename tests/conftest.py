@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# The dashboard's modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DAPPS = ['dapp-{}'.format(i) for i in range(6)]
+OUTCOMES = ['sold', 'delisted', 'listed', 'unresolved']
+
+## Small listings frame shaped like the dashboard's: categorical dapps & outcomes (with a dapp label that no row uses),
+## NaN prices, missing addresses, and listing ids that aren't row positions
+
+@pytest.fixture(scope='session')
+def listings_frame():
+  random_state = np.random.RandomState(7)
+  rows = 2000
+  prices = random_state.lognormal(size=rows).astype(np.float32)
+  prices[random_state.random_sample(rows) < 0.1] = np.nan
+  addresses = np.array(['0x{:04x}'.format(i) for i in random_state.randint(0, 40, rows)], dtype=object)
+  addresses[random_state.random_sample(rows) < 0.05] = np.nan
+  return pd.DataFrame({
+    'name': pd.Categorical(random_state.choice(DAPPS, rows, p=[0.6, 0.2, 0.1, 0.05, 0.04, 0.01]), categories=DAPPS + ['dapp-unused']),
+    'resolution_event_type': pd.Categorical(random_state.choice(OUTCOMES, rows)),
+    'created_at': np.datetime64('2017-06-01', 'ns') + random_state.randint(0, 365 * 24 * 3600, rows).astype('timedelta64[s]'),
+    'token_item_id': random_state.randint(0, 150, rows).astype(np.uint32),
+    'listing_start_price_normalized': prices,
+    'to_address': addresses
+  }, index=pd.Index(np.arange(rows, dtype=np.uint32) * 3 + 11, name='id'))
+
+# Categoricals as plain objects, so frames from different backends compare by value
+def normalized(frame):
+  frame = frame.copy()
+  for column in frame.columns:
+    if hasattr(frame[column], 'cat'):
+      frame[column] = frame[column].astype(object)
+  return frame
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import datetime as dt
+import numpy as np
+import pandas as pd
+import pytest
+from aggregates import GroupAggregates
+from coalesce import SharedResultCache
+from query_engine import PandasBackend, QueryEngine
+from conftest import DAPPS, OUTCOMES
+
+#### Top traders: merged partition aggregates must match a plain pandas groupby over the filtered listings
+
+GROUP = 'to_address'
+VALUE = 'listing_start_price_normalized'
+
+FILTERS = [
+  (DAPPS, OUTCOMES, (dt.datetime(2017, 6, 1), dt.datetime(2018, 6, 1))),
+  (DAPPS[:2], ['sold'], (dt.datetime(2017, 9, 1), dt.datetime(2018, 1, 1))),
+  (['dapp-5', 'dapp-unused', 'dapp-missing'], OUTCOMES[1:], (dt.datetime(2017, 6, 1), dt.datetime(2017, 12, 1))),
+  ([DAPPS[0]], OUTCOMES, (dt.datetime(2018, 2, 1), dt.datetime(2018, 3, 1))),
+  (DAPPS, OUTCOMES, (dt.datetime(2019, 1, 1), dt.datetime(2019, 6, 1)))
+]
+
+@pytest.fixture(scope='module')
+def aggregates(listings_frame):
+  engine = QueryEngine(PandasBackend(listings_frame), SharedResultCache())
+  # Small chunks, so groups are split between chunks & merged
+  built = GroupAggregates.build(engine, GROUP, VALUE, chunksize=170)
+  # ...& survive a round trip through their persisted arrays
+  return GroupAggregates.from_arrays(built.to_arrays())
+
+# Per-group count & value (NaN as 0) of the filtered listings, by pandas
+def reference_totals(df, dapps, outcomes, time_range):
+  mask = (df['name'].isin(dapps) & df['resolution_event_type'].isin(outcomes) & df[GROUP].notnull()
+          & (df['created_at'] >= time_range[0]) & (df['created_at'] < time_range[1]))
+  frame = df[mask].assign(value=df[VALUE].fillna(0).astype(np.float64))
+  return frame.groupby(GROUP)['value'].agg(['count', 'sum']).rename(columns={'sum': 'value'})
+
+@pytest.mark.parametrize('filters', FILTERS)
+@pytest.mark.parametrize('by', ['count', 'value'])
+def test_top_matches_pandas_groupby(aggregates, listings_frame, filters, by):
+  expected = reference_totals(listings_frame, *filters)
+  top = aggregates.top(*filters, n=10, by=by)
+
+  assert len(top) == min(10, len(expected))
+  assert list(top.columns) == ['group', 'count', 'value']
+  # Each listed group carries its exact totals...
+  for row in top.itertuples():
+    assert row.count == expected.loc[row.group, 'count']
+    assert row.value == pytest.approx(expected.loc[row.group, 'value'], rel=1e-6)
+  # ...in descending order of the metric, & no group left out beats any listed one
+  metric = top[by].values
+  if len(top):
+    assert np.all(np.diff(metric) <= 1e-9 * max(1.0, np.abs(metric).max()))
+    others = expected.drop(top['group'])[by]
+    assert np.all(others.values <= metric[-1] * (1 + 1e-6))
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_totals_match_pandas_groupby(aggregates, listings_frame, filters):
+  expected = reference_totals(listings_frame, *filters)
+  counts, values = aggregates.totals(*filters)
+  groups = [label.decode('utf-8') for label in aggregates.groups]
+  totals = pd.DataFrame({'count': counts, 'value': values}, index=groups)
+  totals = totals[totals['count'] > 0]
+
+  assert sorted(totals.index) == sorted(expected.index)
+  np.testing.assert_array_equal(totals.loc[expected.index, 'count'].values, expected['count'].values)
+  np.testing.assert_allclose(totals.loc[expected.index, 'value'].values, expected['value'].values, rtol=1e-6)
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import json
+import base64
+import numpy as np
+import pytest
+from api import ApiError, decode_cursor, grouped_stats, numeric_columns, percentiles, row_page
+from coalesce import SharedResultCache
+from query_engine import PandasBackend, QueryEngine, columnar_backend
+
+#### Query API computations
+
+@pytest.fixture(params=['pandas', 'columnar'])
+def engine(request, listings_frame):
+  backend = PandasBackend(listings_frame) if request.param == 'pandas' else columnar_backend(listings_frame, chunksize=300)
+  return QueryEngine(backend, SharedResultCache())
+
+def test_only_numeric_columns_are_dimensions(engine, listings_frame):
+  assert numeric_columns(engine, list(listings_frame.columns)) == ['token_item_id', 'listing_start_price_normalized']
+
+def test_grouped_stats_match_pandas(engine, listings_frame):
+  positions = np.arange(0, len(listings_frame), 2)
+  stats = grouped_stats(engine, positions, 'listing_start_price_normalized', ['dapp', 'outcome'], chunksize=97)
+  frame = listings_frame.iloc[positions]
+  expected = frame.groupby([frame['name'].astype(str), frame['resolution_event_type'].astype(str)])['listing_start_price_normalized']
+  expected = expected.agg(['count', 'mean', 'min', 'max'])
+
+  assert len(stats) == len(expected)
+  for group in stats:
+    row = expected.loc[(group['dapp'], group['outcome'])]
+    assert group['count'] == row['count']
+    for statistic in ['mean', 'min', 'max']:
+      if np.isnan(row[statistic]):
+        assert group[statistic] is None
+      else:
+        assert group[statistic] == pytest.approx(row[statistic], rel=1e-5)
+
+def test_percentiles_ignore_nan(engine, listings_frame):
+  values = listings_frame['listing_start_price_normalized'].values.astype(np.float64)
+  result = percentiles(engine, np.arange(len(listings_frame)), 'listing_start_price_normalized', [50, 90])
+  assert result['50'] == pytest.approx(np.nanpercentile(values, 50))
+  assert result['90'] == pytest.approx(np.nanpercentile(values, 90))
+
+def test_row_pages_cover_every_row_once(engine):
+  positions = np.arange(5, 400, 3)
+  seen = []
+  cursor = None
+  while True:
+    rows, cursor = row_page(engine, positions, ['name'], 50, cursor, 'v1')
+    seen += [row['id'] for row in rows]
+    if cursor is None:
+      break
+  assert seen == list(engine.ids(positions))
+
+def test_cursor_from_other_data_version_is_gone(engine):
+  _, cursor = row_page(engine, np.arange(100), ['name'], 10, None, 'v1')
+  with pytest.raises(ApiError) as error:
+    decode_cursor(cursor, 'v2')
+  assert error.value.status == 410
+  with pytest.raises(ApiError):
+    decode_cursor('not a cursor', 'v1')
+
+@pytest.mark.parametrize('position', [None, [1, 2], 'a', 1.5, True, {'a': 1}])
+def test_cursor_positions_must_be_integers(engine, position):
+  cursor = base64.urlsafe_b64encode(json.dumps([position, 'v1']).encode('utf-8')).decode('ascii')
+  with pytest.raises(ApiError) as error:
+    row_page(engine, np.arange(100), ['name'], 10, cursor, 'v1')
+  assert error.value.status == 400
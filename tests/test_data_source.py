@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import base64
+import hashlib
+import threading
+import http.server
+import pytest
+from data_source import ChecksumError, DataSource, HttpRangeSource, LocalFileSource
+from snapshot import file_digest
+
+#### Data sources, with a temp file served over HTTP
+
+pytest.importorskip('requests')
+
+PART_BYTES = 1000
+
+## Serves the server's current content at any path.  Range requests & the optional headers are switched by server flags.
+
+class Handler(http.server.BaseHTTPRequestHandler):
+  def log_message(self, *args):
+    pass
+
+  def send_headers(self, status, length):
+    server = self.server
+    self.send_response(status)
+    self.send_header('ETag', '"{}"'.format(hashlib.sha1(server.content).hexdigest()))
+    if server.ranges:
+      self.send_header('Accept-Ranges', 'bytes')
+    if server.content_md5 is not None:
+      self.send_header('Content-MD5', server.content_md5)
+    if server.content_length:
+      self.send_header('Content-Length', str(length))
+    else:
+      self.send_header('Connection', 'close')
+    self.end_headers()
+
+  def do_HEAD(self):
+    self.server.requests.append(('HEAD', None))
+    self.send_headers(200, len(self.server.content))
+
+  def do_GET(self):
+    content = self.server.content
+    byte_range = re.match(r'bytes=(\d+)-(\d+)$', self.headers.get('Range', ''))
+    self.server.requests.append(('GET', self.headers.get('Range')))
+    if byte_range and self.server.ranges:
+      start, stop = int(byte_range.group(1)), int(byte_range.group(2)) + 1
+      self.send_headers(206, stop - start)
+      self.wfile.write(content[start:stop])
+    else:
+      self.send_headers(200, len(content))
+      self.wfile.write(content)
+      self.close_connection = True
+
+@pytest.fixture
+def server():
+  httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+  httpd.content = os.urandom(10 * PART_BYTES + 123)
+  httpd.ranges = True
+  httpd.content_length = True
+  httpd.content_md5 = None
+  httpd.requests = []
+  thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+  thread.start()
+  yield httpd
+  httpd.shutdown()
+  httpd.server_close()
+
+def source(server):
+  return HttpRangeSource('http://127.0.0.1:{}/data/listings.csv'.format(server.server_address[1]), workers=3,
+                         part_bytes=PART_BYTES)
+
+def read(path):
+  with open(path, 'rb') as f:
+    return f.read()
+
+def test_sources_must_implement_digest_and_local_path():
+  with pytest.raises(TypeError):
+    DataSource('listings.csv')
+
+def test_ranged_download_reassembles_the_content(server, tmp_path):
+  path = source(server).local_path(str(tmp_path))
+  assert read(path) == server.content
+  assert os.path.basename(path) == 'listings.csv'
+  ranges = [byte_range for method, byte_range in server.requests if method == 'GET']
+  assert len(ranges) == 11 and all(ranges)
+
+def test_digest_is_stable_and_the_copy_is_reused(server, tmp_path):
+  first = source(server)
+  path = first.local_path(str(tmp_path))
+  server.requests = []
+
+  second = source(server)
+  assert second.digest() == first.digest()
+  assert second.local_path(str(tmp_path)) == path
+  assert server.requests == [('HEAD', None)]
+
+def test_changed_content_gets_a_new_digest_and_prunes_the_old_copy(server, tmp_path):
+  (tmp_path / 'side_store').mkdir()
+  old = source(server)
+  old_path = old.local_path(str(tmp_path))
+
+  server.content = os.urandom(3 * PART_BYTES)
+  new = source(server)
+  assert new.digest() != old.digest()
+  new_path = new.local_path(str(tmp_path))
+  assert read(new_path) == server.content
+  assert not os.path.exists(os.path.dirname(old_path))
+  # Anything else in the cache directory is left alone
+  assert sorted(os.listdir(str(tmp_path))) == sorted([new.digest(), 'side_store'])
+
+@pytest.mark.parametrize('ranges, content_length', [(False, True), (True, False), (False, False)])
+def test_unranged_servers_are_fetched_whole(server, tmp_path, ranges, content_length):
+  server.ranges = ranges
+  server.content_length = content_length
+  path = source(server).local_path(str(tmp_path))
+  assert read(path) == server.content
+  assert [request for request in server.requests if request[0] == 'GET'] == [('GET', None)]
+
+def test_content_md5_is_checked(server, tmp_path):
+  server.content_md5 = base64.b64encode(hashlib.md5(server.content).digest()).decode('ascii')
+  path = source(server).local_path(str(tmp_path))
+  assert file_digest(path, algorithm='md5') == hashlib.md5(server.content).hexdigest()
+
+  server.content_md5 = base64.b64encode(hashlib.md5(b'something else').digest()).decode('ascii')
+  other = str(tmp_path / 'other')
+  with pytest.raises(ChecksumError):
+    source(server).local_path(other)
+  assert all(not files for _, _, files in os.walk(other))
+
+def test_local_file_is_used_in_place(tmp_path):
+  path = tmp_path / 'listings.csv'
+  path.write_bytes(b'id,name\n1,dapp-0\n')
+  local = LocalFileSource(str(path))
+  assert local.local_path(str(tmp_path / 'cache')) == str(path)
+  assert local.digest() == file_digest(str(path))
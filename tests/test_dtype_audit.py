@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+from dtype_audit import decode_month_offsets, dtype_report, optimize_frame, smallest_integer_dtype, table_proposals
+
+#### Dtype audit: applied downcasts are lossless, & month offsets only go where they're asked for
+
+ROWS = 1000
+
+@pytest.fixture
+def frame():
+  random_state = np.random.RandomState(0)
+  months = pd.date_range('2017-06-01', periods=20, freq='MS')
+  return pd.DataFrame({
+    'listings_cum': np.cumsum(random_state.randint(0, 3, ROWS)).astype(np.float32),
+    'delta': random_state.randint(-100, 100, ROWS).astype(np.int64),
+    'price': random_state.randint(0, 1000, ROWS) / 4.0,
+    'precise': random_state.random_sample(ROWS),
+    'with_nan': np.where(np.arange(ROWS) % 7 == 0, np.nan, np.arange(ROWS, dtype=np.float64)),
+    'to_address': np.array(['0x{:04x}'.format(i) for i in random_state.randint(0, 50, ROWS)], dtype=object),
+    'unique_text': np.array(['text-{}'.format(i) for i in range(ROWS)], dtype=object),
+    'created_at': pd.to_datetime('2017-06-03') + pd.to_timedelta(random_state.randint(0, 10 ** 7, ROWS), unit='s'),
+    'created_at_trunc': months[random_state.randint(0, len(months), ROWS)],
+    'flag': random_state.randint(0, 2, ROWS).astype(bool)
+  }, index=pd.Index(np.arange(ROWS) * 3, name='id'))
+
+def proposals_by_column(proposals):
+  return {proposal.column: proposal for proposal in proposals}
+
+def test_applied_downcasts_round_trip(frame):
+  optimized, proposals = optimize_frame(frame, month_offset_columns=['created_at_trunc'])
+  by_column = proposals_by_column(proposals)
+
+  assert optimized.dtypes['listings_cum'] == smallest_integer_dtype(0, frame['listings_cum'].max())
+  assert optimized.dtypes['delta'] == np.int8
+  assert optimized.dtypes['price'] == np.float32
+  assert optimized.dtypes['with_nan'] == np.float32
+  assert pd.api.types.is_categorical_dtype(optimized['to_address'])
+  assert optimized.dtypes['created_at_trunc'] == np.int16
+  assert by_column['created_at_trunc'].epoch == frame['created_at_trunc'].min()
+
+  for column in ['listings_cum', 'delta', 'price', 'with_nan']:
+    np.testing.assert_array_equal(optimized[column].values.astype(frame[column].dtype), frame[column].values)
+  np.testing.assert_array_equal(optimized['to_address'].astype(object).values, frame['to_address'].values)
+  np.testing.assert_array_equal(decode_month_offsets(optimized['created_at_trunc'].values, by_column['created_at_trunc'].epoch),
+                                frame['created_at_trunc'].values)
+  pd.testing.assert_index_equal(optimized.index, frame.index)
+  assert all(proposal.applied for proposal in proposals)
+  assert all(proposal.bytes_after < proposal.bytes_before for proposal in proposals)
+
+def test_lossy_and_pointless_casts_are_not_proposed(frame):
+  optimized, proposals = optimize_frame(frame, month_offset_columns=['created_at', 'created_at_trunc'])
+  by_column = proposals_by_column(proposals)
+  # Not representable in float32, not repetitive, not month starts, already tight
+  for column in ['precise', 'unique_text', 'created_at', 'flag']:
+    assert column not in by_column
+    assert optimized.dtypes[column] == frame.dtypes[column]
+    pd.testing.assert_series_equal(optimized[column], frame[column])
+
+def test_month_offsets_are_only_applied_when_named(frame):
+  optimized, proposals = optimize_frame(frame)
+  proposal = proposals_by_column(proposals)['created_at_trunc']
+  assert proposal.kind == 'month-offset'
+  assert not proposal.applied
+  pd.testing.assert_series_equal(optimized['created_at_trunc'], frame['created_at_trunc'])
+  # Other downcasts still apply
+  assert optimized.dtypes['delta'] == np.int8
+
+def test_audit_only_leaves_the_frame_alone(frame):
+  optimized, proposals = optimize_frame(frame, apply=False, month_offset_columns=['created_at_trunc'])
+  assert optimized is frame
+  assert proposals and not any(proposal.applied for proposal in proposals)
+
+def test_report_totals(frame):
+  _, proposals = optimize_frame(frame)
+  report = dtype_report(proposals).splitlines()
+  assert len(report) == len(proposals) + 1
+  assert report[proposals.index(proposals_by_column(proposals)['created_at_trunc'])].endswith('(not applied)')
+
+  saved = lambda proposals: sum(proposal.bytes_before - proposal.bytes_after for proposal in proposals)
+  assert report[-1] == 'Dtype audit: saved {:.1f} MB of a proposed {:.1f} MB'.format(
+    saved([proposal for proposal in proposals if proposal.applied]) / 1024.0 ** 2, saved(proposals) / 1024.0 ** 2)
+
+# Categoricals, NaN addresses & already tight columns, as loaded
+def test_listings_frame_round_trips(listings_frame):
+  optimized, proposals = optimize_frame(listings_frame)
+  assert set(optimized.columns) == set(listings_frame.columns)
+  for proposal in proposals:
+    original = listings_frame[proposal.column]
+    restored = optimized[proposal.column].astype(object) if proposal.kind == 'category' else optimized[proposal.column]
+    pd.testing.assert_series_equal(restored.astype(original.dtype), original)
+
+# Column store backends are audited a column at a time, report only
+def test_column_store_backends_are_reported_on(listings_frame, tmp_path):
+  from column_store import ColumnStore
+  from query_engine import columnar_backend
+  path = str(tmp_path / 'listings.csv')
+  listings_frame.to_csv(path)
+  store = ColumnStore.ingest_csv(path, str(tmp_path / 'store'), index='id', parse_dates=['created_at'], chunksize=300,
+                                 dtype={'name': 'category', 'resolution_event_type': 'category', 'to_address': np.object_})
+
+  summary = lambda proposals: {(p.column, p.kind, p.target, p.applied) for p in proposals}
+  expected = summary(optimize_frame(listings_frame, apply=False)[1])
+  # Strings are already held as categories by the column stores, so only the numeric proposals carry over
+  for table in [columnar_backend(listings_frame, chunksize=300), store]:
+    reported = summary(table_proposals(table))
+    assert ('token_item_id', 'integer', 'uint8', False) in reported
+    assert {proposal for proposal in expected if proposal[1] != 'category'} <= reported
+    assert not any(applied for _, _, _, applied in reported)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import io
+import datetime as dt
+import flask
+import numpy as np
+import pandas as pd
+import pytest
+from coalesce import SharedResultCache
+from export import export_response
+from query_engine import PandasBackend, QueryEngine, make_query_spec
+from conftest import DAPPS, OUTCOMES, normalized
+
+#### Exports stream a chunk of rows at a time & hold exactly the filtered listings
+
+CHUNKSIZE = 100
+COLUMNS = ['name', 'resolution_event_type', 'created_at', 'listing_start_price_normalized', 'to_address']
+SPEC = make_query_spec(DAPPS[:3], OUTCOMES[:3], (dt.datetime(2017, 8, 1), dt.datetime(2018, 4, 1)))
+
+# Query engine that counts the chunks read from it
+class CountingEngine(QueryEngine):
+  def __init__(self, backend):
+    QueryEngine.__init__(self, backend, SharedResultCache())
+    self.takes = 0
+
+  def take(self, positions, columns=None):
+    self.takes += 1
+    return QueryEngine.take(self, positions, columns)
+
+@pytest.fixture
+def engine(listings_frame):
+  return CountingEngine(PandasBackend(listings_frame))
+
+@pytest.fixture
+def client(engine):
+  server = flask.Flask(__name__)
+
+  @server.route('/export/listings.<export_format>')
+  def export(export_format):
+    return export_response(export_format, engine, engine.select(SPEC), COLUMNS, chunksize=CHUNKSIZE)
+
+  return server.test_client()
+
+# What the dashboard's filter_dataframe returns for the same filters
+def filtered_frame(engine):
+  return engine.take(engine.select(SPEC), COLUMNS)
+
+def streamed_chunks(client, engine, export_format):
+  response = client.get('/export/listings.{}'.format(export_format), buffered=False)
+  assert response.status_code == 200
+  assert response.headers['Content-Disposition'] == 'attachment; filename=listings.{}'.format(export_format)
+  # The WSGI server reads the first chunk to get the response started; nothing beyond it
+  assert engine.takes <= 1
+
+  chunks = []
+  for chunk in response.iter_encoded():
+    chunks.append(chunk)
+    # Rows are read as the client consumes them, never all up front
+    assert engine.takes <= len(chunks)
+  return chunks
+
+def test_csv_streams_in_chunks(client, engine):
+  chunks = streamed_chunks(client, engine, 'csv')
+  expected = filtered_frame(engine)
+  assert len(expected) > 2 * CHUNKSIZE
+  assert len(chunks) == -(-len(expected) // CHUNKSIZE)
+
+  exported = pd.read_csv(io.BytesIO(b''.join(chunks)), index_col='id', parse_dates=['created_at'])
+  pd.testing.assert_frame_equal(exported, normalized(expected), check_dtype=False, check_index_type=False)
+
+def test_parquet_streams_row_groups(client, engine):
+  pq = pytest.importorskip('pyarrow.parquet')
+  chunks = streamed_chunks(client, engine, 'parquet')
+  expected = filtered_frame(engine)
+
+  parquet = pq.ParquetFile(io.BytesIO(b''.join(chunks)))
+  assert parquet.num_row_groups == -(-len(expected) // CHUNKSIZE)
+  assert len(chunks) == parquet.num_row_groups + 1
+  exported = parquet.read().to_pandas().set_index('id')
+  exported['created_at'] = exported['created_at'].astype('datetime64[ns]')
+  pd.testing.assert_frame_equal(exported, normalized(expected), check_dtype=False, check_index_type=False)
+
+def test_empty_export_has_a_header(listings_frame):
+  engine = CountingEngine(PandasBackend(listings_frame))
+  data = b''.join(export_response('csv', engine, np.empty(0, dtype=np.int64), COLUMNS).iter_encoded())
+  assert data.decode('utf-8').strip() == ','.join(['id'] + COLUMNS)
+
+# Row groups take their schema from the column dtypes, not from the first chunk's values
+def test_parquet_survives_a_first_chunk_of_missing_addresses():
+  pq = pytest.importorskip('pyarrow.parquet')
+  frame = pd.DataFrame({
+    'name': pd.Categorical(['dapp-0'] * 6),
+    'to_address': np.array([None, None, None, '0xa', '0xb', None], dtype=object),
+    'listing_start_price_normalized': np.arange(6, dtype=np.float32)
+  }, index=pd.Index(np.arange(6, dtype=np.uint32), name='id'))
+  engine = CountingEngine(PandasBackend(frame))
+  columns = ['name', 'to_address', 'listing_start_price_normalized']
+
+  data = b''.join(export_response('parquet', engine, np.arange(6), columns, chunksize=3).iter_encoded())
+  parquet = pq.ParquetFile(io.BytesIO(data))
+  assert parquet.num_row_groups == 2
+  assert str(parquet.schema_arrow.field('to_address').type) == 'string'
+  exported = parquet.read().to_pandas()
+  assert list(exported['to_address']) == [None, None, None, '0xa', '0xb', None]
+
+def test_unavailable_formats_are_refused_up_front(listings_frame):
+  server = flask.Flask(__name__)
+  engine = CountingEngine(PandasBackend(listings_frame))
+
+  @server.route('/export/listings.<export_format>')
+  def export(export_format):
+    return export_response(export_format, engine, np.arange(10), COLUMNS)
+
+  assert server.test_client().get('/export/listings.xlsx').status_code == 501
+  assert engine.takes == 0
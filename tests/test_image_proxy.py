@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import threading
+import http.server
+import flask
+import pytest
+from image_proxy import (DirectoryFetcher, FetchError, HttpFetcher, ThumbnailCache, UnsupportedImageError, sniff_mimetype,
+                         thumbnail_response)
+
+#### Thumbnail cache & route, with images served from a local directory
+
+SVG = b'<svg xmlns="http://www.w3.org/2000/svg"><script>alert(1)</script></svg>'
+
+def png_bytes(size, color=(200, 30, 30)):
+  Image = pytest.importorskip('PIL.Image')
+  output = io.BytesIO()
+  Image.new('RGB', size, color).save(output, format='PNG')
+  return output.getvalue()
+
+# DirectoryFetcher that counts fetches
+class CountingFetcher(DirectoryFetcher):
+  def __init__(self, directory):
+    DirectoryFetcher.__init__(self, directory)
+    self.fetches = []
+
+  def fetch(self, url):
+    self.fetches.append(url)
+    return DirectoryFetcher.fetch(self, url)
+
+@pytest.fixture
+def sources(tmp_path):
+  directory = tmp_path / 'sources'
+  directory.mkdir()
+  (directory / 'vector.svg').write_bytes(SVG)
+  (directory / 'notes.txt').write_bytes(b'just some text')
+  return directory
+
+def write_source(sources, name, data):
+  (sources / name).write_bytes(data)
+  return 'https://images.example.com/{}?v=1'.format(name)
+
+def test_miss_then_hit(tmp_path, sources):
+  url = write_source(sources, 'large.png', png_bytes((800, 600)))
+  fetcher = CountingFetcher(str(sources))
+  cache = ThumbnailCache(str(tmp_path / 'cache'), fetcher, size=100)
+
+  data, mimetype, key = cache.get(url)
+  assert mimetype == 'image/png'
+  assert key == ThumbnailCache.key(url)
+  Image = pytest.importorskip('PIL.Image')
+  assert max(Image.open(io.BytesIO(data)).size) == 100
+
+  assert cache.get(url) == (data, mimetype, key)
+  assert fetcher.fetches == [url]
+
+  # The cache survives a restart
+  reopened = ThumbnailCache(str(tmp_path / 'cache'), fetcher, size=100)
+  assert reopened.get(url) == (data, mimetype, key)
+  assert fetcher.fetches == [url]
+
+def test_missing_source(tmp_path, sources):
+  cache = ThumbnailCache(str(tmp_path / 'cache'), DirectoryFetcher(str(sources)))
+  with pytest.raises(FetchError):
+    cache.get('https://images.example.com/absent.png')
+
+def test_rejects_non_images(tmp_path, sources):
+  cache = ThumbnailCache(str(tmp_path / 'cache'), DirectoryFetcher(str(sources)))
+  assert sniff_mimetype(b'just some text') is None
+  with pytest.raises(UnsupportedImageError):
+    cache.get('https://images.example.com/notes.txt')
+  assert os.listdir(str(tmp_path / 'cache')) == []
+
+def test_lru_eviction_by_bytes(tmp_path, sources):
+  urls = [write_source(sources, 'image-{}.png'.format(i), png_bytes((50, 50), color=(i * 40, 0, 0))) for i in range(4)]
+  fetcher = CountingFetcher(str(sources))
+  first = ThumbnailCache(str(tmp_path / 'probe'), fetcher).get(urls[0])[0]
+  # Room for about three thumbnails
+  cache = ThumbnailCache(str(tmp_path / 'cache'), fetcher, max_bytes=int(len(first) * 3.5))
+
+  for url in urls[:3]:
+    cache.get(url)
+  cache.get(urls[0])                      # urls[0] becomes the most recently used
+  cache.get(urls[3])                      # ...so urls[1] is evicted to make room
+
+  assert cache.total_bytes <= cache.max_bytes
+  assert len(os.listdir(str(tmp_path / 'cache'))) == 3
+  fetcher.fetches = []
+  cache.get(urls[0])
+  cache.get(urls[2])
+  assert fetcher.fetches == []
+  cache.get(urls[1])
+  assert fetcher.fetches == [urls[1]]
+
+## Fetching over HTTP, with a cap on the source size
+
+class ImageHandler(http.server.BaseHTTPRequestHandler):
+  def log_message(self, *args):
+    pass
+
+  def do_GET(self):
+    self.send_response(200)
+    self.send_header('Content-Type', 'image/png')
+    if self.path.startswith('/declared'):
+      self.send_header('Content-Length', str(len(self.server.content)))
+    else:
+      self.send_header('Connection', 'close')
+    self.end_headers()
+    self.wfile.write(self.server.content)
+    self.close_connection = True
+
+@pytest.fixture
+def image_server():
+  pytest.importorskip('requests')
+  httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), ImageHandler)
+  httpd.content = b'\x89PNG' + os.urandom(5000)
+  threading.Thread(target=httpd.serve_forever, daemon=True).start()
+  yield httpd
+  httpd.shutdown()
+  httpd.server_close()
+
+@pytest.mark.parametrize('path', ['declared.png', 'undeclared.png'])
+def test_http_fetcher_caps_the_source_size(image_server, path):
+  url = 'http://127.0.0.1:{}/{}'.format(image_server.server_address[1], path)
+  assert HttpFetcher(max_bytes=5004).fetch(url) == image_server.content
+  with pytest.raises(FetchError):
+    HttpFetcher(max_bytes=5003).fetch(url)
+
+## The route, as app.py serves it
+
+@pytest.fixture
+def client(tmp_path, sources):
+  fetcher = CountingFetcher(str(sources))
+  cache = ThumbnailCache(str(tmp_path / 'cache'), fetcher, size=100)
+  server = flask.Flask(__name__)
+
+  @server.route('/image/<name>')
+  def image(name):
+    return thumbnail_response(cache, 'https://images.example.com/' + name, flask.request, 3600)
+
+  return server.test_client(), fetcher
+
+def test_route_answers_revalidation_with_304(client, sources):
+  test_client, fetcher = client
+  write_source(sources, 'photo.png', png_bytes((300, 300)))
+  response = test_client.get('/image/photo.png')
+  assert response.status_code == 200
+  assert response.mimetype == 'image/png'
+  assert response.headers['Cache-Control'] == 'public, max-age=3600'
+  etag = response.headers['ETag']
+
+  revalidated = test_client.get('/image/photo.png', headers={'If-None-Match': etag})
+  assert revalidated.status_code == 304
+  assert revalidated.data == b''
+  assert revalidated.headers['ETag'] == etag
+  assert len(fetcher.fetches) == 1
+
+def test_route_locks_down_passed_through_svg(client):
+  test_client, _ = client
+  response = test_client.get('/image/vector.svg')
+  assert response.status_code == 200
+  assert response.mimetype == 'image/svg+xml'
+  assert response.headers['Content-Security-Policy'] == "default-src 'none'; style-src 'unsafe-inline'"
+  assert response.headers['X-Content-Type-Options'] == 'nosniff'
+
+def test_route_rejects_non_images_and_missing_sources(client):
+  test_client, _ = client
+  assert test_client.get('/image/notes.txt').status_code == 502
+  assert test_client.get('/image/absent.png').status_code == 502
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+import datetime as dt
+import numpy as np
+import pandas as pd
+import pytest
+from coalesce import SharedResultCache
+from column_store import ColumnStore
+from query_engine import PandasBackend, QueryEngine, ValueIndex, columnar_backend, make_query_spec
+from conftest import DAPPS, OUTCOMES, normalized
+
+#### Every backend must select, sample & materialize exactly what the pandas reference does
+
+BACKENDS = ['pandas', 'columnar', 'column-store']
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, listings_frame, tmp_path_factory):
+  if request.param == 'pandas':
+    return PandasBackend(listings_frame)
+  if request.param == 'columnar':
+    return columnar_backend(listings_frame, chunksize=300)
+  # Through a CSV, as the snapshot path ingests it.  Small chunks, so chunk statistics get to skip some.
+  path = str(tmp_path_factory.mktemp('csv') / 'listings.csv')
+  listings_frame.to_csv(path)
+  dtypes = {'id': np.uint32, 'token_item_id': np.uint32, 'listing_start_price_normalized': np.float32,
+            'name': 'category', 'resolution_event_type': 'category', 'to_address': np.object_}
+  return ColumnStore.ingest_csv(path, str(tmp_path_factory.mktemp('store')), index='id', dtype=dtypes, parse_dates=['created_at'],
+                                chunksize=300)
+
+@pytest.fixture
+def engine(backend):
+  return QueryEngine(backend, SharedResultCache())
+
+WINDOW = (dt.datetime(2017, 9, 1), dt.datetime(2018, 3, 1))
+EVERYTHING = (dt.datetime(2017, 1, 1), dt.datetime(2019, 1, 1))
+
+SPECS = [
+  make_query_spec(DAPPS, OUTCOMES, EVERYTHING),
+  make_query_spec(DAPPS[:2], OUTCOMES[:2], WINDOW),
+  # Labels missing from the data match nothing, rather than failing
+  make_query_spec(['dapp-unused', 'dapp-missing', DAPPS[3]], OUTCOMES, WINDOW),
+  make_query_spec([], OUTCOMES, EVERYTHING),
+  make_query_spec(DAPPS, OUTCOMES, WINDOW, freezes={'token_item_id': 42}),
+  make_query_spec(DAPPS, OUTCOMES, EVERYTHING, freezes={'to_address': '0x0005'}),
+  make_query_spec(DAPPS, OUTCOMES, EVERYTHING, freezes={'to_address': '0xffff'}),
+  make_query_spec(DAPPS, OUTCOMES, EVERYTHING, freezes={'token_item_id': 7, 'to_address': '0x0023'})
+]
+
+# Sorted positions matching a spec, by plain pandas masks
+def reference_positions(df, spec):
+  mask = (df['name'].isin(spec.dapps) & df['resolution_event_type'].isin(spec.outcomes)
+          & (df['created_at'] >= spec.time_range[0]) & (df['created_at'] < spec.time_range[1]))
+  for column, value in spec.freezes:
+    mask &= df[column] == value
+  return np.flatnonzero(mask.values)
+
+@pytest.mark.parametrize('spec', SPECS)
+def test_select_matches_reference(engine, listings_frame, spec):
+  np.testing.assert_array_equal(engine.select(spec), reference_positions(listings_frame, spec))
+
+@pytest.mark.parametrize('spec', SPECS)
+def test_select_with_indexes_matches_reference(engine, listings_frame, spec):
+  engine.add_index('name', ValueIndex.build(engine, 'name'))
+  engine.add_index('token_item_id', ValueIndex.build(engine, 'token_item_id', order='created_at'))
+  np.testing.assert_array_equal(engine.select(spec), reference_positions(listings_frame, spec))
+
+# NaN never satisfies a range, on any backend
+def test_range_skips_nan(engine, listings_frame):
+  prices = listings_frame['listing_start_price_normalized'].values
+  expected = np.flatnonzero((prices >= 0.5) & (prices < 2))
+  np.testing.assert_array_equal(engine.where([('range', 'listing_start_price_normalized', 0.5, 2)]), expected)
+  rows = np.arange(0, len(listings_frame), 3)
+  np.testing.assert_array_equal(engine.where([('range', 'listing_start_price_normalized', 0.5, 2)], rows=rows),
+                                rows[(prices[rows] >= 0.5) & (prices[rows] < 2)])
+
+def test_eq_predicate(engine, listings_frame):
+  expected = np.flatnonzero(listings_frame['token_item_id'].values == 42)
+  np.testing.assert_array_equal(engine.where([('eq', 'token_item_id', 42)]), expected)
+
+def test_category_labels_cover_the_data(engine, listings_frame):
+  assert set(engine.category_labels('name')) >= set(listings_frame['name'].astype(str))
+  assert set(engine.category_labels('name')) <= set(DAPPS + ['dapp-unused'])
+
+@pytest.mark.parametrize('columns', [None, ['name'], ['listing_start_price_normalized', 'created_at', 'to_address']])
+def test_take_projects_columns(engine, listings_frame, columns):
+  positions = np.array([0, 5, 17, 1999, 400])
+  expected = listings_frame.iloc[positions] if columns is None else listings_frame.iloc[positions][columns]
+  taken = engine.take(positions, columns)
+  taken = taken[[column for column in taken.columns if column != 'id']]
+  pd.testing.assert_frame_equal(normalized(taken), normalized(expected), check_index_type=False, check_dtype=False)
+
+def test_lookup_ids_and_get_indexer(engine, listings_frame):
+  ids = listings_frame.index.values[[3, 0, 1500]]
+  np.testing.assert_array_equal(engine.ids(np.array([3, 0, 1500])), ids)
+  np.testing.assert_array_equal(engine.get_indexer(np.append(ids, 4)), [3, 0, 1500, -1])
+
+  columns = ['name', 'listing_start_price_normalized', 'to_address']
+  expected = listings_frame.loc[ids[2], columns]
+  pd.testing.assert_series_equal(engine.lookup(ids[2], columns).astype(object), expected.astype(object), check_names=False)
+
+#### Budget samples: the same rows on every backend, shared between series in proportion to their size
+
+SAMPLE = ('budget', 300, 20, 0)
+
+def series_counts(df, positions):
+  return df.iloc[positions].groupby(['name', 'resolution_event_type'], observed=True).size()
+
+@pytest.mark.parametrize('spec', SPECS[:3])
+def test_budget_sample_quotas(engine, listings_frame, spec):
+  positions = engine.select(spec._replace(sample=SAMPLE))
+  full = series_counts(listings_frame, reference_positions(listings_frame, spec))
+  sampled = series_counts(listings_frame, positions).reindex(full.index, fill_value=0)
+
+  assert np.all(np.diff(positions) > 0)
+  assert set(positions) <= set(reference_positions(listings_frame, spec))
+  # Every series keeps at least the minimum (or all of itself), & the total stays within budget + minimums
+  assert np.all(sampled.values >= np.minimum(full.values, SAMPLE[2]))
+  assert len(positions) <= SAMPLE[1] + SAMPLE[2] * len(full)
+
+@pytest.fixture(scope='module')
+def pandas_engine(listings_frame):
+  return QueryEngine(PandasBackend(listings_frame), SharedResultCache())
+
+@pytest.mark.parametrize('spec', SPECS[:3])
+def test_budget_sample_agrees_across_backends(engine, pandas_engine, spec):
+  np.testing.assert_array_equal(engine.select(spec._replace(sample=SAMPLE)), pandas_engine.select(spec._replace(sample=SAMPLE)))
+
+# A larger budget keeps every row a smaller one kept: ranks are drawn once, not per budget
+def test_budget_samples_are_nested(engine):
+  spec = SPECS[0]
+  small = engine.select(spec._replace(sample=('budget', 200, 5, 0)))
+  large = engine.select(spec._replace(sample=('budget', 800, 5, 0)))
+  assert set(small) <= set(large)
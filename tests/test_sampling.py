@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from sampling import proportional_quotas, series_stratified_sample, stratified_sample
+
+#### Scatter sampling: density thinning within series that share a budget
+
+BUDGET = 1000
+MINIMUM = 100
+
+# A large series & a small one drawn from the same dense cluster
+def crowded_series(seed=0):
+  random_state = np.random.RandomState(seed)
+  codes = np.repeat([0, 1], [50000, 300])
+  x = random_state.normal(size=len(codes))
+  y = random_state.normal(size=len(codes))
+  return codes, x, y
+
+def test_density_sampler_alone_can_crowd_out_a_small_series():
+  codes, x, y = crowded_series()
+  kept = stratified_sample(x, y, BUDGET, seed=0)
+  assert len(kept) == BUDGET
+  assert np.sum(codes[kept] == 1) < MINIMUM
+
+def test_small_series_keeps_its_minimum():
+  codes, x, y = crowded_series()
+  quotas = proportional_quotas(np.bincount(codes), BUDGET, MINIMUM)
+  kept = series_stratified_sample(codes, x, y, quotas, seed=0)
+
+  assert np.all(np.diff(kept) > 0)
+  counts = np.bincount(codes[kept], minlength=2)
+  assert counts[1] >= MINIMUM
+  np.testing.assert_array_equal(counts, quotas)
+  np.testing.assert_array_equal(kept, series_stratified_sample(codes, x, y, quotas, seed=0))
+
+def test_series_under_their_quota_are_kept_whole():
+  codes, x, y = crowded_series()
+  small = np.flatnonzero(codes == 1)
+  kept = series_stratified_sample(codes[small] * 0, x[small], y[small], np.array([1000]), seed=0)
+  np.testing.assert_array_equal(kept, np.arange(len(small)))
+  assert len(series_stratified_sample(np.empty(0, dtype=np.int64), [], [], np.empty(0, dtype=np.int64))) == 0
+
+# The reviewer's scenario: moving the month slider by one month must keep every drawn point that's still eligible
+def test_ranked_sample_keeps_drawn_points_when_the_filter_changes():
+  random_state = np.random.RandomState(1)
+  rows = 60000
+  dapps = random_state.choice(5, rows, p=[0.7, 0.15, 0.1, 0.04, 0.01])
+  outcomes = random_state.randint(0, 3, rows)
+  months = random_state.randint(0, 13, rows)
+  x = random_state.normal(size=rows)
+  y = random_state.normal(size=rows) + months / 10.0
+  # Per-dapp permutations, as QueryEngine.sample_ranks draws them
+  ranks = np.zeros(rows, dtype=np.int64)
+  for dapp in range(5):
+    members = np.flatnonzero(dapps == dapp)
+    ranks[members] = random_state.permutation(len(members))
+  bounds = ((x.min(), x.max()), (y.min(), y.max()))
+
+  def draw(positions):
+    codes = dapps[positions] * 3 + outcomes[positions]
+    quotas = proportional_quotas(np.bincount(codes), 20000, 500)
+    return positions[series_stratified_sample(codes, x[positions], y[positions], quotas, ranks=ranks[positions], bounds=bounds)]
+
+  before = draw(np.arange(rows))
+  after = draw(np.flatnonzero(months >= 1))
+  assert len(before) >= 20000
+  assert np.isin(before[months[before] >= 1], after).all()
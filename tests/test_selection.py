@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import math
+import numpy as np
+import pytest
+from selection import points_in_polygon, selection_polygon
+
+#### Box & lasso selections: the vectorized point-in-polygon test against a scalar ray cast
+
+# One point at a time, by the classic even-odd ray cast
+def reference_inside(px, py, polygon_x, polygon_y):
+  if math.isnan(px) or math.isnan(py) or len(polygon_x) < 3:
+    return False
+  inside = False
+  j = len(polygon_x) - 1
+  for i in range(len(polygon_x)):
+    xi, yi, xj, yj = polygon_x[i], polygon_y[i], polygon_x[j], polygon_y[j]
+    if (yi > py) != (yj > py) and px < (xj - xi) * (py - yi) / (yj - yi) + xi:
+      inside = not inside
+    j = i
+  return inside
+
+def random_points(count=3000, seed=0):
+  random_state = np.random.RandomState(seed)
+  x = random_state.uniform(-1, 11, count)
+  y = random_state.uniform(-1, 11, count)
+  x[random_state.random_sample(count) < 0.05] = np.nan
+  y[random_state.random_sample(count) < 0.05] = np.nan
+  return x, y
+
+LASSOS = [
+  # Convex, concave (a C shape), self-intersecting (a bow tie) & one with a horizontal edge & a repeated vertex
+  ([1, 9, 8, 2], [1, 2, 9, 8]),
+  ([1, 9, 9, 3, 3, 9, 9, 1], [1, 1, 3, 3, 7, 7, 9, 9]),
+  ([1, 9, 1, 9], [1, 9, 9, 1]),
+  ([2, 8, 8, 8, 5, 2], [2, 2, 2, 7, 9.5, 7])
+]
+
+@pytest.mark.parametrize('polygon', LASSOS)
+def test_lasso_matches_scalar_reference(polygon):
+  x, y = random_points()
+  selected = selection_polygon({'lassoPoints': {'x': polygon[0], 'y': polygon[1]}})
+  expected = [reference_inside(px, py, *selected) for px, py in zip(x, y)]
+  inside = points_in_polygon(x, y, *selected)
+  np.testing.assert_array_equal(inside, expected)
+  assert inside.any() and not inside.all()
+  assert not inside[np.isnan(x) | np.isnan(y)].any()
+
+def test_box_is_the_rectangle_in_either_drag_direction():
+  x, y = random_points()
+  expected = (x > 2.5) & (x < 7) & (y > 3) & (y < 8.25)
+  for box in [{'x': [2.5, 7], 'y': [3, 8.25]}, {'x': [7, 2.5], 'y': [8.25, 3]}]:
+    polygon = selection_polygon({'range': box, 'points': []})
+    assert len(polygon[0]) == 4
+    np.testing.assert_array_equal(points_in_polygon(x, y, *polygon), expected)
+    np.testing.assert_array_equal(points_in_polygon(x, y, *polygon),
+                                  [reference_inside(px, py, *polygon) for px, py in zip(x, y)])
+
+@pytest.mark.parametrize('polygon', [([], []), ([1], [1]), ([1, 9], [1, 9])])
+def test_fewer_than_three_vertices_select_nothing(polygon):
+  x, y = random_points(200)
+  assert not points_in_polygon(x, y, *polygon).any()
+
+def test_selection_events_without_a_shape():
+  assert selection_polygon(None) is None
+  assert selection_polygon({}) is None
+  assert selection_polygon({'points': []}) is None
+  assert selection_polygon({'range': None, 'lassoPoints': None}) is None
+  assert len(points_in_polygon([], [], [0, 1, 1], [0, 0, 1])) == 0
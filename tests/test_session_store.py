@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from session_store import MemorySessionStore, RedisSessionStore, make_handle, session_value
+
+#### Session values: stored as JSON, with handles that survive the round trip through any store
+
+SELECTION = {
+  'axes': ['listing_start_price_normalized', 'log', 'duration_hours', 'linear'],
+  'polygon': [[0.5, 1.0], [2.0, 1.0], [2.0, 3.5]],
+  'freezes': {'token_item_id': np.uint32(42), 'to_address': '0x0005', 'from_address': None}
+}
+
+# Just enough of a Redis client to hold hashes
+class FakeRedis(object):
+  def __init__(self):
+    self.hashes = {}
+
+  def hget(self, key, field):
+    return self.hashes.get(key, {}).get(field)
+
+  def hset(self, key, field, value):
+    self.hashes.setdefault(key, {})[field] = value if isinstance(value, bytes) else value.encode('utf-8')
+
+  def expire(self, key, seconds):
+    pass
+
+  def pipeline(self):
+    return self
+
+  def execute(self):
+    pass
+
+def redis_store():
+  store = RedisSessionStore.__new__(RedisSessionStore)
+  store.client = FakeRedis()
+  store.ttl = 60
+  store.prefix = 'test'
+  return store
+
+def test_numpy_scalars_become_plain_values():
+  value = session_value(SELECTION)
+  assert value['freezes']['token_item_id'] == 42 and type(value['freezes']['token_item_id']) is int
+  assert session_value(np.int64(7)) == 7
+  assert session_value(value) == value
+
+def test_handles_survive_every_store():
+  value = session_value(SELECTION)
+  for store in [MemorySessionStore(), redis_store()]:
+    store.set('token', 'scatter-selection', value)
+    restored = store.get('token', 'scatter-selection')
+    assert restored == value
+    assert make_handle('scatter-selection', restored) == make_handle('scatter-selection', value)
+    assert store.get('token', 'missing', 'default') == 'default'
+
+def test_redis_holds_json_not_pickles():
+  store = redis_store()
+  store.set('token', 'selected-listing', session_value(np.uint32(5000)))
+  assert store.client.hashes['test:token']['selected-listing'] == b'5000'
+  assert store.get('token', 'selected-listing') == 5000